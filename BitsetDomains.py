@@ -0,0 +1,79 @@
+# An alternative to TrailDomains that stores each domain as a single int bitmask, where bit i is values[i] (e.g. the
+#   doctor with ID i). Sizes are popcounts, and the solver can intersect a domain with a constraint's supports_mask
+#   rather than testing values one at a time. Only worth it when there are few distinct values, like doctors.
+# Has the same interface as TrailDomains, so the backtracking solver can use either
+class BitsetDomains:
+    def __init__(self, domains, values=None):
+        # Every value that appears in a domain, in order of their bits
+        if values is None:
+            values = []
+            for domain in domains:
+                for value in domain:
+                    if value not in values:
+                        values.append(value)
+        self.values = list(values)
+        self.value_bits = {value: 1 << i for i, value in enumerate(self.values)}
+        self.full_mask = (1 << len(self.values)) - 1
+
+        self.masks = [self.to_mask(domain) for domain in domains]
+        # The (variable, previous mask) of every change, in order
+        self.trail = []
+        # (constraint, value) --> the constraint's supports_mask for the value
+        self.support_masks = dict()
+
+    # Returns the bitmask of a collection of values
+    def to_mask(self, values):
+        mask = 0
+        for value in values:
+            mask |= self.value_bits[value]
+        return mask
+
+    # Returns a list of the values in the bitmask, in bit order
+    def from_mask(self, mask):
+        values = []
+        while mask:
+            lowest_bit = mask & -mask
+            values.append(self.values[lowest_bit.bit_length() - 1])
+            mask ^= lowest_bit
+        return values
+
+    # Returns a list of the live values for the variable, so this can be used like a list of domains
+    def __getitem__(self, variable):
+        return self.from_mask(self.masks[variable])
+
+    def __len__(self):
+        return len(self.masks)
+
+    def size(self, variable):
+        return self.masks[variable].bit_count()
+
+    def contains(self, variable, value):
+        return bool(self.masks[variable] & self.value_bits.get(value, 0))
+
+    # Returns the bitmask of the values the constraint allows alongside the given value
+    def supports(self, constraint, value):
+        key = (constraint, value)
+        if key not in self.support_masks:
+            self.support_masks[key] = constraint.supports_mask(value, self.value_bits, self.full_mask)
+        return self.support_masks[key]
+
+    # Removes the value from the variable's domain (if it is still there)
+    def remove(self, variable, value):
+        self.remove_mask(variable, self.value_bits.get(value, 0))
+
+    # Removes every value in the bitmask from the variable's domain
+    def remove_mask(self, variable, mask):
+        old_mask = self.masks[variable]
+        if old_mask & mask:
+            self.trail.append((variable, old_mask))
+            self.masks[variable] = old_mask & ~mask
+
+    # Returns a marker for the current state, to give to undo_to later
+    def mark(self):
+        return len(self.trail)
+
+    # Restores every value removed since the marker was taken
+    def undo_to(self, marker):
+        while len(self.trail) > marker:
+            variable, old_mask = self.trail.pop()
+            self.masks[variable] = old_mask
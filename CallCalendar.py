@@ -0,0 +1,134 @@
+import datetime
+
+# Kind codes for the variables, see CallCalendar.variable_kinds
+WEEKDAY = 0
+WEEKEND = 1
+HOLIDAY = 2
+
+
+# A precomputed index of the dates in a call schedule, built once in time linear in the number of days
+# Days are stored by their ordinal (date.toordinal()), so finding the variable for a date or checking if a doctor is
+#   unavailable is a list or set lookup rather than a scan over the holidays or a doctor's list of dates
+# Each variable is a weekday (a date), a weekend (a tuple of Fri/Sat/Sun dates) or a holiday (a tuple of dates)
+class CallCalendar:
+
+    # Takes the start and end dates, the holidays (tuples of consecutive dates) and a {doctor: set of the ordinals of
+    #   their unavailable days}
+    def __init__(self, start_date, end_date, holidays, doc_unavailable_ordinals):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.start_ordinal = start_date.toordinal()
+        self.end_ordinal = end_date.toordinal()
+        self.holidays = holidays
+
+        # Weeks are counted from the Monday on or before the start date
+        self.first_monday_ordinal = self.start_ordinal - start_date.weekday()
+
+        # The variables, and for each one: its kind, the ordinal of its first date and its (year, month)
+        self.variables = []
+        self.variable_kinds = []
+        self.variable_ordinals = []
+        self.variable_months = []
+        self.holiday_indices = []
+        # day_variables[ordinal - start_ordinal] --> the index of the variable that covers that day
+        self.day_variables = []
+        self.__build_variables()
+
+        # The ordinals each doctor cannot work, and the doctors that cannot work each variable (on any of its days)
+        self.doc_unavailable_ordinals = dict()
+        self.unavailable_doctors = [set() for _ in range(len(self.variables))]
+        for doctor, ordinals in doc_unavailable_ordinals.items():
+            self.set_unavailable_ordinals(doctor, ordinals)
+
+    # Walks the days from the start date to the end date once, grouping them into variables
+    def __build_variables(self):
+        # Every day of every holiday --> that holiday
+        holiday_days = dict()
+        for holiday in self.holidays:
+            for day in holiday:
+                holiday_days[day.toordinal()] = holiday
+
+        ordinal = self.start_ordinal
+        while ordinal <= self.end_ordinal:
+            # Explicitly consider holidays first
+            if ordinal in holiday_days:
+                holiday = holiday_days[ordinal]
+                self.holiday_indices.append(len(self.variables))
+                self.__add_variable(holiday, HOLIDAY)
+                while ordinal in holiday_days and holiday_days[ordinal] is holiday:
+                    self.__add_day(ordinal)
+                    ordinal += 1
+                continue
+
+            # Weekends: consider next weekend-days as one block (usually 3, could be less if interrupted by holidays)
+            # A weekend is kept whole even if the schedule ends partway through it
+            date = datetime.date.fromordinal(ordinal)
+            if date.weekday() > 3:
+                weekend = []
+                while date.weekday() > 3 and ordinal not in holiday_days:
+                    weekend.append(date)
+                    ordinal += 1
+                    date = datetime.date.fromordinal(ordinal)
+                self.__add_variable(tuple(weekend), WEEKEND)
+                for day in weekend:
+                    self.__add_day(day.toordinal())
+                continue
+
+            self.__add_variable(date, WEEKDAY)
+            self.__add_day(ordinal)
+            ordinal += 1
+
+    def __add_variable(self, variable, kind):
+        first_date = variable[0] if kind != WEEKDAY else variable
+        self.variables.append(variable)
+        self.variable_kinds.append(kind)
+        self.variable_ordinals.append(first_date.toordinal())
+        self.variable_months.append((first_date.year, first_date.month))
+
+    # Maps the day to the last variable added. Days before the start date (the start of a holiday that was already
+    #   going) are not indexed, but days after the end date that are part of the last weekend are
+    def __add_day(self, ordinal):
+        if ordinal >= self.start_ordinal:
+            self.day_variables.append(len(self.variables) - 1)
+
+    # Replaces the doctor's unavailable days with the given ordinals (which are copied)
+    def set_unavailable_ordinals(self, doctor, ordinals):
+        for var in self.get_unavailable_variables(doctor):
+            self.unavailable_doctors[var].discard(doctor)
+
+        self.doc_unavailable_ordinals[doctor] = set(ordinals)
+        for var in self.get_unavailable_variables(doctor):
+            self.unavailable_doctors[var].add(doctor)
+
+    # Returns the set of variables with at least one day the doctor cannot work
+    def get_unavailable_variables(self, doctor):
+        variables = set()
+        for ordinal in self.doc_unavailable_ordinals.get(doctor, ()):
+            var = self.get_variable_at(ordinal)
+            if var is not None:
+                variables.add(var)
+        return variables
+
+    # Returns True if the date is between the start and end dates (inclusive)
+    def contains_date(self, date):
+        return self.start_date <= date <= self.end_date
+
+    # Returns the index of the variable that covers the ordinal, or None if no variable does
+    def get_variable_at(self, ordinal):
+        if not 0 <= ordinal - self.start_ordinal < len(self.day_variables):
+            return None
+        return self.day_variables[ordinal - self.start_ordinal]
+
+    # Returns the dates of the variable as a tuple (one date for a weekday)
+    def get_dates(self, index):
+        if self.variable_kinds[index] == WEEKDAY:
+            return self.variables[index],
+        return self.variables[index]
+
+    # Returns the week number of a date, counting from the week of the start date
+    def get_week(self, date):
+        return (date.toordinal() - self.first_monday_ordinal) // 7
+
+    # Returns True if the doctor can work every day of the variable
+    def is_available(self, doctor, index):
+        return doctor not in self.unavailable_doctors[index]
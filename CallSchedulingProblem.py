@@ -1,25 +1,48 @@
 import math
+import multiprocessing
 import sys
 import copy
 
+from BitsetDomains import BitsetDomains
+from call_file_parser import parse_call_file, read_unavailable_days_csv
+from CallCalendar import CallCalendar, WEEKDAY, WEEKEND, HOLIDAY
 from ConstraintSatisfactionProblem import ConstraintSatisfactionProblem
-import csv
+from csp_constraints import NOT_EQUAL
+from csp_helper_functions import minimum_remaining_values
+from DoctorTallies import DoctorTallies
+from schedule_writers import DEFAULT_FORMATS, write_schedule
+from SolverStats import NO_STATS
+from SpacingIndex import SpacingIndex
+from TrailDomains import TrailDomains
 import datetime
 import random
+import time
 # Author: Ben Williams '25, benjamin.r.williams.25@dartmouth.edu
 # Date: November 5th, 2023
 
+# Fri Sat Sun considered as one block
+WEEKDAY_LABELS = {0: "Monday", 1: "Tuesday", 2: "Wednesday", 3: "Thursday"}
+
+# Weekends and holidays that start within this many days of each other (+/- 2 weekends) cannot have the same doctor
+SPACING_DAYS = 14
+
 
 class CallSchedulingProblem(ConstraintSatisfactionProblem):
 
     # Takes datetime objects start_date and end_date, and a call_file with all the doctor-specific info
-    def __init__(self, start_date, end_date, call_file):
+    # If a SolverStats is given as stats, the time spent building and solving the problem is recorded in it
+    def __init__(self, start_date, end_date, call_file, stats=None):
+        self.stats = stats if stats is not None else NO_STATS
+        # While keep_best is True (see solve_with_time_limit), the best schedule any search reaches and its score
+        self.keep_best = False
+        self.best_schedule = None
+        self.best_score = None
         self.start_date = start_date
         self.end_date = end_date
         self.holidays = set()
-        self.holiday_indices = []
         self.doctors = set()
-        self.doc_unavailable_days = dict()
+        # Doctor --> set of the ordinals of the days they are unavailable
+        self.doc_unavailable_ordinals = dict()
         self.max_weekends = dict()
         self.max_weekdays = dict()
 
@@ -30,155 +53,663 @@ class CallSchedulingProblem(ConstraintSatisfactionProblem):
         # Only relevant weekdays, Fri/Sat/Sun are one block
         self.doc_available_weekdays = {"Monday": [], "Tuesday": [], "Wednesday": [], "Thursday": []}
 
-        self.parse_call_file_wrapper(call_file)
+        with self.stats.phase("parse"):
+            self.parse_call_file_wrapper(call_file)
+        self.__build_model()
 
+    # Builds everything that comes from the parsed call file: the calendar, variables, domains and constraints
+    def __build_model(self):
         # Initialize values in dictionaries that were not completely filled out
         for doc in self.doctors:
-            if doc not in self.doc_unavailable_days.keys():
-                self.doc_unavailable_days[doc] = []
+            if doc not in self.doc_unavailable_ordinals:
+                self.doc_unavailable_ordinals[doc] = set()
+
+        # The index of the dates in the schedule, by date ordinal
+        with self.stats.phase("variables"):
+            self.calendar = CallCalendar(self.start_date, self.end_date, self.holidays,
+                                         self.doc_unavailable_ordinals)
 
         # Variables --> Every weekday, every weekend, and every holiday
-        self.variables = self.create_variable_dates()
+        self.variables = self.calendar.variables
+        self.holiday_indices = self.calendar.holiday_indices
 
         # Domains --> Doctors available that day, weekend, or holiday
-        self.domains = self.get_domains()
+        with self.stats.phase("domains"):
+            self.domains = self.get_domains()
 
         # Constraints --> Rules:
-        #   Spread out holidays and weekends. If on one weekend/holiday, you cannot be on for another weekend
-        #       in the near future/past
         #   No back to back weekdays/weekends. If on call Monday, cannot be on call the weekend right before. Likewise,
         #       if on call Thursday, cannot be on call the weekend immediately after (no thurs-fri-sat-sun)
         #       This is not considered
-        self.constraints = self.get_constraints()
+        with self.stats.phase("constraints"):
+            self.constraints = self.get_constraints()
 
         # Global constraints --> Rules (handled in the solver):
         #   Every day needs exactly one doctor. Is handled in the solver.
+        #   Spread out holidays and weekends. If on one weekend/holiday, you cannot be on for another weekend
+        #       in the near future/past (see self.spacing)
         #   The schedule should be fair. Everyone should have roughly the same amount of weekends and holidays.
         #       If the weekday_schedule is undefined, they should also have the same amount of weekends
 
-        super().__init__(self.variables, self.domains, self.constraints)
+        with self.stats.phase("index"):
+            super().__init__(self.variables, self.domains, self.constraints, self.stats)
+
+        # The kind (WEEKDAY, WEEKEND or HOLIDAY), the (year, month) and the first date's ordinal of each variable
+        self.variable_kinds = self.calendar.variable_kinds
+        self.variable_months = self.calendar.variable_months
+        self.variable_ordinals = self.calendar.variable_ordinals
+
+        # Live counts of each doctor's days in the assignment the solver is working on. The searches keep these up to
+        #   date through reset_assignment_state and update_assignment_state.
+        self.tallies = DoctorTallies(self.doctors, self.variable_kinds, self.variable_months)
+        # The weekends and holidays each doctor has in that assignment, which enforce the spacing rule between them
+        #   (see extra_conflicts) without an arc between every pair of nearby weekends
+        self.spacing = self.__get_spacing_index(self.variable_ordinals, self.variable_kinds)
+
+        # The soft cost of each day over a doctor's max_weekdays or max_weekends (see soft_cost_delta)
+        self.max_days_weight = 2 * len(self.variables)
+
+        # The integer/NumPy encoding of this problem, built on the first call to compile()
+        self.compiled = None
+        # Whether self.domains has changed since the compiled domains were last updated
+        self.compiled_domains_stale = False
+
+    # Incremental updates: each of these changes one part of the call file's information and updates only the domains
+    #   it affects. None of them change the dates in the schedule, so the variables and constraints stay the same.
+
+    # Makes the doctor unavailable on the given dates (as well as the ones they already had)
+    def add_unavailable_days(self, doctor, dates):
+        self.__check_doctor(doctor)
+        self.doc_unavailable_ordinals[doctor].update(date.toordinal() for date in dates)
+        self.__refresh_domains(self.__update_calendar_availability(doctor))
+
+    # Makes the doctor available again on the given dates
+    def remove_unavailable_days(self, doctor, dates):
+        self.__check_doctor(doctor)
+        self.doc_unavailable_ordinals[doctor].difference_update(date.toordinal() for date in dates)
+        self.__refresh_domains(self.__update_calendar_availability(doctor))
+
+    # Adds a new doctor to the schedule, who can work weekends and holidays, the given days of the week (e.g.
+    #   "Monday"), and is unavailable on the given dates
+    def add_doctor(self, doctor, available_weekdays=(), unavailable_days=()):
+        if doctor in self.doctors:
+            raise ValueError(f"{doctor} is already on the schedule")
+        for day in available_weekdays:
+            if day not in self.doc_available_weekdays:
+                raise ValueError(f"Invalid weekday {day}")
+
+        self.doctors.add(doctor)
+        self.doc_unavailable_ordinals[doctor] = {date.toordinal() for date in unavailable_days}
+        for day in available_weekdays:
+            self.doc_available_weekdays[day].append(doctor)
+
+        self.calendar.set_unavailable_ordinals(doctor, self.doc_unavailable_ordinals[doctor])
+        self.__doctors_changed()
+
+    # Sets the most weekends (or weekdays) the doctor can have, or removes the limit if the maximum is None
+    # Only the fairness rules read these, so no domains change
+    def set_max_weekends(self, doctor, max_weekends):
+        self.__check_doctor(doctor)
+        self.__set_max_days(self.max_weekends, doctor, max_weekends)
+
+    def set_max_weekdays(self, doctor, max_weekdays):
+        self.__check_doctor(doctor)
+        self.__set_max_days(self.max_weekdays, doctor, max_weekdays)
+
+    # Re-reads the call file and applies the differences from the current information as incremental updates
+    # If the dates or weekday rules changed (holidays, the defined weekday schedule, existing doctors' available
+    #   weekdays) or a doctor was removed, the whole model is rebuilt instead
+    # Returns True if the changes were applied incrementally, and False if the model was rebuilt
+    # If the call file has errors, a CallFileError is raised and nothing is changed
+    def update_from_call_file(self, call_file):
+        old_doctors = set(self.doctors)
+        old_holidays = self.holidays
+        old_weekday_schedule = self.weekday_schedule
+        old_available_weekdays = self.doc_available_weekdays
+        old_unavailable_ordinals = self.doc_unavailable_ordinals
+        self.parse_call_file_wrapper(call_file)
+
+        rebuild = self.holidays != old_holidays or self.weekday_schedule != old_weekday_schedule or \
+            not old_doctors <= self.doctors
+        for day, doctors in self.doc_available_weekdays.items():
+            if [doctor for doctor in doctors if doctor in old_doctors] != old_available_weekdays[day]:
+                rebuild = True
 
-    # Performs multiple local searches to ensure that the doctors have evenly distributed days
-    # Restarts when necessary, since if a solution is not found quickly - we are likely stuck in local minima.
-    def solve_for_call_schedule(self, print_info=False):
-        # Our first assignment
-        if self.weekday_schedule:
-            initial_assignment = self.get_initial_assignment()
-            # schedule = self.backtracking_solver(assignment=initial_assignment)
-            schedule = self.local_search(1000, assignment=initial_assignment)[0]
+        if rebuild:
+            self.__build_model()
+            return False
+
+        # The calendar still has the old unavailable days, so bring it up to date one doctor at a time
+        new_unavailable_ordinals = self.doc_unavailable_ordinals
+        self.doc_unavailable_ordinals = old_unavailable_ordinals
+        changed_variables = set()
+        for doctor in self.doctors:
+            ordinals = new_unavailable_ordinals.get(doctor, set())
+            if doctor not in old_doctors:
+                self.doc_unavailable_ordinals[doctor] = ordinals
+                self.calendar.set_unavailable_ordinals(doctor, ordinals)
+            elif ordinals != old_unavailable_ordinals[doctor]:
+                self.doc_unavailable_ordinals[doctor] = ordinals
+                changed_variables |= self.__update_calendar_availability(doctor)
+
+        if self.doctors != old_doctors:
+            self.__doctors_changed()
         else:
-            schedule = self.local_search(1000)[0]
+            self.__refresh_domains(changed_variables)
+        return True
 
-        original_domains = copy.deepcopy(self.domains)
+    def __check_doctor(self, doctor):
+        if doctor not in self.doctors:
+            raise ValueError(f"{doctor} is not on the schedule")
 
-        # Continue until local search succeeds
-        num_attempts = 1
-        while not schedule and num_attempts < 100:
-            if print_info:
-                print("local search attempt", num_attempts)
+    @staticmethod
+    def __set_max_days(max_days, doctor, maximum):
+        if maximum is None:
+            max_days.pop(doctor, None)
+        else:
+            max_days[doctor] = int(maximum)
+
+    # Updates the calendar with the doctor's unavailable days
+    # Returns the set of variables whose availability may have changed
+    def __update_calendar_availability(self, doctor):
+        changed_variables = self.calendar.get_unavailable_variables(doctor)
+        self.calendar.set_unavailable_ordinals(doctor, self.doc_unavailable_ordinals[doctor])
+        return changed_variables | self.calendar.get_unavailable_variables(doctor)
+
+    # Updates everything that depends on the set of doctors after one is added
+    def __doctors_changed(self):
+        self.__refresh_domains(range(len(self.variables)))
+        self.tallies = DoctorTallies(self.doctors, self.variable_kinds, self.variable_months)
+        self.spacing = self.__get_spacing_index(self.variable_ordinals, self.variable_kinds)
+        # Doctor IDs change, so the compiled problem has to be built again
+        self.compiled = None
+
+    # Recomputes the domains of the given variables from the current availability
+    # Weekdays in a defined weekday schedule keep their doctor. A pinned holiday keeps its doctor unless they are no
+    #   longer available, in which case it is given to an available doctor with the fewest holidays.
+    def __refresh_domains(self, indices):
+        for i in indices:
+            kind = self.variable_kinds[i]
+            if kind == WEEKDAY and self.weekday_schedule:
+                continue
 
-            schedule = self.local_search(1000)[0]
-            num_attempts += 1
+            if kind == HOLIDAY:
+                doctor = self.holiday_doctors.get(i)
+                if doctor is None or not self.calendar.is_available(doctor, i):
+                    doctor = self.__pick_holiday_doctor(i)
+                if doctor is not None:
+                    self.domains[i] = [doctor]
+                    continue
 
-        if num_attempts == 100:
-            print("Call scheduling potentially impossible", file=sys.stderr)
-            return None
+            self.domains[i] = self.get_available_doctors(i)
 
-        if print_info:
-            doc_weekdays, doc_weekends, doc_holidays = self.get_doc_days_assigned(schedule)
-            print(f"Original assignment: \n", doc_weekdays, "\n", doc_weekends, "\n", doc_holidays)
+        self.compiled_domains_stale = True
 
-        attempts = 1
-        # Continue to adjust the schedule until it is fair
-        while self.remove_unfair_assignments(schedule):
+    # Returns an available doctor for the holiday at the index with the fewest pinned holidays (ties are random), and
+    #   records them as pinned to it. Returns None (and unpins the holiday) if no one is available.
+    def __pick_holiday_doctor(self, index):
+        self.holiday_doctors.pop(index, None)
+        num_holidays = {doctor: 0 for doctor in self.doctors}
+        for doctor in self.holiday_doctors.values():
+            num_holidays[doctor] += 1
 
-            if print_info:
-                doc_weekdays, doc_weekends, doc_holidays = self.get_doc_days_assigned(schedule)
-                print(f"After removing parts of schedule at {attempts} attempts:\nWeekday totals:", doc_weekdays,
-                      "\nWeekend totals:", doc_weekends, "\nHoliday totals:", doc_holidays)
-            attempts += 1
+        available = [doctor for doctor in self.doctors if self.calendar.is_available(doctor, index)]
+        if not available:
+            return None
+        excluded = self.__get_holiday_exclusions(index, self.domains)
+        available = [doctor for doctor in available if doctor not in excluded] or available
+
+        fewest = min(num_holidays[doctor] for doctor in available)
+        doctor = random.choice([doctor for doctor in available if num_holidays[doctor] == fewest])
+        self.holiday_doctors[index] = doctor
+        return doctor
+
+    # Returns the doctors the holiday at the index should not be pinned to, since the pinned days would conflict: the
+    #   doctor pinned to a weekday right before or after it (in a defined weekday schedule), and the doctors of the
+    #   other pinned holidays within SPACING_DAYS of it
+    def __get_holiday_exclusions(self, index, domains):
+        excluded = set()
+        for neighbor in (index - 1, index + 1):
+            if 0 <= neighbor < len(domains) and self.calendar.variable_kinds[neighbor] == WEEKDAY and \
+                    len(domains[neighbor]) == 1:
+                excluded.add(domains[neighbor][0])
+
+        ordinal = self.calendar.variable_ordinals[index]
+        for holiday, doctor in self.holiday_doctors.items():
+            if holiday != index and abs(self.calendar.variable_ordinals[holiday] - ordinal) <= SPACING_DAYS:
+                excluded.add(doctor)
+        return excluded
+
+    # Performs multiple local searches to ensure that the doctors have evenly distributed days
+    # Restarts when necessary, since if a solution is not found quickly - we are likely stuck in local minima.
+    # If use_compiled is True, the local searches run on the NumPy encoding of the problem (see compile())
+    # If fairness_mode is "soft", fairness is part of the local search's cost instead (see solve_with_soft_fairness)
+    # If solver is "annealing", simulated annealing is used instead of min-conflicts. It always treats fairness as part
+    #   of its cost.
+    # If solver is "backtracking", the first schedule comes from a complete backtracking search (MRV, LCV and MAC3)
+    #   rather than a local search, so an impossible call file is reported as such instead of after 100 restarts.
+    #   The search uses bitset domains, indexed by the doctors in sorted order. The schedule is then made fair in the
+    #   same way as the default.
+    # Before any search, the domains are made arc consistent (see make_arc_consistent), which removes the doctors that
+    #   pinned days (like holidays) rule out, and finds some impossible call files without searching at all. The
+    #   domains are put back as they were once the solve is done.
+    # If tabu_tenure is given, the local searches of the default solve (and of "backtracking" once it has its first
+    #   schedule) are tabu searches with that tenure, which also get out of cycles with Zobrist hashes (see
+    #   local_search). The soft fairness and annealing searches do not use it, and the compiled search does not support
+    #   it.
+    def solve_for_call_schedule(self, print_info=False, use_compiled=False, fairness_mode="repair",
+                                solver="min_conflicts", tabu_tenure=None):
+        if solver not in ("min_conflicts", "annealing", "backtracking"):
+            raise ValueError(f"Unknown solver {solver}")
+        if use_compiled and tabu_tenure:
+            raise ValueError("The compiled search does not support tabu search")
+
+        unpruned_domains = self.domains
+        with self.stats.phase("arc_consistency"):
+            arc_consistent = self.make_arc_consistent(BitsetDomains(self.domains, sorted(self.doctors)))
+        if not arc_consistent:
+            print("Call scheduling impossible", file=sys.stderr)
+            return None
+        self.compiled_domains_stale = True
+
+        try:
+            if solver == "annealing":
+                return self.solve_with_soft_fairness(print_info, solver=solver)
+            if fairness_mode == "soft":
+                return self.solve_with_soft_fairness(print_info)
+            return self.__solve_with_repair(print_info, use_compiled, solver, tabu_tenure)
+        finally:
+            self.domains = unpruned_domains
+            self.compiled_domains_stale = True
+
+    # The default solve (see solve_for_call_schedule): finds any valid schedule, then wipes out and re-solves unfair
+    #   assignments until the schedule is fair
+    def __solve_with_repair(self, print_info, use_compiled, solver, tabu_tenure):
+        local_search = self.__get_local_search(use_compiled, tabu_tenure)
+        original_domains = copy.deepcopy(self.domains)
+
+        with self.stats.phase("initial_search"):
+            # Our first assignment
+            if solver == "backtracking":
+                initial_assignment = self.get_initial_assignment() if self.weekday_schedule else None
+                domains = BitsetDomains(self.domains, sorted(self.doctors))
+                schedule = self.backtracking_solver(assignment=initial_assignment, domains=domains, inference=self.MAC3,
+                                                    select_variable=minimum_remaining_values,
+                                                    order_domain=self.least_constraining_value)
+                self.stats.count("backtracking_calls", self.get_and_reset_search_calls())
+                if not schedule:
+                    if not self.out_of_time():
+                        print("Call scheduling impossible", file=sys.stderr)
+                    return None
+                # The fairness repair below reads the tallies of the last search
+                self.reset_assignment_state(schedule)
+            elif self.weekday_schedule:
+                initial_assignment = self.get_initial_assignment()
+                schedule = local_search(1000, assignment=initial_assignment)[0]
+            else:
+                schedule = local_search(1000)[0]
 
-            if attempts % 100 == 0 and attempts > 0:
+            # Continue until local search succeeds
+            num_attempts = 1
+            while not schedule and num_attempts < 100 and not self.out_of_time():
                 if print_info:
-                    print("Likely faster to restart")
-                self.domains = copy.deepcopy(original_domains)
-                schedule = self.local_search(1000)[0]
-                while not schedule:
-                    schedule = self.local_search(1000)[0]
-
-            inside_attempts = 1
-            new_schedule = self.local_search(200, assignment=schedule)[0]
-            while not new_schedule:
-                # This is probably impossible to solve from here, so back up to the beginning
-                if inside_attempts > 5:
-                    if print_info:
-                        print("Locally impossible schedule. Backing out and trying again.")
-                    self.domains = copy.deepcopy(original_domains)
-                    new_schedule = self.local_search(1000)[0]
-                    while not new_schedule:
-                        new_schedule = self.local_search(1000)[0]
-                    break
-                new_schedule = self.local_search(200, assignment=schedule)[0]
-                inside_attempts += 1
+                    print("local search attempt", num_attempts)
 
-            schedule = new_schedule
+                schedule = local_search(1000)[0]
+                num_attempts += 1
+                self.stats.count("restarts")
 
-            if print_info:
-                doc_weekdays, doc_weekends, doc_holidays = self.get_doc_days_assigned(schedule)
-                print(f"Status at {attempts} attempts:\nWeekday totals:", doc_weekdays, "\nWeekend totals:",
-                      doc_weekends, "\nHoliday totals:", doc_holidays)
-                print("----------")
+            if not schedule:
+                if not self.out_of_time():
+                    print("Call scheduling potentially impossible", file=sys.stderr)
+                return None
+
+        if print_info:
+            doc_weekdays, doc_weekends, doc_holidays = self.tallies.get_doc_days()
+            print(f"Original assignment: \n", doc_weekdays, "\n", doc_weekends, "\n", doc_holidays)
+
+        schedule = self.__repair_fairness(schedule, original_domains, local_search, print_info)
 
         # No need to deep copy as we are not modifying the domains anymore
         self.domains = original_domains
+        self.compiled_domains_stale = True
         return schedule
 
-    # Returns True if the assignment has been altered, False otherwise
-    # Ensures all doctors have an equal number of weekdays and weekends,
-    #   and that the max_weekdays and max_weekends rules (if given) are followed
-    def remove_unfair_assignments(self, assignment):
-        doc_weekdays, doc_weekends, doc_holidays = self.get_doc_days_assigned(assignment)
+    # Returns the local search the repair solves use (on the compiled problem if use_compiled is True, or a tabu search
+    #   if tabu_tenure is given), which records every search in the stats
+    def __get_local_search(self, use_compiled, tabu_tenure=None):
+        if use_compiled:
+            with self.stats.phase("compile"):
+                self.compile()
+            base_local_search = self.compiled_local_search
+        elif tabu_tenure:
+            def base_local_search(max_iters, assignment=None):
+                return self.local_search(max_iters, assignment=assignment, tabu_tenure=tabu_tenure, use_zobrist=True)
+        else:
+            base_local_search = self.local_search
+
+        def local_search(max_iters, assignment=None):
+            result, iters = base_local_search(max_iters, assignment=assignment)
+            self.stats.count("local_searches")
+            self.stats.count("local_search_iterations", iters)
+            if result and self.keep_best:
+                self.__offer_schedule(result, 0)
+            return result, iters
+
+        return local_search
+
+    # Wipes out and re-solves unfair assignments (see remove_unfair_assignments) until the schedule is fair, and returns
+    #   the fair schedule. The schedule must be the one the last local search returned, as the counts are read from
+    #   self.tallies.
+    # The domains are narrowed along the way, and reset to original_domains when the search has to start over. The
+    #   caller puts them back once it is done.
+    # If the deadline passes (see out_of_time), returns the valid but unfair schedule it has, or None if it is in the
+    #   middle of re-solving
+    def __repair_fairness(self, schedule, original_domains, local_search, print_info):
+        with self.stats.phase("fairness"):
+            attempts = 1
+            # Continue to adjust the schedule until it is fair
+            while not self.out_of_time() and self.remove_unfair_assignments(schedule):
 
-        # If the differences are small and there are no max days violations, we don't need to change the schedule
-        change_weekends = False
-        change_weekdays = False
+                if print_info:
+                    doc_weekdays, doc_weekends, doc_holidays = self.tallies.get_doc_days()
+                    print(f"After removing parts of schedule at {attempts} attempts:\nWeekday totals:", doc_weekdays,
+                          "\nWeekend totals:", doc_weekends, "\nHoliday totals:", doc_holidays)
+                attempts += 1
+                self.stats.count("fairness_rounds")
 
-        # Measure the fairness for weekdays
-        min_num_weekdays = math.inf
-        max_num_weekdays = 0
-        for doc in doc_weekdays.keys():
-            if doc_weekdays[doc] < min_num_weekdays:
-                if doc in self.max_weekdays.keys() and doc_weekdays[doc] == self.max_weekdays[doc]:
-                    continue
-                min_num_weekdays = doc_weekdays[doc]
-            if doc_weekdays[doc] > max_num_weekdays:
-                max_num_weekdays = doc_weekdays[doc]
+                if attempts % 100 == 0 and attempts > 0:
+                    if print_info:
+                        print("Likely faster to restart")
+                    self.stats.count("restarts")
+                    self.domains = copy.deepcopy(original_domains)
+                    self.compiled_domains_stale = True
+                    schedule = local_search(1000)[0]
+                    while not schedule and not self.out_of_time():
+                        schedule = local_search(1000)[0]
+                    if not schedule:
+                        return None
+
+                inside_attempts = 1
+                new_schedule = local_search(200, assignment=schedule)[0]
+                while not new_schedule and not self.out_of_time():
+                    # This is probably impossible to solve from here, so back up to the beginning
+                    if inside_attempts > 5:
+                        if print_info:
+                            print("Locally impossible schedule. Backing out and trying again.")
+                        self.stats.count("backouts")
+                        self.domains = copy.deepcopy(original_domains)
+                        self.compiled_domains_stale = True
+                        new_schedule = local_search(1000)[0]
+                        while not new_schedule and not self.out_of_time():
+                            new_schedule = local_search(1000)[0]
+                        break
+                    new_schedule = local_search(200, assignment=schedule)[0]
+                    inside_attempts += 1
+
+                if not new_schedule:
+                    return None
+                schedule = new_schedule
 
-            if doc in self.max_weekdays.keys() and doc_weekdays[doc] > self.max_weekdays[doc]:
-                change_weekdays = True
+                if print_info:
+                    doc_weekdays, doc_weekends, doc_holidays = self.tallies.get_doc_days()
+                    print(f"Status at {attempts} attempts:\nWeekday totals:", doc_weekdays, "\nWeekend totals:",
+                          doc_weekends, "\nHoliday totals:", doc_holidays)
+                    print("----------")
 
-        # Measure the fairness for weekends
-        min_num_weekends = math.inf
-        max_num_weekends = 0
-        for doc in doc_weekends.keys():
-            if doc_weekends[doc] + doc_holidays[doc] < min_num_weekends:
-                if doc in self.max_weekends.keys() and doc_weekends[doc] == self.max_weekends[doc]:
-                    continue
-                min_num_weekends = doc_weekends[doc] + doc_holidays[doc]
-            if doc_weekends[doc] + doc_holidays[doc] > max_num_weekends:
-                max_num_weekends = doc_weekends[doc] + doc_holidays[doc]
+        return schedule
 
-            if doc in self.max_weekends.keys() and doc_weekdays[doc] > self.max_weekends[doc]:
-                change_weekends = True
+    # Solves like solve_for_call_schedule, but gives up after about time_limit seconds instead of searching for as long
+    #   as it takes. Until then, it keeps solving again (from new random starts) if a solve fails.
+    # Every complete schedule a search reaches along the way is scored (see score_schedule), and the best one is kept
+    # Returns the fair schedule as soon as one is found, or the best schedule and its score once time runs out. The
+    #   schedule may break some rules, so check the score. Returns (None, None) if no search reached a complete
+    #   schedule, like when the call file is impossible.
+    # Any other keyword arguments are passed on to solve_for_call_schedule
+    def solve_with_time_limit(self, time_limit, print_info=False, **solve_options):
+        self.deadline = time.perf_counter() + time_limit
+        self.keep_best = True
+        self.best_schedule, self.best_score = None, None
+        try:
+            while not self.out_of_time():
+                schedule = self.solve_for_call_schedule(print_info, **solve_options)
+                if schedule:
+                    self.__offer_schedule(schedule, len(self.get_conflicts(schedule)))
+                    if self.best_score["conflicts"] == 0 and self.best_score["fair"]:
+                        break
+                # The solve stopped without ever reaching a complete schedule, so trying again will not help
+                elif self.best_schedule is None:
+                    break
+            self.stats.count("time_limit_reached", int(self.out_of_time()))
+            return self.best_schedule, self.best_score
+        finally:
+            self.deadline = None
+            self.keep_best = False
+            self.best_schedule, self.best_score = None, None
+
+    # Returns the score of a complete assignment: its number of broken constraints ("conflicts", see get_conflicts) and
+    #   how unfair it is (see get_unfairness). Schedules are compared by their conflicts, then whether they are fair,
+    #   then the sum of their spreads and days over the maximums.
+    def score_schedule(self, assignment, num_conflicts=None):
+        if num_conflicts is None:
+            num_conflicts = len(self.get_conflicts(assignment))
+        score = {"conflicts": num_conflicts}
+        score.update(self.get_unfairness(assignment))
+        return score
+
+    # Keeps a copy of the schedule if it scores better than the best schedule so far
+    def __offer_schedule(self, assignment, num_conflicts):
+        # Fewer conflicts always wins, so there is no need to score a schedule with more
+        if self.best_score is not None and num_conflicts > self.best_score["conflicts"]:
+            return
+        score = self.score_schedule(assignment, num_conflicts)
+        if self.best_score is None or _score_key(score) < _score_key(self.best_score):
+            self.best_schedule, self.best_score = list(assignment), score
+
+    # Local searches that give up still reached a complete schedule, which may be the best so far
+    def search_gave_up(self, assignment, num_conflicts):
+        if self.keep_best:
+            self.__offer_schedule(assignment, num_conflicts)
+
+    # Runs solve_for_call_schedule in num_workers processes at once, each with its own random seed, and returns the
+    #   first fair schedule that any of them finds. The other workers are stopped as soon as we have a schedule.
+    # Returns None if every worker fails
+    # Any other keyword arguments are passed on to solve_for_call_schedule
+    def solve_in_parallel(self, num_workers, **solve_options):
+        # Seeds come from the random module, so seeding it makes the set of seeds reproducible
+        base_seed = random.randrange(2 ** 32)
+        seeds = [base_seed + i for i in range(num_workers)]
+
+        # Each worker gets its own copy of this problem once, rather than once per task
+        # The workers do not record stats, as they would be lost with the worker. Only the total time is recorded here.
+        stats = self.stats
+        self.stats = NO_STATS
+        try:
+            with stats.phase("parallel_search"):
+                with multiprocessing.Pool(num_workers, initializer=_init_portfolio_worker, initargs=(self,)) as pool:
+                    for schedule in pool.imap_unordered(_portfolio_solve, [(seed, solve_options) for seed in seeds]):
+                        if schedule:
+                            # Leaving the with block terminates the workers that are still searching
+                            return schedule
+        finally:
+            self.stats = stats
+
+        return None
+
+    # Solves the schedule in blocks of window_months calendar months, so that no single search has to work on every
+    #   variable of a long (multi-year) schedule. The blocks are solved on their own, num_workers at a time, with each
+    #   doctor's max_weekends and max_weekdays split between the blocks by their share of the weekends and weekdays.
+    # The block schedules are then put together, the variables that share a constraint with a variable in another block
+    #   (the seams) are cleared and re-solved with everything else held fixed, and the whole schedule is made fair with
+    #   the same fairness_mode as the blocks. Since every block is already close to fair, this usually takes little
+    #   work. With fairness_mode="soft" (or the annealing solver), the soft search starts from the put-together
+    #   schedule.
+    # Any other keyword arguments are passed on to solve_for_call_schedule for each block
+    # Returns None if a block or the seams cannot be solved
+    def solve_windowed(self, window_months=3, num_workers=1, print_info=False, **solve_options):
+        blocks = self.get_blocks(window_months)
+        if len(blocks) == 1:
+            return self.solve_for_call_schedule(print_info=print_info, **solve_options)
+
+        unpruned_domains = self.domains
+        with self.stats.phase("arc_consistency"):
+            arc_consistent = self.make_arc_consistent(BitsetDomains(self.domains, sorted(self.doctors)))
+        if not arc_consistent:
+            print("Call scheduling impossible", file=sys.stderr)
+            return None
+        self.compiled_domains_stale = True
+
+        try:
+            with self.stats.phase("blocks"):
+                block_problems = [self.__make_block(start, end) for (start, end) in blocks]
+                if num_workers > 1:
+                    tasks = [(block, random.randrange(2 ** 32), solve_options) for block in block_problems]
+                    with multiprocessing.Pool(min(num_workers, len(tasks))) as pool:
+                        block_schedules = pool.map(_solve_block, tasks)
+                else:
+                    block_schedules = [block.solve_for_call_schedule(**solve_options) for block in block_problems]
+            self.stats.count("blocks", len(blocks))
+
+            if not all(block_schedules):
+                print("Call scheduling potentially impossible", file=sys.stderr)
+                return None
+            schedule = [doctor for block_schedule in block_schedules for doctor in block_schedule]
+
+            local_search = self.__get_local_search(False, solve_options.get("tabu_tenure"))
+            original_domains = copy.deepcopy(self.domains)
+            with self.stats.phase("seams"):
+                schedule = self.__solve_seams(schedule, blocks, local_search)
+            if not schedule:
+                print("Call scheduling potentially impossible", file=sys.stderr)
+                return None
+
+            if solve_options.get("fairness_mode") == "soft" or solve_options.get("solver") == "annealing":
+                return self.__soft_fairness_from(schedule, print_info)
+            return self.__repair_fairness(schedule, original_domains, local_search, print_info)
+        finally:
+            self.domains = unpruned_domains
+            self.compiled_domains_stale = True
+
+    # Makes the schedule fair with the soft fairness search (see solve_with_soft_fairness), starting from the schedule
+    #   each time rather than from a random one
+    def __soft_fairness_from(self, schedule, print_info, max_attempts=100):
+        with self.stats.phase("soft_search"):
+            for attempt in range(1, max_attempts + 1):
+                fair_schedule, iters = self.soft_local_search(20 * len(self.variables), print_iters=print_info,
+                                                              assignment=schedule)
+                self.stats.count("local_searches")
+                self.stats.count("local_search_iterations", iters)
+                if fair_schedule:
+                    return fair_schedule
+                self.stats.count("restarts")
+
+        print("Call scheduling potentially impossible", file=sys.stderr)
+        return None
+
+    # Splits the variables into blocks of window_months calendar months, by the month of each variable's first date
+    # Returns a list of (start, end) variable indices, where the block is every variable from start up to end
+    def get_blocks(self, window_months):
+        first_year, first_month = self.variable_months[0]
+
+        def get_block(var):
+            year, month = self.variable_months[var]
+            return (12 * (year - first_year) + month - first_month) // window_months
+
+        starts = [0]
+        for var in range(1, len(self.variables)):
+            if get_block(var) != get_block(var - 1):
+                starts.append(var)
+
+        return list(zip(starts, starts[1:] + [len(self.variables)]))
+
+    # Returns a copy of this problem with only the variables from start up to end, and the constraints between them
+    # Each doctor's max_weekends and max_weekdays are scaled down to the block's share of the weekends and weekdays
+    #   (rounded up, the full schedule is held to the real maximums once the blocks are put together)
+    def __make_block(self, start, end):
+        block = copy.copy(self)
+        variables = self.variables[start:end]
+        domains = [list(domain) for domain in self.domains[start:end]]
+        constraints = {(var_1 - start, var_2 - start): constraint
+                       for (var_1, var_2), constraint in self.constraints.items()
+                       if start <= var_1 < end and start <= var_2 < end}
+        ConstraintSatisfactionProblem.__init__(block, variables, domains, constraints)
+
+        block.variable_kinds = self.variable_kinds[start:end]
+        block.variable_months = self.variable_months[start:end]
+        block.variable_ordinals = self.variable_ordinals[start:end]
+        block.holiday_indices = [index - start for index in self.holiday_indices if start <= index < end]
+        block.max_weekends = self.__get_block_max_days(self.max_weekends, WEEKEND, block.variable_kinds)
+        block.max_weekdays = self.__get_block_max_days(self.max_weekdays, WEEKDAY, block.variable_kinds)
+        block.tallies = DoctorTallies(self.doctors, block.variable_kinds, block.variable_months)
+        block.spacing = self.__get_spacing_index(block.variable_ordinals, block.variable_kinds)
+        block.max_days_weight = 2 * len(variables)
+        block.compiled = None
+        block.compiled_domains_stale = False
+        # The calendar indexes the dates of the whole schedule, so it does not apply to the block
+        block.calendar = None
+        return block
+
+    # Scales each doctor's maximum number of days of the kind down to the block's share of those days, rounded up
+    def __get_block_max_days(self, max_days, kind, block_kinds):
+        total = self.variable_kinds.count(kind)
+        in_block = block_kinds.count(kind)
+        return {doctor: math.ceil(days * in_block / total) for doctor, days in max_days.items()}
+
+    # Clears the variables that share a constraint (or the spacing rule) with a variable in another block, and re-solves
+    #   them with the rest of the schedule held fixed. Each block's schedule is valid on its own, so only these can be
+    #   in conflict.
+    # Returns the schedule, or None if the seams could not be solved
+    def __solve_seams(self, schedule, blocks, local_search):
+        block_of = [0 for _ in range(len(self.variables))]
+        for i, (start, end) in enumerate(blocks):
+            for var in range(start, end):
+                block_of[var] = i
+
+        seams = set()
+        for (var_1, var_2) in list(self.constraints.keys()) + self.get_spacing_pairs():
+            if block_of[var_1] != block_of[var_2]:
+                seams.add(var_1)
+                seams.add(var_2)
+        self.stats.count("seam_variables", len(seams))
+
+        for _ in range(10):
+            assignment = [None if var in seams else doctor for var, doctor in enumerate(schedule)]
+            result = local_search(100 * len(seams), assignment=assignment)[0]
+            if result:
+                return result
+            self.stats.count("seam_restarts")
+
+        return None
+
+    # Builds (once) and returns the CompiledCallSchedule for this problem. Requires NumPy.
+    def compile(self):
+        if self.compiled is None:
+            from CompiledCallSchedule import CompiledCallSchedule
+            self.compiled = CompiledCallSchedule(self)
+            self.compiled_domains_stale = False
+        return self.compiled
+
+    # Runs the local search on the compiled problem, using the current domains
+    def compiled_local_search(self, max_iters, assignment=None, print_iters=False):
+        compiled = self.compile()
+        if self.compiled_domains_stale:
+            compiled.set_domains(self.domains)
+            self.compiled_domains_stale = False
+        result, iters = compiled.local_search(max_iters, assignment=assignment, print_iters=print_iters,
+                                              out_of_time=self.out_of_time, gave_up=self.search_gave_up)
+        if result:
+            self.reset_assignment_state(result)
+        return result, iters
 
-        if max_num_weekdays - min_num_weekdays > 1:
-            change_weekdays = True
-        if max_num_weekends - min_num_weekends > 1:
-            change_weekends = True
+    # Returns True if the assignment has been altered, False otherwise
+    # Ensures all doctors have an equal number of weekdays and weekends,
+    #   and that the max_weekdays and max_weekends rules (if given) are followed
+    # The assignment must be the one the last search returned, as the counts are read from self.tallies
+    def remove_unfair_assignments(self, assignment):
+        doc_weekdays, doc_weekends, doc_holidays = self.tallies.get_doc_days()
 
-        # If we have an explicitly defined weekday schedule, do not change the weekdays!
-        if self.weekday_schedule:
-            change_weekdays = False
+        change_weekdays, change_weekends, min_num_weekdays, min_num_weekends = \
+            self.measure_unfairness(doc_weekdays, doc_weekends, doc_holidays)
 
         if not change_weekdays and not change_weekends:
             return False
@@ -187,10 +718,10 @@ class CallSchedulingProblem(ConstraintSatisfactionProblem):
         random.shuffle(rand_indices)
         for index in rand_indices:
             # If this is a weekend or holiday assignment
-            if type(self.variables[index]) == tuple:
+            if self.variable_kinds[index] != WEEKDAY:
 
                 # Do not change holidays
-                if self.variables[index] in self.holidays:
+                if self.variable_kinds[index] == HOLIDAY:
                     continue
 
                 # If we are going to change the weekend assignments
@@ -199,12 +730,10 @@ class CallSchedulingProblem(ConstraintSatisfactionProblem):
                     # If the doctor has too many weekends, wipe the assignment
                     if assignment[index] in self.max_weekends.keys():
                         if doc_weekends[assignment[index]] > self.max_weekends[assignment[index]]:
-                            doc_weekends[assignment[index]] -= 1
-                            assignment[index] = None
+                            self.__wipe_assignment(assignment, index, doc_weekends)
                             removed = True
                     if not removed and doc_weekends[assignment[index]] > min_num_weekends:
-                        doc_weekends[assignment[index]] -= 1
-                        assignment[index] = None
+                        self.__wipe_assignment(assignment, index, doc_weekends)
 
             else:
                 # If we are going to change the weekday assignments
@@ -213,301 +742,318 @@ class CallSchedulingProblem(ConstraintSatisfactionProblem):
                     # If the doctor has too many weekdays, wipe the assignment
                     if assignment[index] in self.max_weekdays.keys():
                         if doc_weekdays[assignment[index]] > self.max_weekdays[assignment[index]]:
-                            doc_weekdays[assignment[index]] -= 1
-                            assignment[index] = None
+                            self.__wipe_assignment(assignment, index, doc_weekdays)
                             removed = True
                     if not removed and doc_weekdays[assignment[index]] > min_num_weekdays:
-                        doc_weekdays[assignment[index]] -= 1
-                        assignment[index] = None
+                        self.__wipe_assignment(assignment, index, doc_weekdays)
 
         # Lock the domains to avoid re-adding weekdays or weekdays to doctors who have reached their max
         # This prevents the algorithm from continuously adding to these doctors, slowing it down
         # It is a greedy decision that has worked out in practice. But the original domains are kept in case it fails.
+        # A doctor is never locked out of a variable they are the last option for, which would leave nobody to assign
         for doc in self.max_weekdays.keys():
             if doc_weekdays[doc] == self.max_weekdays[doc]:
                 for i in range(len(self.domains)):
-                    # Ignore weekdays and holidays
-                    if type(self.variables[i]) == tuple or self.variables[i] in self.holidays:
+                    # Ignore weekends and holidays
+                    if self.variable_kinds[i] != WEEKDAY:
                         continue
-                    if doc in self.domains[i]:
+                    if doc in self.domains[i] and len(self.domains[i]) > 1:
                         self.domains[i].remove(doc)
+                        self.compiled_domains_stale = True
         for doc in self.max_weekends.keys():
             if doc_weekends[doc] == self.max_weekends[doc]:
                 for i in range(len(self.domains)):
-                    if type(self.variables[i]) != tuple:
+                    if self.variable_kinds[i] == WEEKDAY:
                         continue
-                    if doc in self.domains[i]:
+                    if doc in self.domains[i] and len(self.domains[i]) > 1:
                         self.domains[i].remove(doc)
+                        self.compiled_domains_stale = True
         return True
 
-    # If a variable has a domain of size 1 - just assign it. Allows for less work to be done from local-search
-    def get_initial_assignment(self):
-        initial_assignment = [None for _ in range(len(self.variables))]
+    # Empties the variable's assignment, and takes the day away from the doctor in doc_days and in the tallies
+    def __wipe_assignment(self, assignment, index, doc_days):
+        doctor = assignment[index]
+        doc_days[doctor] -= 1
+        assignment[index] = None
+        self.update_assignment_state(index, doctor, None)
+
+    # Measures how fair the given day counts are. Returns four values:
+    #   change_weekdays: True if the weekdays are unfair or a doctor is over their max_weekdays
+    #   change_weekends: True if the weekends + holidays are unfair or a doctor is over their max_weekends
+    #   min_num_weekdays, min_num_weekends: The fewest weekdays and weekends + holidays any doctor has, not counting
+    #       doctors that are already at their maximum
+    # Weekdays are never considered unfair if the weekday schedule is explicitly defined
+    def measure_unfairness(self, doc_weekdays, doc_weekends, doc_holidays):
+        # If the differences are small and there are no max days violations, we don't need to change the schedule
+        change_weekends = False
+        change_weekdays = False
 
-        for i in range(len(self.variables)):
-            if len(self.domains[i]) == 1:
-                initial_assignment[i] = self.domains[i][0]
+        # Measure the fairness for weekdays
+        min_num_weekdays = math.inf
+        max_num_weekdays = 0
+        for doc in doc_weekdays.keys():
+            if doc in self.max_weekdays.keys() and doc_weekdays[doc] > self.max_weekdays[doc]:
+                change_weekdays = True
 
-        return initial_assignment
+            if doc_weekdays[doc] > max_num_weekdays:
+                max_num_weekdays = doc_weekdays[doc]
 
-    # Given the start and end date, create a list of date objects representing each day that needs to be filled
-    def create_variable_dates(self):
-        # Create a curr_date for iterating - starting at the start date
-        curr_date = datetime.date(self.start_date.year, self.start_date.month, self.start_date.day)
-        time_delta_one = datetime.timedelta(days=1)
-
-        holiday_day_set = set()
-
-        # Better to do this once than have to loop through every time
-        for holiday in self.holidays:
-            for day in holiday:
-                holiday_day_set.add(day)
-
-        variables = []
-
-        # Loop until we are at the end date
-        while self.is_valid_date(curr_date):
-            # Explicitly consider holidays first
-            in_holiday = False
-            for holiday in self.holidays:
-                if curr_date in holiday:
-                    variables.append(holiday)
-                    self.holiday_indices.append(len(variables) - 1)
-                    in_holiday = True
-                while curr_date in holiday:
-                    in_holiday = True
-                    curr_date += time_delta_one
-
-            if in_holiday:
+            # Doctors at their maximum do not count towards the minimum
+            if doc in self.max_weekdays.keys() and doc_weekdays[doc] == self.max_weekdays[doc]:
                 continue
+            if doc_weekdays[doc] < min_num_weekdays:
+                min_num_weekdays = doc_weekdays[doc]
 
-            # Weekends: consider next weekend-days as one block (usually 3, could be less if interrupted by holidays)
-            # Note that holidays over the weekends encompass the whole weekend explicitly, so we do not do much
-            #   to handle any holiday shenanigans here
-            is_weekend = False
-            weekend = []
-            while curr_date.weekday() > 3:
-                is_weekend = True
-                weekend.append(curr_date)
-                curr_date += time_delta_one
-
-            if is_weekend:
-                variables.append(tuple(weekend))
+        # Measure the fairness for weekends
+        min_num_weekends = math.inf
+        max_num_weekends = 0
+        for doc in doc_weekends.keys():
+            if doc in self.max_weekends.keys() and doc_weekends[doc] > self.max_weekends[doc]:
+                change_weekends = True
+
+            if doc_weekends[doc] + doc_holidays[doc] > max_num_weekends:
+                max_num_weekends = doc_weekends[doc] + doc_holidays[doc]
+
+            if doc in self.max_weekends.keys() and doc_weekends[doc] == self.max_weekends[doc]:
                 continue
+            if doc_weekends[doc] + doc_holidays[doc] < min_num_weekends:
+                min_num_weekends = doc_weekends[doc] + doc_holidays[doc]
 
-            variables.append(curr_date)
-            curr_date += time_delta_one
+        if max_num_weekdays - min_num_weekdays > 1:
+            change_weekdays = True
+        if max_num_weekends - min_num_weekends > 1:
+            change_weekends = True
 
-        return variables
+        # If we have an explicitly defined weekday schedule, do not change the weekdays!
+        if self.weekday_schedule:
+            change_weekdays = False
 
-    # Parses the call file to gather all relevant information, such as whether there is a weekday schedule that is
-    #   already defined (might be necessary depending on hospital/practice). Otherwise, we can use the given available
-    #   weekdays
-    def parse_call_file_wrapper(self, call_file_path):
-        file_obj = open(call_file_path, "r")
-        first_line = file_obj.readline()
-        first_line = first_line.strip()
-        self.parse_call_file(file_obj, first_line)
-        file_obj.close()
-
-    # Recursively evaluates all commands in the file, no matter their order
-    # Base case --> curr_line reaches EOF, or there are no valid commands (and we print to stderr before continuing)
-    def parse_call_file(self, file_obj, curr_line):
-        # Only one of these should be in the file
-        if curr_line == "/defined_weekday_assignment":
-            curr_line = self.__defined_weekday_assignment_parse(file_obj)
-            self.parse_call_file(file_obj, curr_line)
-            return
-        elif curr_line == "/doctor_available_weekdays":
-            curr_line = self.__doctor_available_weekdays_parse(file_obj)
-            self.parse_call_file(file_obj, curr_line)
-            return
+        return change_weekdays, change_weekends, min_num_weekdays, min_num_weekends
 
-        # Unavailable days for the doctors
-        if curr_line == "/doctor_unavailable_days":
-            curr_line = self.__doctor_unavailable_days_parse(file_obj)
-            self.parse_call_file(file_obj, curr_line)
-            return
+    # Returns how unfair the assignment is, as a dictionary of:
+    #   weekday_spread, weekend_spread: The most minus the fewest weekdays, and weekends + holidays, that doctors have
+    #       (leaving out doctors at their maximum from the fewest, like measure_unfairness). The weekday spread is 0 if
+    #       the weekday schedule is defined.
+    #   days_over_max: The total number of days doctors have over their max_weekdays and max_weekends
+    #   fair: True if the assignment passes the fairness rules (see measure_unfairness)
+    def get_unfairness(self, assignment):
+        doc_weekdays, doc_weekends, doc_holidays = self.get_doc_days_assigned(assignment)
+        change_weekdays, change_weekends, min_num_weekdays, min_num_weekends = \
+            self.measure_unfairness(doc_weekdays, doc_weekends, doc_holidays)
+
+        weekday_spread = 0
+        if not self.weekday_schedule and doc_weekdays and min_num_weekdays != math.inf:
+            weekday_spread = max(doc_weekdays.values()) - min_num_weekdays
+        weekend_spread = 0
+        if doc_weekends and min_num_weekends != math.inf:
+            weekend_spread = max(doc_weekends[doc] + doc_holidays[doc] for doc in doc_weekends) - min_num_weekends
+
+        days_over_max = sum(max(0, doc_weekdays[doc] - max_days) for doc, max_days in self.max_weekdays.items()) + \
+            sum(max(0, doc_weekends[doc] - max_days) for doc, max_days in self.max_weekends.items())
+
+        return {"weekday_spread": weekday_spread, "weekend_spread": weekend_spread, "days_over_max": days_over_max,
+                "fair": not change_weekdays and not change_weekends}
+
+    # Searches for a valid and fair schedule with the fairness rules as a weighted soft cost inside the local search
+    #   (see soft_local_search), instead of wiping out unfair assignments and repairing them afterwards.
+    # The search is either "min_conflicts" (soft_local_search) or "annealing" (simulated_annealing)
+    # Restarts from a new random assignment if a search stalls, up to max_attempts times
+    def solve_with_soft_fairness(self, print_info=False, max_attempts=100, solver="min_conflicts"):
+        for attempt in range(1, max_attempts + 1):
+            if self.out_of_time():
+                return None
+            with self.stats.phase("soft_search"):
+                if solver == "annealing":
+                    schedule, iters = self.simulated_annealing(100 * len(self.variables), print_iters=print_info)
+                else:
+                    schedule, iters = self.soft_local_search(20 * len(self.variables), print_iters=print_info)
+            self.stats.count("local_searches")
+            self.stats.count("local_search_iterations", iters)
+            if schedule:
+                return schedule
+            self.stats.count("restarts")
 
-        # Holiday ranges
-        if curr_line == "/holiday_dates":
-            curr_line = self.__holiday_dates_parse(file_obj)
-            self.parse_call_file(file_obj, curr_line)
-            return
+            if print_info:
+                print("Soft fairness search attempt", attempt, "failed after", iters, "iterations")
+
+        print("Call scheduling potentially impossible", file=sys.stderr)
+        return None
+
+    # Keep the tallies and the spacing index in step with the assignment the solver is working on
+    def reset_assignment_state(self, assignment):
+        self.tallies.reset(assignment)
+        self.spacing.reset(assignment)
+
+    def update_assignment_state(self, variable, old_value, new_value):
+        self.tallies.update(variable, old_value, new_value)
+        self.spacing.update(variable, old_value, new_value)
+
+    # The spacing rule: the weekends and holidays the doctor already has within SPACING_DAYS of the variable
+    def extra_conflicts(self, variable, value):
+        return self.spacing.get_conflicts(variable, value)
+
+    # Returns an empty SpacingIndex over the variables with the given first date ordinals and kinds, where the weekends
+    #   and holidays are spaced
+    def __get_spacing_index(self, variable_ordinals, variable_kinds):
+        return SpacingIndex(self.doctors, variable_ordinals, [kind != WEEKDAY for kind in variable_kinds], SPACING_DAYS)
+
+    # Returns every (variable, other variable) pair, with variable < other variable, that the spacing rule covers
+    def get_spacing_pairs(self):
+        return [(var, other) for var in range(len(self.variables)) for other in self.spacing.get_window(var)
+                if var < other]
+
+    # Returns the broken constraints of the assignment (see ConstraintSatisfactionProblem.get_conflicts), as well as the
+    #   pairs of weekends and holidays that break the spacing rule
+    def get_conflicts(self, assignment):
+        return super().get_conflicts(assignment) + [(var, other) for (var, other) in self.get_spacing_pairs()
+                                                    if assignment[var] == assignment[other]]
+
+    # A valid assignment breaks no constraints and no spacing rules (see get_conflicts)
+    def is_valid_assignment(self, assignment):
+        return not self.get_conflicts(assignment)
+
+    # Returns a list of the variables of every broken constraint or spacing rule in the assignment
+    def get_conflicted_variables(self, assignment):
+        return list({var for pair in self.get_conflicts(assignment) for var in pair})
+
+    # make_arc_consistent (see ConstraintSatisfactionProblem), after first taking the doctor of every weekend or holiday
+    #   with only one doctor left (like a holiday) out of the domains of the weekends and holidays too close to it
+    def make_arc_consistent(self, domains=None):
+        if domains is None:
+            domains = TrailDomains(self.domains)
+
+        pinned = [var for var in range(len(self.variables)) if domains.size(var) == 1]
+        while pinned:
+            var = pinned.pop()
+            doctor = domains[var][0]
+            for other in self.spacing.get_window(var):
+                if not domains.contains(other, doctor):
+                    continue
+                domains.remove(other, doctor)
+                if domains.size(other) == 0:
+                    return False
+                if domains.size(other) == 1:
+                    pinned.append(other)
+
+        return super().make_arc_consistent(domains)
+
+    # MAC3 (see ConstraintSatisfactionProblem) with the spacing rule as well: the doctor is also taken out of the
+    #   domains of the unassigned weekends and holidays too close to the variable, and the arcs into those domains are
+    #   checked again along with the arcs into the variable
+    def MAC3(self, variable, value, assignment, domains):
+        arcs = [self.reverse_arcs[i] for i in range(self.neighbor_start[variable], self.neighbor_start[variable + 1])]
+        for other in self.spacing.get_window(variable):
+            if assignment[other] is not None or not domains.contains(other, value):
+                continue
+            domains.remove(other, value)
+            if domains.size(other) == 0:
+                return False
+            arcs.extend(self.reverse_arcs[i] for i in range(self.neighbor_start[other], self.neighbor_start[other + 1]))
+        return self.arc_consistency(domains, assignment, arcs)
+
+    # Fairness as a soft cost:
+    # Weekdays, and weekends + holidays, are balanced by adding the sum of the squared number of days each doctor has,
+    #   which is smallest when the days are spread evenly. Going over max_weekdays or max_weekends costs
+    #   max_days_weight for each extra day. All the counts are read from the live tallies.
+    def soft_cost_delta(self, variable, old_value, new_value):
+        # Keeping the same doctor changes nothing. The formula below would count it as moving a day to themselves.
+        if old_value == new_value:
+            return 0
+        kind = self.variable_kinds[variable]
+        counts = self.tallies.counts
+        if kind == WEEKDAY:
+            if self.weekday_schedule:
+                return 0
+            old_total = counts[WEEKDAY][old_value]
+            new_total = counts[WEEKDAY][new_value]
+            max_days = self.max_weekdays
+        else:
+            old_total = counts[WEEKEND][old_value] + counts[HOLIDAY][old_value]
+            new_total = counts[WEEKEND][new_value] + counts[HOLIDAY][new_value]
+            max_days = self.max_weekends if kind == WEEKEND else dict()
 
-        # Allows special treatment of doctors so that they have only so many weekdays or weekends
-        if curr_line == "/max_weekends" or curr_line == "/max_weekdays":
-            curr_line = self.__max_doctor_days_parse(file_obj, curr_line)
-            self.parse_call_file(file_obj, curr_line)
-            return
+        # Moving one day from old_value to new_value changes the sum of squares by 2 * (new - old) + 2
+        delta = 2 * (new_total - old_total) + 2
 
-        # Other doctors not mentioned elsewhere that should be added onto the schedule (probably just holidays/weekends)
-        if curr_line == "/additional_doctors":
-            curr_line = self.__other_doctors_parse(file_obj)
-            self.parse_call_file(file_obj, curr_line)
-            return
+        # Each day over a doctor's maximum adds max_days_weight
+        days = counts[kind]
+        if new_value in max_days and days[new_value] >= max_days[new_value]:
+            delta += self.max_days_weight
+        if old_value in max_days and days[old_value] > max_days[old_value]:
+            delta -= self.max_days_weight
 
-        # Invalid command
-        if curr_line:
-            print(f"Invalid command or line: {curr_line}", file=sys.stderr)
-
-        return
-
-    # Parses the weekday assignment lines to build the weekday_schedule
-    # Returns the (stripped) line that starts a new command, or None if we reach EOF
-    def __defined_weekday_assignment_parse(self, file_obj):
-
-        curr_line = file_obj.readline()
-        curr_line = curr_line.strip()
-        # Go until the file is over, or until we reach a new section
-        while curr_line and curr_line[0] != "/":
-            # We expect four doctors per line, split by ", " (comma and space)
-            doctor_assignments = curr_line.split(", ")
-            # Add the doctor to the set if they aren't already there
-            for doc in doctor_assignments:
-                self.doctors.add(doc)
-            # Append the week's schedule
-            self.weekday_schedule.append(doctor_assignments)
-            # Next line
-            curr_line = file_obj.readline()
-            curr_line = curr_line.strip()
-
-        # Return whatever line is next (new command or EOF)
-        return curr_line
-
-    # Builds the doc_available_weekdays dictionary of available weekdays for each doctor
-    # Returns the (stripped) line that starts a new command, or None if we reach EOF
-    def __doctor_available_weekdays_parse(self, file_obj):
-        curr_line = file_obj.readline()
-        curr_line = curr_line.strip()
-
-        # Continue until EOF or until next section
-        # Format: doctor; Monday, Wednesday ... (available weekdays separated by ", ")
-        while curr_line and curr_line[0] != "/":
-            components = curr_line.split("; ")
-            # Add the doctor to the doctor set
-            self.doctors.add(components[0])
-
-            # Look at the days of the week the doctor is available
-            days_of_week = components[1].split(", ")
-            for day in days_of_week:
-                self.doc_available_weekdays[day].append(components[0])
-
-            curr_line = file_obj.readline()
-            curr_line = curr_line.strip()
-
-        return curr_line
-
-    # Builds the doc_unavailable_days dictionary for each doctor
-    # Returns the (stripped) line that starts a new command, or None if we reach EOF
-    def __doctor_unavailable_days_parse(self, file_obj):
-        curr_line = file_obj.readline()
-        curr_line = curr_line.strip()
-
-        # Continue until EOF or until next section
-        while curr_line and curr_line[0] != "/":
-            # Format: doctor; mm/dd/yyyy, mm/dd/yyyy ...
-            components = curr_line.split("; ")
-            doctor = components[0]
-            # Add the doctor to the set if we haven't seen them yet
-            self.doctors.add(doctor)
-
-            doc_unavailable_days = components[1].split(", ")
-            for unavailable_day in doc_unavailable_days:
-                date_parts = unavailable_day.split("/")
-                date_obj = datetime.date(int(date_parts[2]), int(date_parts[0]), int(date_parts[1]))
-                # Add doctor to unavailable_days dict
-                if doctor in self.doc_unavailable_days.keys():
-                    self.doc_unavailable_days[doctor].append(date_obj)
-                else:
-                    self.doc_unavailable_days[doctor] = [date_obj]
-
-            curr_line = file_obj.readline()
-            curr_line = curr_line.strip()
-
-        return curr_line
-
-    # Builds the holidays set - a tuple of date(s) for each holiday
-    # Returns the (stripped) line that starts a new command, or None if we reach EOF
-    def __holiday_dates_parse(self, file_obj):
-        curr_line = file_obj.readline()
-        curr_line = curr_line.strip()
-
-        while curr_line and curr_line[0] != "/":
-            # Format: mm/dd/yyyy, mm/dd/yyyy, mm/dd/yyyy ...
-            #   Where the days are only one apart. Allows you to have holidays span more than one day if wanted
-            #   For instance - memorial day weekend can be a four-day holiday, so the line would have all four days
-            holiday_range = []
-            dates = curr_line.split(", ")
-            for date in dates:
-                date_parts = date.split("/")
-                date_obj = datetime.date(int(date_parts[2]), int(date_parts[0]), int(date_parts[1]))
-                holiday_range.append(date_obj)
-            self.holidays.add(tuple(holiday_range))
-
-            curr_line = file_obj.readline()
-            curr_line = curr_line.strip()
-
-        return curr_line
-
-    # Builds the max_weekends or max_weekdays dictionary based on the command in curr_line
-    # Returns the (stripped) line that starts a new command, or None if we reach EOF
-    def __max_doctor_days_parse(self, file_obj, curr_line):
-        # Adjust depending on specific command
-        weekends = curr_line == "/max_weekends"
-        weekdays = curr_line == "/max_weekdays"
-
-        curr_line = file_obj.readline()
-        curr_line = curr_line.strip()
-        while curr_line and curr_line[0] != "/":
-            components = curr_line.split("; ")
-            if weekends:
-                self.max_weekends[components[0]] = int(components[1])
-            elif weekdays:
-                self.max_weekdays[components[0]] = int(components[1])
-            curr_line = file_obj.readline()
-            curr_line = curr_line.strip()
-
-        return curr_line
-
-    # Adds doctors to the doctors set when who were not mentioned anywhere else, but you still want them on the schedule
-    # Returns the (stripped) line that starts a new command, or None if we reach EOF
-    def __other_doctors_parse(self, file_obj):
-        curr_line = file_obj.readline()
-        curr_line = curr_line.strip()
-        while curr_line and curr_line[0] != "/":
-            self.doctors.add(curr_line)
-            curr_line = file_obj.readline()
-            curr_line = curr_line.strip()
-
-        return curr_line
+        return delta
+
+    def soft_constraints_satisfied(self):
+        change_weekdays, change_weekends, _, _ = self.measure_unfairness(*self.tallies.counts)
+        return not change_weekdays and not change_weekends
+
+    # The weekdays or weekends assigned to doctors with more than the fewest days (or over their maximum)
+    def soft_candidate_variables(self, assignment):
+        doc_weekdays, doc_weekends, doc_holidays = self.tallies.counts
+        change_weekdays, change_weekends, min_num_weekdays, min_num_weekends = \
+            self.measure_unfairness(doc_weekdays, doc_weekends, doc_holidays)
+
+        candidates = []
+        for doc in self.doctors:
+            if change_weekdays and (doc_weekdays[doc] > min_num_weekdays or
+                                    doc_weekdays[doc] > self.max_weekdays.get(doc, math.inf)):
+                candidates.extend(self.tallies.get_doc_variables(WEEKDAY, doc))
+            if change_weekends and (doc_weekends[doc] + doc_holidays[doc] > min_num_weekends or
+                                    doc_weekends[doc] > self.max_weekends.get(doc, math.inf)):
+                candidates.extend(self.tallies.get_doc_variables(WEEKEND, doc))
+
+        # Variables with only one possible doctor cannot be moved
+        return [i for i in candidates if len(self.domains[i]) > 1]
+
+    # If a variable has a domain of size 1 - just assign it. Allows for less work to be done from local-search
+    def get_initial_assignment(self):
+        initial_assignment = [None for _ in range(len(self.variables))]
+
+        for i in range(len(self.variables)):
+            if len(self.domains[i]) == 1:
+                initial_assignment[i] = self.domains[i][0]
+
+        return initial_assignment
+
+    # Parses the call file to gather all relevant information, such as whether there is a weekday schedule that is
+    #   already defined (might be necessary depending on hospital/practice). Otherwise, we can use the given available
+    #   weekdays
+    # Raises a CallFileError listing every error in the file (see call_file_parser), before changing anything
+    def parse_call_file_wrapper(self, call_file_path):
+        with open(call_file_path, "r") as file_obj:
+            contents = parse_call_file(file_obj, call_file_path)
+
+        self.doctors = contents.doctors
+        self.weekday_schedule = contents.weekday_schedule
+        self.doc_available_weekdays = contents.doc_available_weekdays
+        self.doc_unavailable_ordinals = contents.doc_unavailable_ordinals
+        self.holidays = contents.holidays
+        self.max_weekends = contents.max_weekends
+        self.max_weekdays = contents.max_weekdays
+
+    # Makes doctors unavailable on the days in a CSV export of vacations (see read_unavailable_days_csv), on top of the
+    #   days they already have. Only the domains of the days that change are updated.
+    # Raises a CallFileError listing every invalid row (including doctors that are not on the schedule)
+    def import_unavailable_days(self, csv_path):
+        with open(csv_path, newline="") as f:
+            new_ordinals = read_unavailable_days_csv(f, self.doctors, csv_path)
+
+        changed_variables = set()
+        for doctor, ordinals in new_ordinals.items():
+            self.doc_unavailable_ordinals[doctor] |= ordinals
+            changed_variables |= self.__update_calendar_availability(doctor)
+        self.__refresh_domains(changed_variables)
 
     # Use the list of dates as well as all the doctor availability information to create the domains
     def get_domains(self):
         domains = [[] for _ in range(len(self.variables))]
-
-        # Fri Sat Sun considered as one block
-        weekday_labels = {0: "Monday", 1: "Tuesday", 2: "Wednesday", 3: "Thursday"}
+        # The doctor hardcoded to each holiday (by index), see add_unavailable_days
+        self.holiday_doctors = dict()
 
         rand_doc_list = list(self.doctors)
         random.shuffle(rand_doc_list)
 
-        # Give one holiday to each doctor - just hardcode it in the domains
-        # TODO: Handle cases of holiday weekends?
-        #  Or include it in the holiday dates so that those are on weekends.
-        for i in self.holiday_indices:
-            # We have fewer doctors than we do distinct holidays. So we need to repeat
-            if len(rand_doc_list) == 0:
-                rand_doc_list = list(self.doctors)
-                random.shuffle(rand_doc_list)
-
-            for doctor in rand_doc_list:
-                # We allow doctors to choose holidays as unavailable days
-                if self.variables[i] not in self.doc_unavailable_days[doctor]:
-                    domains[i] = [doctor]
-                    rand_doc_list.remove(doctor)
-                    break
-
         # Used for defined weekday schedules
         curr_weekday_index = 0
         curr_week_index = 0
@@ -515,15 +1061,16 @@ class CallSchedulingProblem(ConstraintSatisfactionProblem):
         # Maps weekdays to a list of doctors
         for date_index in range(len(self.variables)):
             variable = self.variables[date_index]
+            kind = self.calendar.variable_kinds[date_index]
 
             # If this is a weekend or holiday block
-            if type(variable) == tuple:
+            if kind != WEEKDAY:
                 # No more work necessary here if undefined weekly schedule
                 if not self.weekday_schedule:
                     continue
 
                 # If it is a holiday, we need to ensure that the rest of the defined schedule is not shifted
-                if variable in self.holidays:
+                if kind == HOLIDAY:
                     for day in variable:
                         # This is a weekend day, not relevant
                         if day.weekday() > 3:
@@ -546,101 +1093,80 @@ class CallSchedulingProblem(ConstraintSatisfactionProblem):
                     curr_week_index = (curr_week_index + 1) % len(self.weekday_schedule)
                 continue
 
-            # Otherwise get the day of week for an undefined schedule / doctor's have available weekdays
-            weekday = weekday_labels[variable.weekday()]
+        # Give one holiday to each doctor - just hardcode it in the domains
+        # This comes after the defined weekday schedule, so that a holiday is not given to the doctor pinned to the
+        #   weekday next to it (see __get_holiday_exclusions) unless there is no one else
+        # TODO: Handle cases of holiday weekends?
+        #  Or include it in the holiday dates so that those are on weekends.
+        for i in self.holiday_indices:
+            # We have fewer doctors than we do distinct holidays. So we need to repeat
+            if len(rand_doc_list) == 0:
+                rand_doc_list = list(self.doctors)
+                random.shuffle(rand_doc_list)
 
-            for avail_doc in self.doc_available_weekdays[weekday]:
-                # Check that this specific day is available for that doctor
-                if variable not in self.doc_unavailable_days[avail_doc]:
-                    domains[date_index].append(avail_doc)
+            # We allow doctors to choose holidays as unavailable days
+            # If everyone left in this round is excluded, a doctor from outside the round is used instead
+            excluded = self.__get_holiday_exclusions(i, domains)
+            available = [doctor for doctor in rand_doc_list if self.calendar.is_available(doctor, i)]
+            candidates = [doctor for doctor in available if doctor not in excluded] or \
+                [doctor for doctor in sorted(self.doctors) if doctor not in excluded and
+                 self.calendar.is_available(doctor, i)] or available
+            if candidates:
+                domains[i] = [candidates[0]]
+                self.holiday_doctors[i] = candidates[0]
+                if candidates[0] in rand_doc_list:
+                    rand_doc_list.remove(candidates[0])
 
         # Find empty/weekend domains and put all potential doctors in that domain
         for i in range(len(domains)):
             if len(domains[i]) > 0:
                 continue
-
-            for doctor in self.doctors:
-                # Ensure that there are no unavailable days this weekend block
-                if type(self.variables[i]) == tuple:
-                    available = True
-                    for day in self.variables[i]:
-                        if day in self.doc_unavailable_days[doctor]:
-                            available = False
-                            break
-                    if available:
-                        domains[i].append(doctor)
-                # Otherwise, just check that this date is not unavailable
-                elif self.variables[i] not in self.doc_unavailable_days[doctor]:
-                    domains[i].append(doctor)
+            domains[i] = self.get_available_doctors(i)
 
         return domains
 
+    # Returns the doctors who can work the variable at the index, without any holiday or weekday schedule pinning
+    # Weekdays only get the doctors available on that day of the week, unless none of them are
+    def get_available_doctors(self, index):
+        if self.calendar.variable_kinds[index] == WEEKDAY:
+            # The day of week for an undefined schedule / doctor's have available weekdays
+            weekday = WEEKDAY_LABELS[self.variables[index].weekday()]
+            doctors = [doctor for doctor in self.doc_available_weekdays[weekday]
+                       if self.calendar.is_available(doctor, index)]
+            if doctors:
+                return doctors
+
+        # Ensure that there are no unavailable days this day or weekend block
+        return [doctor for doctor in self.doctors if self.calendar.is_available(doctor, index)]
+
     # From the domains and variables, make it that we assign a max of one doctor per day
+    # Every rule here is "these two variables have different doctors", so every arc shares the NOT_EQUAL constraint
     def get_constraints(self):
         constraints = dict()
 
         # No consecutive days or day/weekend pairs for doctors
+        # Two weekends/holidays in a row are covered by the spacing rule instead (see self.spacing), so they get no arc
+        kinds = self.calendar.variable_kinds
         length = len(self.variables)
         for var_1 in range(length):
-            for var_2 in range(var_1 - 1, min(var_1 + 2, length)):
+            for var_2 in range(max(var_1 - 1, 0), min(var_1 + 2, length)):
                 if var_1 == var_2:
                     continue
 
-                # Don't mess with consecutive weekdays in a defined schedule
-                if self.weekday_schedule:
-                    if type(var_1) != tuple and type(var_2) != tuple:
-                        continue
-
-                constraints[(var_1, var_2)] = set()
-
-                for doc1 in self.domains[var_1]:
-                    for doc2 in self.domains[var_2]:
-                        if doc1 != doc2:
-                            constraints[(var_1, var_2)].add((doc1, doc2))
-
-        # No consecutive weekends or holiday/weekend
-        for var_1 in range(length):
-            # This is a weekday, so ignore
-            if type(self.variables[var_1]) != tuple:
-                continue
-
-            # Within a range of +/- 10 days...
-            for var_2 in range(max(var_1 - 10, 0), min(var_1 + 10, length)):
-                if var_2 == var_1:
+                if kinds[var_1] != WEEKDAY and kinds[var_2] != WEEKDAY:
                     continue
 
-                if type(self.variables[var_2]) != tuple:
+                # Don't mess with consecutive weekdays in a defined schedule
+                if self.weekday_schedule and kinds[var_1] == WEEKDAY and kinds[var_2] == WEEKDAY:
                     continue
 
-                constraints[(var_1, var_2)] = set()
-
-                for doc1 in self.domains[var_1]:
-                    for doc2 in self.domains[var_2]:
-                        if doc1 != doc2:
-                            constraints[(var_1, var_2)].add((doc1, doc2))
+                constraints[(var_1, var_2)] = NOT_EQUAL
 
         return constraints
 
     # Returns True if the date is between the start and end dates, False otherwise
     def is_valid_date(self, date):
-        if not self.start_date.year <= date.year <= self.end_date.year:
-            return False
-
-        if date.year == self.end_date.year:
-            if date.month > self.end_date.month:
-                return False
-            if date.month == self.end_date.month:
-                if date.day > self.end_date.day:
-                    return False
-
-        if date.year == self.start_date.year:
-            if date.month < self.start_date.month:
-                return False
-            if date.month == self.start_date.month:
-                if date.day < self.start_date.day:
-                    return False
-
-        return True
+        return self.calendar.contains_date(date)
 
     # Returns three dictionaries given an assignment:
     #  One: A dictionary of the number of weekdays assigned to each doctor
@@ -657,19 +1183,13 @@ class CallSchedulingProblem(ConstraintSatisfactionProblem):
             doc_weekends[doctor] = 0
             doc_holidays[doctor] = 0
 
+        doc_days = {WEEKDAY: doc_weekdays, WEEKEND: doc_weekends, HOLIDAY: doc_holidays}
         for var in range(len(assignment)):
             # Allows for counting of incomplete assignments
             if assignment[var] is None:
                 continue
 
-            # Weekend or holiday assigned
-            if type(self.variables[var]) == tuple:
-                if self.variables[var] in self.holidays:
-                    doc_holidays[assignment[var]] += 1
-                else:
-                    doc_weekends[assignment[var]] += 1
-            else:
-                doc_weekdays[assignment[var]] += 1
+            doc_days[self.variable_kinds[var]][assignment[var]] += 1
 
         return doc_weekdays, doc_weekends, doc_holidays
 
@@ -678,103 +1198,44 @@ class CallSchedulingProblem(ConstraintSatisfactionProblem):
             print("Date: ", self.variables[i])
             print("Doc assigned: ", assignment[i])
 
-    def write_out_solution(self, assignment, file_path):
+    # Writes the assignment to file_path in each of the formats (see schedule_writers.OUTPUT_FORMATS), all in one pass
+    #   over the assignment. By default, that is a week by week .txt file and a .csv file.
+    def write_out_solution(self, assignment, file_path, formats=DEFAULT_FORMATS):
         # In case they do not provide a filename
         if file_path[-1] == "/":
             file_path += "output_schedule"
 
-        self.__write_out_txt(assignment, file_path)
-        self.__write_out_csv(assignment, file_path)
+        with self.stats.phase("output"):
+            write_schedule(self, assignment, file_path, formats)
 
-    # Writes out the solution week by week as a text file
-    def __write_out_txt(self, assignment, file_path):
-        f = open(file_path + ".txt", "w")
-        line = ""
-        max_name_length = 0
 
-        for doc in self.doctors:
-            if len(doc) > max_name_length:
-                max_name_length = len(doc)
+# Sorts scores (see CallSchedulingProblem.score_schedule) from best to worst
+def _score_key(score):
+    return (score["conflicts"], not score["fair"],
+            score["weekday_spread"] + score["weekend_spread"] + score["days_over_max"])
 
-        for var in range(len(assignment)):
-            # Weekend or Holiday
-            if type(self.variables[var]) == tuple:
-                for date in self.variables[var]:
-                    # New week
-                    if date.weekday() == 0:
-                        if date == self.start_date:
-                            continue
-                        line += "\n"
-                        f.write(line)
-                        separator_string = "-" * len(line) + "\n"
-                        f.write(separator_string)
-                        line = ""
-                    num_additional_spaces = max_name_length - len(assignment[var])
-                    line += "| " + str(date) + " : " + assignment[var] + (" " * num_additional_spaces) + " |"
-                continue
 
-            # New week
-            if self.variables[var].weekday() == 0 and self.variables[var] != self.start_date:
-                line += "\n"
-                f.write(line)
-                separator_string = "-" * len(line) + "\n"
-                f.write(separator_string)
-                line = ""
-            num_additional_spaces = max_name_length - len(assignment[var])
-            line += "| " + str(self.variables[var]) + " : " + assignment[var] + (" " * num_additional_spaces) + " |"
+# The problem each portfolio worker process solves, set once by _init_portfolio_worker
+_portfolio_problem = None
 
-        f.write(line)
-        f.close()
 
-    # Writes out the solution to a csv file
-    def __write_out_csv(self, assignment, file_path):
-        f = open(file_path + ".csv", "w")
+def _init_portfolio_worker(problem):
+    global _portfolio_problem
+    _portfolio_problem = problem
 
-        # Create the lists for the number of weekdays/weekends/holidays assigned
-        doc_weekdays, doc_weekends, doc_holidays = self.get_doc_days_assigned(assignment)
-        day_count_csv = []
-        weekday_header = ["Doctor", "Number of Weekdays Assigned"]
-        weekend_header = ["Doctor", "Number of Weekends Assigned"]
-        holiday_header = ["Doctor", "Number of Holidays Assigned"]
-        day_count_csv.append(weekday_header)
-        for doc in doc_weekdays.keys():
-            day_count_csv.append([doc, doc_weekdays[doc]])
-        day_count_csv.append([])
-        day_count_csv.append(weekend_header)
-        for doc in doc_weekends.keys():
-            day_count_csv.append([doc, doc_weekends[doc]])
-        day_count_csv.append([])
-        day_count_csv.append(holiday_header)
-        for doc in doc_holidays.keys():
-            day_count_csv.append([doc, doc_holidays[doc]])
-        day_count_csv.append([])
-
-        # Create the lists for just the holidays
-        holiday_header = ["Holiday Date", "Doctor Assigned"]
-        holiday_csv = [holiday_header]
-        for holiday in self.holiday_indices:
-            for date in self.variables[holiday]:
-                holiday_csv.append([str(date), assignment[holiday]])
-            # So that we have a blank line in the csv between holidays
-            holiday_csv.append([])
-        holiday_csv.append([])
-
-        # Now create the lists for the full calendar
-        calendar_header = ["Date", "Doctor Assigned"]
-        csv_var_assignment = []
-        for i in range(len(assignment)):
-            if type(self.variables[i]) != tuple:
-                csv_var_assignment.append([str(self.variables[i]), assignment[i]])
-            else:
-                for date in self.variables[i]:
-                    csv_var_assignment.append([str(date), assignment[i]])
-
-        csvwriter = csv.writer(f)
-        csvwriter.writerows(day_count_csv)
-        csvwriter.writerows(holiday_csv)
-        csvwriter.writerow(calendar_header)
-        csvwriter.writerows(csv_var_assignment)
-        f.close()
+
+# Solves one block of a windowed solve with the given seed, see CallSchedulingProblem.solve_windowed
+def _solve_block(task):
+    block, seed, solve_options = task
+    random.seed(seed)
+    return block.solve_for_call_schedule(**solve_options)
+
+
+# Solves the worker's problem with the given seed, see CallSchedulingProblem.solve_in_parallel
+def _portfolio_solve(task):
+    seed, solve_options = task
+    random.seed(seed)
+    return _portfolio_problem.solve_for_call_schedule(**solve_options)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,193 @@
+import random
+
+import numpy as np
+
+from CallCalendar import WEEKDAY, WEEKEND, HOLIDAY
+from csp_constraints import NotEqualConstraint
+from csp_helper_functions import DEADLINE_CHECK_INTERVAL
+from IndexedSet import IndexedSet
+
+
+# An integer encoding of a CallSchedulingProblem, so that the solver works on small ints and NumPy arrays rather than
+#   doctor names and dates. Doctor IDs are indices into doctor_names, and are only mapped back to names on output.
+# Every constraint in a call schedule is "these two variables have different doctors", so the arcs are stored as
+#   plain index arrays without any per-arc constraint objects. The spacing rule between weekends and holidays (see
+#   SpacingIndex) has no arcs in the problem, so its pairs are found once from their sorted first dates and then used
+#   like arcs.
+class CompiledCallSchedule:
+
+    # Takes a (fully built) CallSchedulingProblem
+    def __init__(self, problem):
+        self.doctor_names = sorted(problem.doctors)
+        self.doctor_ids = {doctor: i for i, doctor in enumerate(self.doctor_names)}
+        self.num_doctors = len(self.doctor_names)
+        self.num_variables = len(problem.variables)
+
+        # The first date (as an ordinal) of each variable, and whether it is a weekday, weekend or holiday
+        self.variable_ordinals = np.array(problem.variable_ordinals, dtype=np.int64)
+        self.variable_kinds = np.array(problem.variable_kinds, dtype=np.int8)
+
+        # The weekends and holidays, and their first dates (in order), for the spacing rule
+        self.spaced_vars = np.flatnonzero(self.variable_kinds != WEEKDAY)
+        self.spaced_ordinals = self.variable_ordinals[self.spaced_vars]
+        self.spacing_days = problem.spacing.spacing_days
+
+        # domain_matrix[var, doc] is True if the doctor is in the variable's domain, and domain_ids[var] lists the
+        #   doctor IDs in it
+        self.domain_matrix = np.zeros((self.num_variables, self.num_doctors), dtype=bool)
+        self.domain_ids = []
+        self.set_domains(problem.domains)
+
+        for constraint in problem.neighbor_constraints:
+            if not isinstance(constraint, NotEqualConstraint):
+                raise ValueError("The compiled call schedule only supports not-equal constraints")
+
+        # The constraint graph in CSR form, and every (directed) arc as a pair of index arrays
+        self.neighbor_start = np.array(problem.neighbor_start, dtype=np.int64)
+        self.neighbor_vars = np.array(problem.neighbor_vars, dtype=np.int64)
+        self.arc_sources = np.repeat(np.arange(self.num_variables, dtype=np.int64), np.diff(self.neighbor_start))
+        self.arc_targets = self.neighbor_vars
+        # The spacing rule's pairs only depend on the dates, so they are found once
+        self.spacing_sources, self.spacing_targets = self.get_spacing_arcs()
+
+        # Each variable's neighbors through an arc or the spacing rule, as plain lists: the local search looks at one
+        #   variable at a time, where NumPy's overhead on such small arrays costs more than it saves
+        sources = np.concatenate((self.arc_sources, self.spacing_sources))
+        targets = np.concatenate((self.arc_targets, self.spacing_targets))
+        order = np.argsort(sources, kind="stable")
+        all_start = np.searchsorted(sources[order], np.arange(self.num_variables + 1)).tolist()
+        all_targets = targets[order].tolist()
+        self.neighbor_lists = [all_targets[all_start[var]:all_start[var + 1]] for var in range(self.num_variables)]
+
+    # Rebuilds the domain matrix from a list of doctor-name domains (e.g. after the solver locks some domains)
+    def set_domains(self, domains):
+        self.domain_matrix[:, :] = False
+        for var in range(len(domains)):
+            for doctor in domains[var]:
+                self.domain_matrix[var, self.doctor_ids[doctor]] = True
+        self.domain_ids = [np.flatnonzero(row).tolist() for row in self.domain_matrix]
+
+    # Converts a list of doctor names (or None) to an array of doctor IDs, where -1 is unassigned
+    def encode(self, assignment):
+        return np.array([-1 if doctor is None else self.doctor_ids[doctor] for doctor in assignment], dtype=np.int64)
+
+    # Converts an array (or list) of doctor IDs back to a list of doctor names
+    def decode(self, assignment_ids):
+        return [None if doc_id < 0 else self.doctor_names[doc_id] for doc_id in np.asarray(assignment_ids).tolist()]
+
+    # Returns every pair of weekends/holidays within spacing_days of each other as (sources, targets) arrays, with each
+    #   pair in both directions like the arcs. Since the first dates are sorted, the pairs are found by comparing each
+    #   weekend with the one offset places later, until no pair at that offset is close enough.
+    def get_spacing_arcs(self):
+        sources = [self.spaced_vars[:0]]
+        targets = [self.spaced_vars[:0]]
+        for offset in range(1, len(self.spaced_vars)):
+            close = self.spaced_ordinals[offset:] - self.spaced_ordinals[:-offset] <= self.spacing_days
+            if not close.any():
+                break
+            sources.append(self.spaced_vars[:-offset][close])
+            targets.append(self.spaced_vars[offset:][close])
+        first, second = np.concatenate(sources), np.concatenate(targets)
+        return np.concatenate((first, second)), np.concatenate((second, first))
+
+    # Returns an array of the number of violated arcs (and broken spacing rules) touching each variable
+    def count_conflicts(self, assignment_ids):
+        counts = np.zeros(self.num_variables, dtype=np.int64)
+        for sources, targets in ((self.arc_sources, self.arc_targets),
+                                 (self.spacing_sources, self.spacing_targets)):
+            source_values = assignment_ids[sources]
+            violated = (source_values == assignment_ids[targets]) & (source_values >= 0)
+            counts += np.bincount(sources[violated], minlength=self.num_variables)
+        return counts
+
+    # Returns a (3, num_doctors) array of the number of weekdays, weekends and holidays assigned to each doctor
+    def count_doc_days(self, assignment_ids):
+        assigned = assignment_ids >= 0
+        flat_counts = np.bincount(self.variable_kinds[assigned].astype(np.int64) * self.num_doctors +
+                                  assignment_ids[assigned], minlength=3 * self.num_doctors)
+        return flat_counts.reshape(3, self.num_doctors)
+
+    # Same output as CallSchedulingProblem.get_doc_days_assigned, but counted with NumPy
+    def get_doc_days_assigned(self, assignment):
+        counts = self.count_doc_days(self.encode(assignment)).tolist()
+        return tuple({doctor: counts[kind][doc_id] for doctor, doc_id in self.doctor_ids.items()}
+                     for kind in (WEEKDAY, WEEKEND, HOLIDAY))
+
+    # Min-conflicts local search on the integer encoding, with the same behavior as
+    #   ConstraintSatisfactionProblem.local_search: if an assignment (of doctor names) is given, only its empty values
+    #   are filled in and edited.
+    # The conflicts are counted with NumPy once, then kept up to date one move at a time, like ConflictTracker does
+    # out_of_time is checked every DEADLINE_CHECK_INTERVAL iterations, and the search gives up once it returns True. A
+    #   search that gives up passes the assignment it ended on (of doctor names) and its number of conflicts to
+    #   gave_up, if given.
+    # Returns a valid assignment of doctor names (if found) and the number of iterations it took to find it
+    def local_search(self, max_iters, assignment=None, print_iters=False, out_of_time=None, gave_up=None):
+        if not assignment:
+            assignment_ids = [random.choice(domain) for domain in self.domain_ids]
+            can_change = [True for _ in range(self.num_variables)]
+        else:
+            assignment_ids = self.encode(assignment).tolist()
+            can_change = [doc_id < 0 for doc_id in assignment_ids]
+            for var in range(self.num_variables):
+                if can_change[var]:
+                    assignment_ids[var] = random.choice(self.domain_ids[var])
+
+        encoded = np.array(assignment_ids, dtype=np.int64)
+        # A conflict between two variables we are not allowed to change can never be fixed
+        fixed = ~np.array(can_change)
+        for sources, targets in ((self.arc_sources, self.arc_targets), (self.spacing_sources, self.spacing_targets)):
+            if np.any(fixed[sources] & fixed[targets] & (encoded[sources] == encoded[targets])):
+                if print_iters:
+                    print("Given assignment has conflicts that cannot be changed")
+                return None, 0
+
+        conflict_counts = self.count_conflicts(encoded).tolist()
+        conflicted_variables = IndexedSet(var for var in range(self.num_variables)
+                                          if conflict_counts[var] > 0 and can_change[var])
+
+        curr_iters = 0
+        while len(conflicted_variables) > 0:
+            if curr_iters > max_iters or (curr_iters % DEADLINE_CHECK_INTERVAL == 0 and out_of_time and out_of_time()):
+                if print_iters:
+                    print("Maximum number of iterations or time reached")
+                if gave_up:
+                    # Each violated pair is counted at both of its ends
+                    gave_up(self.decode(assignment_ids), sum(conflict_counts) // 2)
+                return None, curr_iters
+            curr_iters += 1
+
+            variable = conflicted_variables.random_choice()
+            neighbors = self.neighbor_lists[variable]
+
+            # The number of neighbors already using each doctor is the number of conflicts for that doctor
+            value_conflicts = [0] * self.num_doctors
+            for neighbor in neighbors:
+                value_conflicts[assignment_ids[neighbor]] += 1
+            domain = self.domain_ids[variable]
+            fewest = min(value_conflicts[doc_id] for doc_id in domain)
+            new_value = random.choice([doc_id for doc_id in domain if value_conflicts[doc_id] == fewest])
+
+            old_value = assignment_ids[variable]
+            if new_value == old_value:
+                continue
+
+            # Only the neighbors of the reassigned variable have their conflict counts change
+            for neighbor in neighbors:
+                neighbor_value = assignment_ids[neighbor]
+                if neighbor_value == old_value:
+                    conflict_counts[neighbor] -= 1
+                    if conflict_counts[neighbor] == 0:
+                        conflicted_variables.discard(neighbor)
+                elif neighbor_value == new_value:
+                    conflict_counts[neighbor] += 1
+                    if can_change[neighbor]:
+                        conflicted_variables.add(neighbor)
+            conflict_counts[variable] = fewest
+            if fewest == 0:
+                conflicted_variables.discard(variable)
+            assignment_ids[variable] = new_value
+
+        if print_iters:
+            print("Total loops", curr_iters)
+
+        return self.decode(assignment_ids), curr_iters
@@ -0,0 +1,98 @@
+from IndexedSet import IndexedSet
+
+
+# Keeps the number of violated constraints for each variable of a complete assignment up to date as variables are
+#   reassigned, so that local searches only look at the neighbors of the variable that changed
+# can_change is an optional function that returns False for variables the search may not edit. Those are never put in
+#   the conflicted_variables set, even if they have conflicts
+# Every reassignment is also passed on to the csp's update_assignment_state. The conflicts under the csp's extra rules
+#   (see extra_conflicts) are counted too, so its assignment state must already be reset to the assignment.
+class ConflictTracker:
+    def __init__(self, csp, assignment, can_change=None):
+        self.csp = csp
+        self.neighbor_start = csp.neighbor_start
+        self.neighbor_vars = csp.neighbor_vars
+        self.neighbor_constraints = csp.neighbor_constraints
+        self.extra_conflicts = csp.extra_conflicts
+        self.assignment = assignment
+        self.can_change = can_change
+
+        self.conflict_counts = [0 for _ in range(len(assignment))]
+        # The number of violated arcs (counting each pair of neighbors once)
+        self.total_conflicts = 0
+        for var in range(len(assignment)):
+            for i in range(self.neighbor_start[var], self.neighbor_start[var + 1]):
+                if not self.neighbor_constraints[i].is_satisfied(assignment[var], assignment[self.neighbor_vars[i]]):
+                    self.conflict_counts[var] += 1
+                    if var < self.neighbor_vars[i]:
+                        self.total_conflicts += 1
+            for other in self.extra_conflicts(var, assignment[var]):
+                self.conflict_counts[var] += 1
+                if var < other:
+                    self.total_conflicts += 1
+
+        self.conflicted_variables = IndexedSet(var for var in range(len(assignment))
+                                               if self.conflict_counts[var] > 0 and self.is_changeable(var))
+
+    def is_changeable(self, var):
+        return self.can_change is None or self.can_change(var)
+
+    # Returns True if two variables that cannot be changed conflict with each other, which no search can fix
+    def has_fixed_conflicts(self):
+        for var in range(len(self.assignment)):
+            if self.conflict_counts[var] == 0 or self.is_changeable(var):
+                continue
+            for i in range(self.neighbor_start[var], self.neighbor_start[var + 1]):
+                neighbor = self.neighbor_vars[i]
+                if not self.is_changeable(neighbor) and \
+                        not self.neighbor_constraints[i].is_satisfied(self.assignment[var], self.assignment[neighbor]):
+                    return True
+            if not all(self.is_changeable(other) for other in self.extra_conflicts(var, self.assignment[var])):
+                return True
+        return False
+
+    # Returns the number of neighbors the variable would conflict with if it were given this value
+    def count_value_conflicts(self, variable, value):
+        num_conflicts = 0
+        for i in range(self.neighbor_start[variable], self.neighbor_start[variable + 1]):
+            if not self.neighbor_constraints[i].is_satisfied(value, self.assignment[self.neighbor_vars[i]]):
+                num_conflicts += 1
+        return num_conflicts + len(self.extra_conflicts(variable, value))
+
+    # Assigns the value to the variable, and updates the conflict counts of the variable and its neighbors
+    def reassign(self, variable, value):
+        old_value = self.assignment[variable]
+        self.assignment[variable] = value
+        if old_value == value:
+            return
+        # The extra conflicts are read from the assignment state, so the old ones are found before it is updated
+        for other in self.extra_conflicts(variable, old_value):
+            self.__change_conflicts(variable, other, -1)
+        self.csp.update_assignment_state(variable, old_value, value)
+        for other in self.extra_conflicts(variable, value):
+            self.__change_conflicts(variable, other, 1)
+
+        for i in range(self.neighbor_start[variable], self.neighbor_start[variable + 1]):
+            neighbor = self.neighbor_vars[i]
+            constraint = self.neighbor_constraints[i]
+            was_violated = not constraint.is_satisfied(old_value, self.assignment[neighbor])
+            is_violated = not constraint.is_satisfied(value, self.assignment[neighbor])
+            if was_violated == is_violated:
+                continue
+            self.__change_conflicts(variable, neighbor, 1 if is_violated else -1)
+
+        self.__update_conflicted(variable)
+
+    # Adds change to the conflict counts of the variable and the other variable it (no longer) conflicts with, and to
+    #   the total
+    def __change_conflicts(self, variable, other, change):
+        self.conflict_counts[variable] += change
+        self.conflict_counts[other] += change
+        self.total_conflicts += change
+        self.__update_conflicted(other)
+
+    def __update_conflicted(self, var):
+        if self.conflict_counts[var] > 0 and self.is_changeable(var):
+            self.conflicted_variables.add(var)
+        else:
+            self.conflicted_variables.discard(var)
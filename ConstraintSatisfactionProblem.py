@@ -1,18 +1,37 @@
 from collections import deque
+from math import exp, inf
 import random
-import copy
+import time
+from BitsetDomains import BitsetDomains
+from ConflictTracker import ConflictTracker
+from constraint_graph import build_adjacency, build_reverse_arcs
 from csp_helper_functions import *
+from TabuMemory import DEFAULT_TABU_TENURE, TabuMemory
+from TrailDomains import TrailDomains
+from csp_constraints import as_constraint
+from SolverStats import NO_STATS
 
 # Author: Ben Williams '25
 # Date: October 8th, 2023
 
 
 class ConstraintSatisfactionProblem:
-    def __init__(self, variables, domains, constraints):
+    # If a SolverStats is given as stats, the searches record their conflicts over time in it
+    def __init__(self, variables, domains, constraints, stats=None):
         self.variables = variables
         self.domains = domains
-        self.constraints = constraints
+        # Constraints can be given as constraint objects, or as sets of allowed pairs (wrapped as TableConstraints)
+        self.constraints = {arc: as_constraint(constraint) for arc, constraint in constraints.items()}
         self.total_search_calls = 0
+        self.stats = stats if stats is not None else NO_STATS
+        # A time.perf_counter() value after which the searches give up, or None to search without a time limit
+        self.deadline = None
+
+        # The constraint graph is sparse, so we index it once here and drive the solvers from the neighbor lists
+        #   rather than probing the constraints dictionary for every pair of variables
+        self.neighbor_start, self.neighbor_vars, self.neighbor_constraints = \
+            build_adjacency(len(self.variables), self.constraints)
+        self.arc_sources, self.reverse_arcs = build_reverse_arcs(self.neighbor_start, self.neighbor_vars)
 
     # Recursive solver that tries every possibility until we find one that works
     # Returns a list of assignments if there is a valid solution, and None if there is no solution
@@ -44,160 +63,256 @@ class ConstraintSatisfactionProblem:
     # Returns True if valid, False otherwise
     def is_valid_assignment(self, assignment):
         for (variable, possible_conflict) in self.constraints.keys():
-            # Check if the assignment is in the set of allowed constraints
-            assigned_pair = assignment[variable], assignment[possible_conflict]
-            if assigned_pair not in self.constraints[(variable, possible_conflict)]:
+            # Check if the assignment satisfies the constraint
+            constraint = self.constraints[(variable, possible_conflict)]
+            if not constraint.is_satisfied(assignment[variable], assignment[possible_conflict]):
                 return False
 
         return True
 
-    # Recursive solver that uses backtracking to find a valid assignment
+    # Solver that uses backtracking to find a valid assignment
     # It can also use heuristics alongside inference to speed up the search
-    def backtracking_solver(self, assignment=None, domains=None, inference=None, select_variable=None, order_domain=None):
-        self.total_search_calls += 1
-
+    # The domains are kept in a TrailDomains, so inference prunes them in place and going back up the search is undoing
+    #   the trail to where it was before the variable was assigned. The search keeps its own stack rather than
+    #   recursing, so the number of variables is not limited by Python's recursion limit
+    # inference(variable, value, assignment, domains) removes values with domains.remove(), and returns False if the
+    #   value cannot work
+    # Returns a list of assignments if there is a valid solution, and None if there is no solution (or the deadline
+    #   passes first, see out_of_time)
+    def backtracking_solver(self, assignment=None, domains=None, inference=None, select_variable=None,
+                            order_domain=None):
         # Instantiate the assignment and domains if they don't exist
         if not assignment:
             assignment = [None for i in range(len(self.variables))]
-        if not domains:
-            # Copy the self.domains into domains so that the self.domains is unaltered
-            # We need the copy.deepcopy() because we are copying a list of objects (lists), which takes more effort
-            domains = copy.deepcopy(self.domains)
-
-        # Select the unassigned variable via the heuristic if it is available
-        if select_variable:
-            variable = select_variable(assignment, domains)
-        # Otherwise, just select the first unassigned variable
-        else:
-            variable = first_unassigned_variable(assignment)
-
-        # Base case - We could not find an unassigned variable
-        if variable is None:
-            return assignment
-
-        # Use an ordered domain heuristic if it is available
-        if order_domain:
-            variable_domain = order_domain(variable, assignment, domains)
-        # Otherwise, just get the domain for the variable (stored in our curr_assignment)
-        else:
-            variable_domain = domains[variable]
-
-        # Loop through all possible values we could assign this variable
-        for value in variable_domain:
-            # Ignore inconsistent values
-            if not self.is_consistent_value(variable, value, assignment):
-                continue
-
-            # Partial assignment of this value
-            assignment[variable] = value
-
-            if inference:
-                inference_success, removed_values = inference(variable, value, assignment, domains)
-            # We do not perform any inference, and therefore always continue
-            else:
-                inference_success, removed_values = True, []
+        if domains is None:
+            domains = TrailDomains(self.domains)
+        elif not isinstance(domains, TrailDomains):
+            domains = TrailDomains(domains)
+        # The extra rules (see extra_conflicts) are checked against the assignment state of the partial assignment
+        self.reset_assignment_state(assignment)
+
+        # One frame per assigned variable: [variable, ordered values, index of the next value to try, trail marker]
+        frames = []
+        go_deeper = True
+        while True:
+            if go_deeper:
+                self.total_search_calls += 1
+                if self.total_search_calls % DEADLINE_CHECK_INTERVAL == 0 and self.out_of_time():
+                    return None
+
+                # Select the unassigned variable via the heuristic if it is available
+                if select_variable:
+                    variable = select_variable(assignment, domains)
+                # Otherwise, just select the first unassigned variable
+                else:
+                    variable = first_unassigned_variable(assignment)
+
+                # Base case - We could not find an unassigned variable
+                if variable is None:
+                    return assignment
+
+                # Use an ordered domain heuristic if it is available
+                if order_domain:
+                    variable_domain = order_domain(variable, assignment, domains)
+                else:
+                    variable_domain = domains[variable]
+
+                frames.append([variable, variable_domain, 0, domains.mark()])
+
+            # We have tried every value for every variable
+            if not frames:
+                return None
+
+            frame = frames[-1]
+            variable, variable_domain, next_index, marker = frame
+
+            # Undo the last value we tried for this variable (and everything inferred from it)
+            self.update_assignment_state(variable, assignment[variable], None)
+            assignment[variable] = None
+            domains.undo_to(marker)
 
-            # Either the inference succeeded, or we were not performing it
-            if inference_success:
-                # Prune the domains (will not do anything if there is no inference)
-                remove_from_domains(removed_values, domains)
+            # Find the next value that is consistent and survives inference
+            go_deeper = False
+            while next_index < len(variable_domain):
+                value = variable_domain[next_index]
+                next_index += 1
 
-                result = self.backtracking_solver(assignment, domains, inference, select_variable, order_domain)
+                # Ignore inconsistent values
+                if not self.is_consistent_value(variable, value, assignment):
+                    continue
 
-                # If the search was a success
-                if result:
-                    return result
+                # Partial assignment of this value
+                assignment[variable] = value
+                self.update_assignment_state(variable, None, value)
+                if not inference or inference(variable, value, assignment, domains):
+                    go_deeper = True
+                    break
 
-            # Reset the assignment to None, value does not work for this assignment
-            assignment[variable] = None
-            # Restore the domains to their original state
-            if removed_values:
-                add_to_domains(removed_values, domains)
+                # Value does not work for this assignment
+                assignment[variable] = None
+                self.update_assignment_state(variable, value, None)
+                domains.undo_to(marker)
 
-        return None
+            frame[2] = next_index
+            if not go_deeper:
+                frames.pop()
 
     # Checks if this value that we are assigning this variable is consistent with our current assignment
     # Returns True if consistent, False otherwise
     def is_consistent_value(self, variable, value, assignment):
-        for assigned_var in range(len(assignment)):
+        # Only the neighbors of the variable can make this value illegal
+        for i in range(self.neighbor_start[variable], self.neighbor_start[variable + 1]):
+            assigned_var = self.neighbor_vars[i]
             # Ignore currently unassigned values
             if assignment[assigned_var] is None:
                 continue
 
             # Check for an illegal assignment
-            if (assigned_var, variable) in self.constraints.keys():
-                if (assignment[assigned_var], value) not in self.constraints[(assigned_var, variable)]:
-                    return False
+            if not self.neighbor_constraints[i].is_satisfied(value, assignment[assigned_var]):
+                return False
+
+        # The extra rules are read from the assignment state, which only has the assigned variables
+        if self.extra_conflicts(variable, value):
+            return False
 
         # None of the assignments are illegal
         return True
 
+    # Returns the (variable, other variable) pairs, with variable < other variable, whose constraint the assignment
+    #   breaks
+    def get_conflicts(self, assignment):
+        return [(var_1, var_2) for (var_1, var_2), constraint in self.constraints.items()
+                if var_1 < var_2 and not constraint.is_satisfied(assignment[var_1], assignment[var_2])]
+
     # Returns the stored number of search calls and resets it to zero
     def get_and_reset_search_calls(self):
         search_calls = self.total_search_calls
         self.total_search_calls = 0
         return search_calls
 
-    # MAC3 Inference algorithm that only makes changes around the given variables neighbors
+    # MAC3 Inference algorithm (maintaining arc consistency) for the backtracking solver
+    # After the variable is assigned the value, makes every unassigned variable arc consistent again: it starts from the
+    #   arcs (neighbor, variable) and keeps going through the arcs into any domain that shrinks (see arc_consistency)
+    # Returns False if a domain has no values left
     def MAC3(self, variable, value, assignment, domains):
+        queue = [self.reverse_arcs[i] for i in range(self.neighbor_start[variable], self.neighbor_start[variable + 1])]
+        return self.arc_consistency(domains, assignment, queue)
+
+    # AC-3 over the given arcs (positions in neighbor_vars), or over every arc in the problem if arcs is None
+    # Removes the values from each unassigned variable's domain that have no supporting value in a neighbor (an assigned
+    #   neighbor only supports its assigned value). Whenever a domain shrinks, the arcs into it from its other
+    #   unassigned neighbors are checked again.
+    # domains is a TrailDomains or BitsetDomains, and is pruned in place
+    # Returns False if a domain has no values left, and True otherwise
+    def arc_consistency(self, domains, assignment=None, arcs=None):
+        if assignment is None:
+            assignment = [None for i in range(len(self.variables))]
+        if arcs is None:
+            arcs = range(len(self.neighbor_vars))
+
         queue = deque()
-        # Add all (neighbor, variable) pairs to the queue for unassigned neighbors
-        variable_neighbors = self.get_neighbors(variable)
-        for neighbor in variable_neighbors:
-            if assignment[neighbor] is not None:
-                queue.append((neighbor, variable))
+        in_queue = [False for i in range(len(self.neighbor_vars))]
+        for arc in arcs:
+            if assignment[self.arc_sources[arc]] is None and not in_queue[arc]:
+                queue.append(arc)
+                in_queue[arc] = True
 
-        total_remove_list = [[] for i in range(len(self.variables))]
         while len(queue) > 0:
             arc = queue.popleft()
-            # Find the values to remove from the neighbor's domain
-            total_remove_list[arc[0]] = self.MAC3_revise_domains(arc[0], arc[1], domains, value)
-            # If we are removing every single value from the neighbor's domain
-            if len(total_remove_list[arc[0]]) == len(domains[arc[0]]):
-                # If there are no possible values for the variable arc[0] that satisfy the arc
-                return False, None
-
-        # There are still valid assignments for all the neighbors
-        return True, total_remove_list
-
-    # Used in inference to modify the domains of var_1 given var_2, where var_2 already has an assignment
-    # Returns a list of values to be removed
-    def MAC3_revise_domains(self, var_1, var_2, domains, value):
-        remove_list = []
-        # We may delete values in domains[var_1]
-        for i in range(len(domains[var_1]) - 1, -1, -1):
-            # Try to find a valid assignment for var_1, var_2, given var_2 already has an assigned value
-            if (domains[var_1][i], value) not in self.constraints[(var_1, var_2)]:
-                remove_list.append(domains[var_1][i])
-        return remove_list
+            in_queue[arc] = False
+
+            if not self.revise_arc(arc, domains, assignment):
+                continue
+
+            var_1 = self.arc_sources[arc]
+            # If there are no possible values for var_1 that satisfy the arc
+            if domains.size(var_1) == 0:
+                return False
+
+            # The neighbors of var_1 may have lost their support, other than the one we just revised against
+            for i in range(self.neighbor_start[var_1], self.neighbor_start[var_1 + 1]):
+                neighbor = self.neighbor_vars[i]
+                if neighbor == self.neighbor_vars[arc] or assignment[neighbor] is not None:
+                    continue
+                reverse_arc = self.reverse_arcs[i]
+                if not in_queue[reverse_arc]:
+                    queue.append(reverse_arc)
+                    in_queue[reverse_arc] = True
+
+        # There are still valid assignments for all the variables
+        return True
+
+    # Removes the values of the arc's source variable that no value of its target variable allows
+    # With BitsetDomains, each value's support is a single mask intersection
+    # Returns True if anything was removed
+    def revise_arc(self, arc, domains, assignment):
+        var_1 = self.arc_sources[arc]
+        var_2 = self.neighbor_vars[arc]
+        constraint = self.neighbor_constraints[arc]
+
+        if isinstance(domains, BitsetDomains):
+            if assignment[var_2] is not None:
+                target_mask = domains.value_bits.get(assignment[var_2], 0)
+            else:
+                target_mask = domains.masks[var_2]
+
+            remove_mask = 0
+            for value in domains[var_1]:
+                if not domains.supports(constraint, value) & target_mask:
+                    remove_mask |= domains.value_bits[value]
+            domains.remove_mask(var_1, remove_mask)
+            return remove_mask != 0
+
+        if assignment[var_2] is not None:
+            target_values = [assignment[var_2]]
+        else:
+            target_values = domains[var_2]
+
+        removed = False
+        for value in domains[var_1]:
+            if not any(constraint.is_satisfied(value, other_value) for other_value in target_values):
+                domains.remove(var_1, value)
+                removed = True
+        return removed
+
+    # Runs AC-3 over the whole problem before a search, and narrows self.domains to the values that survive it (in
+    #   their original order). Values are only removed if no valid assignment can use them.
+    # The domains given are pruned in place - a TrailDomains of self.domains is used if none are given
+    # Returns False if a domain is wiped out, meaning there is no valid assignment at all (self.domains is unchanged)
+    def make_arc_consistent(self, domains=None):
+        if domains is None:
+            domains = TrailDomains(self.domains)
+        if not self.arc_consistency(domains):
+            return False
+
+        self.domains = [[value for value in self.domains[var] if domains.contains(var, value)]
+                        for var in range(len(self.variables))]
+        return True
 
     # Returns a list of neighbors of the given variable
     def get_neighbors(self, variable):
-        variable_neighbors = []
-        for other_var in self.variables:
-            if (other_var, variable) in self.constraints.keys():
-                variable_neighbors.append(other_var)
-        return variable_neighbors
+        return self.neighbor_vars[self.neighbor_start[variable]:self.neighbor_start[variable + 1]]
 
     # Sorts the possible values for the variable into a list from least-constraining to most-constraining
     def least_constraining_value(self, variable, assignment, domains):
+        if isinstance(domains, BitsetDomains):
+            return self.__least_constraining_value_masks(variable, assignment, domains)
+
         num_available = [0 for i in range(len(domains[variable]))]
-        for other_var in self.variables:
+        for i in range(self.neighbor_start[variable], self.neighbor_start[variable + 1]):
+            other_var = self.neighbor_vars[i]
+            constraint = self.neighbor_constraints[i]
             index = 0
 
             # If we only want to consider constraints with non-assigned variables
             if assignment[other_var] is not None:
                 continue
 
-            # If these variables are not neighbors
-            if (variable, other_var) not in self.constraints.keys():
-                continue
-
             # Loop through all value combinations
             for value in domains[variable]:
                 for other_value in domains[other_var]:
                     # If this pair is allowed
-                    if (value, other_value) in self.constraints[(variable, other_var)]:
+                    if constraint.is_satisfied(value, other_value):
                         num_available[index] += 1
                 index += 1
 
@@ -212,9 +327,41 @@ class ConstraintSatisfactionProblem:
         ordered_domain.reverse()
         return ordered_domain
 
+    # least_constraining_value for BitsetDomains. The number of values a neighbor keeps is the popcount of its domain
+    #   intersected with the constraint's supports_mask, rather than a loop over every pair of values
+    def __least_constraining_value_masks(self, variable, assignment, domains):
+        values = domains[variable]
+        num_available = [0 for i in range(len(values))]
+        for i in range(self.neighbor_start[variable], self.neighbor_start[variable + 1]):
+            other_var = self.neighbor_vars[i]
+            # If we only want to consider constraints with non-assigned variables
+            if assignment[other_var] is not None:
+                continue
+
+            constraint = self.neighbor_constraints[i]
+            other_mask = domains.masks[other_var]
+            for index in range(len(values)):
+                num_available[index] += (domains.supports(constraint, values[index]) & other_mask).bit_count()
+
+        # Same order as least_constraining_value - from high --> low, with ties in reverse
+        indexes = [i for i in range(len(values))]
+        indexes.sort(key=num_available.__getitem__)
+        indexes.reverse()
+        return [values[i] for i in indexes]
+
     # Calls a local search using min-conflicts and a random-walk
+    # If tabu_tenure is given, this becomes a tabu search: after a variable leaves a value, it cannot go back to that
+    #   value for about tabu_tenure iterations, unless doing so would give the fewest conflicts seen so far
+    #   (aspiration).
+    #   With use_zobrist, the search also keeps incremental (Zobrist) hashes of the assignments it has recently been in,
+    #   and makes a random move if it comes back to one of them.
+    # use_visited is kept for older callers, and turns on the tabu search with the default tenure
     # Returns a valid assignment (if found) and the number of iterations it took to find it
-    def local_search(self, max_iters, assignment=None, use_visited=False, print_iters=False):
+    def local_search(self, max_iters, assignment=None, use_visited=False, print_iters=False, tabu_tenure=None,
+                     use_zobrist=False):
+        if use_visited and not tabu_tenure:
+            tabu_tenure = DEFAULT_TABU_TENURE
+
         # Either generate a completely random assignment from each variable's domain
         empty_indices = set()
         if not assignment:
@@ -228,77 +375,305 @@ class ConstraintSatisfactionProblem:
                     assignment[i] = random.choice(self.domains[i])
                     empty_indices.add(i)
 
-        conflicted_variables = self.get_conflicted_variables(assignment)
+        self.reset_assignment_state(assignment)
 
         # If we are editing a given assignment, do not adjust other variables
-        if editing_given_assignment:
-            for var in conflicted_variables:
-                if var not in empty_indices:
-                    conflicted_variables.remove(var)
+        def can_change(var):
+            return not editing_given_assignment or var in empty_indices
+
+        # Count the conflicts for every variable once. After this, we only update the counts for the neighbors of
+        #   the variable we just reassigned rather than re-scanning every pair of variables each iteration
+        tracker = ConflictTracker(self, assignment, can_change)
+        conflicted_variables = tracker.conflicted_variables
+
+        # A conflict between two variables we are not allowed to change can never be fixed
+        if editing_given_assignment and tracker.has_fixed_conflicts():
+            if print_iters:
+                print("Given assignment has conflicts that cannot be changed")
+            return None, 0
 
         # If by some miracle our random assignment worked
         if not conflicted_variables:
             return assignment, 0
 
-        # Do not re-visit recently revisited states (tabu search)
-        recently_visited = [[] for i in range(2)]
+        if tabu_tenure:
+            tabu = TabuMemory(tabu_tenure, assignment if use_zobrist else None)
+            best_conflicts = tracker.total_conflicts
 
         # The total number of iterations
         curr_iters = 0
+        # The number of conflicts every stats.sample_interval iterations, if stats are being kept
+        conflict_history = self.stats.new_series("conflicts")
 
         # While there is a conflicting variable
         while len(conflicted_variables) > 0:
-            if curr_iters > max_iters:
+            if conflict_history is not None and curr_iters % self.stats.sample_interval == 0:
+                conflict_history.append((curr_iters, tracker.total_conflicts))
+
+            if curr_iters > max_iters or (curr_iters % DEADLINE_CHECK_INTERVAL == 0 and self.out_of_time()):
                 if print_iters:
-                    print("Maximum number of iterations reached")
+                    print("Maximum number of iterations or time reached")
+                self.search_gave_up(assignment, tracker.total_conflicts)
                 return None, curr_iters
 
             curr_iters += 1
             # Randomly select the variable
-            variable = random.choice(conflicted_variables)
+            variable = conflicted_variables.random_choice()
+
+            if not tabu_tenure:
+                # Assign the value that violates the fewest constraints
+                # We break ties randomly
+                least_constraining_values = self.violates_least_constraints(variable, assignment)
+                tracker.reassign(variable, random.choice(least_constraining_values))
+                continue
+
+            old_value = assignment[variable]
+            new_value = self.__choose_tabu_value(variable, tracker, tabu, curr_iters, best_conflicts)
+            tracker.reassign(variable, new_value)
+            tabu.record_move(variable, old_value, new_value, curr_iters)
+            best_conflicts = min(best_conflicts, tracker.total_conflicts)
+
+            # We have been in this exact assignment recently, so we are cycling. Make a random move to get out of it.
+            if use_zobrist and tabu.is_revisit():
+                switch_up = conflicted_variables.random_choice() if conflicted_variables else variable
+                old_value = assignment[switch_up]
+                tracker.reassign(switch_up, random.choice(self.domains[switch_up]))
+                tabu.record_move(switch_up, old_value, assignment[switch_up], curr_iters)
+
+        if conflict_history is not None:
+            conflict_history.append((curr_iters, 0))
+        if print_iters:
+            print("Total loops", curr_iters)
+
+        return assignment, curr_iters
+
+    # Returns the value with the fewest conflicts for the variable that is allowed by the tabu memory, ties broken
+    #   randomly. A different value than the current one is always picked if the domain has one.
+    # A tabu value is allowed if it would bring the total conflicts below best_conflicts (aspiration)
+    def __choose_tabu_value(self, variable, tracker, tabu, curr_iter, best_conflicts):
+        current_value = tracker.assignment[variable]
+        current_conflicts = tracker.count_value_conflicts(variable, current_value)
+
+        best_values = []
+        best_value_conflicts = inf
+        for value in self.domains[variable]:
+            if value == current_value:
+                continue
+
+            value_conflicts = tracker.count_value_conflicts(variable, value)
+            new_total = tracker.total_conflicts - current_conflicts + value_conflicts
+            if tabu.is_tabu(variable, value, curr_iter) and new_total >= best_conflicts:
+                continue
+
+            if value_conflicts < best_value_conflicts:
+                best_value_conflicts = value_conflicts
+                best_values = [value]
+            elif value_conflicts == best_value_conflicts:
+                best_values.append(value)
+
+        # Every other value is tabu (or there are no other values), so stay where we are
+        if not best_values:
+            return current_value
+        return random.choice(best_values)
+
+    # Min-conflicts local search where the soft constraints (see the soft cost methods below) are part of the cost.
+    # Each possible value is scored as hard_weight * (conflicts it causes) + (change in the soft cost), so one search
+    #   can reach an assignment that is both valid and satisfies the soft constraints. With probability noise, a random
+    #   value is picked instead to walk off of plateaus.
+    # Variables with a single value in their domain are never changed
+    # Starts from a random assignment, or from a copy of the given (complete) assignment
+    # Returns a valid assignment (if found) and the number of iterations it took to find it
+    def soft_local_search(self, max_iters, hard_weight=10, noise=0.02, print_iters=False, assignment=None):
+        if assignment:
+            assignment = list(assignment)
+        else:
+            assignment = [random.choice(self.domains[i]) for i in range(len(self.variables))]
+
+        self.reset_assignment_state(assignment)
+
+        tracker = ConflictTracker(self, assignment, lambda var: len(self.domains[var]) > 1)
+        if tracker.has_fixed_conflicts():
+            if print_iters:
+                print("Assignment has conflicts that cannot be changed")
+            return None, 0
+
+        curr_iters = 0
+        conflict_history = self.stats.new_series("conflicts")
+        while True:
+            if conflict_history is not None and curr_iters % self.stats.sample_interval == 0:
+                conflict_history.append((curr_iters, tracker.total_conflicts))
+            # Fix the hard constraints first, and only then look at the soft ones
+            if tracker.conflicted_variables:
+                variable = tracker.conflicted_variables.random_choice()
+            elif self.soft_constraints_satisfied():
+                break
+            else:
+                candidates = self.soft_candidate_variables(assignment)
+                if not candidates:
+                    if print_iters:
+                        print("No variables can improve the soft cost")
+                    self.search_gave_up(assignment, tracker.total_conflicts)
+                    return None, curr_iters
+                variable = random.choice(candidates)
+
+            if curr_iters > max_iters or (curr_iters % DEADLINE_CHECK_INTERVAL == 0 and self.out_of_time()):
+                if print_iters:
+                    print("Maximum number of iterations or time reached")
+                self.search_gave_up(assignment, tracker.total_conflicts)
+                return None, curr_iters
+            curr_iters += 1
+
+            old_value = assignment[variable]
+            if random.random() < noise:
+                new_value = random.choice(self.domains[variable])
+            else:
+                # The values with the lowest combined cost, ties broken randomly
+                best_values = []
+                best_cost = inf
+                for value in self.domains[variable]:
+                    cost = hard_weight * tracker.count_value_conflicts(variable, value) + \
+                        self.soft_cost_delta(variable, old_value, value)
+                    if cost < best_cost:
+                        best_cost = cost
+                        best_values = [value]
+                    elif cost == best_cost:
+                        best_values.append(value)
+                new_value = random.choice(best_values)
+
+            tracker.reassign(variable, new_value)
+
+        if conflict_history is not None:
+            conflict_history.append((curr_iters, 0))
+        if print_iters:
+            print("Total loops", curr_iters)
 
-            # Assign the value that violates the fewest constraints
-            # We break ties randomly
-            least_constraining_values = self.violates_least_constraints(variable, assignment)
-            assignment[variable] = random.choice(least_constraining_values)
+        return assignment, curr_iters
+
+    # Simulated annealing over the same cost as soft_local_search: hard_weight * (hard conflicts) + soft cost.
+    # Each iteration proposes a random new value for a conflicted variable (or, once there are no conflicts, for one of
+    #   the soft_candidate_variables). The change in cost is worked out from the variable's neighbors and the soft cost
+    #   hooks, and the move is accepted if it does not make things worse, or otherwise with probability
+    #   exp(-change / temperature). The temperature cools from initial_temperature to final_temperature over max_iters
+    #   following the cooling schedule ("geometric" or "linear"), so early on the search can climb out of local minima.
+    # Variables with a single value in their domain are never changed
+    # Returns a valid assignment (if found) and the number of iterations it took to find it
+    def simulated_annealing(self, max_iters, initial_temperature=5.0, final_temperature=0.05, cooling="geometric",
+                            hard_weight=10, print_iters=False):
+        assignment = [random.choice(self.domains[i]) for i in range(len(self.variables))]
+
+        self.reset_assignment_state(assignment)
+
+        tracker = ConflictTracker(self, assignment, lambda var: len(self.domains[var]) > 1)
+        if tracker.has_fixed_conflicts():
+            if print_iters:
+                print("Assignment has conflicts that cannot be changed")
+            return None, 0
+
+        curr_iters = 0
+        conflict_history = self.stats.new_series("conflicts")
+        while True:
+            if conflict_history is not None and curr_iters % self.stats.sample_interval == 0:
+                conflict_history.append((curr_iters, tracker.total_conflicts))
+            if tracker.conflicted_variables:
+                variable = tracker.conflicted_variables.random_choice()
+            elif self.soft_constraints_satisfied():
+                break
+            else:
+                candidates = self.soft_candidate_variables(assignment)
+                if not candidates:
+                    if print_iters:
+                        print("No variables can improve the soft cost")
+                    self.search_gave_up(assignment, tracker.total_conflicts)
+                    return None, curr_iters
+                variable = random.choice(candidates)
+
+            if curr_iters > max_iters or (curr_iters % DEADLINE_CHECK_INTERVAL == 0 and self.out_of_time()):
+                if print_iters:
+                    print("Maximum number of iterations or time reached")
+                self.search_gave_up(assignment, tracker.total_conflicts)
+                return None, curr_iters
+            curr_iters += 1
+
+            old_value = assignment[variable]
+            new_value = random.choice(self.domains[variable])
+            if new_value == old_value:
+                continue
 
-            # Do not revisit recently seen states, and switch it up to avoid plateaus or local minima
-            if use_visited:
-                if assignment in recently_visited:
-                    switch_up = random.choice(self.variables)
-                    assignment[switch_up] = random.choice(self.domains[switch_up])
+            cost_change = hard_weight * (tracker.count_value_conflicts(variable, new_value) -
+                                         tracker.count_value_conflicts(variable, old_value)) + \
+                self.soft_cost_delta(variable, old_value, new_value)
 
-                recently_visited.pop()
-                recently_visited.insert(0, assignment)
+            if cost_change > 0:
+                temperature = annealing_temperature(cooling, initial_temperature, final_temperature,
+                                                    curr_iters, max_iters)
+                if random.random() >= exp(-cost_change / temperature):
+                    continue
 
-            conflicted_variables = self.get_conflicted_variables(assignment)
-            if editing_given_assignment:
-                for var in conflicted_variables:
-                    if var not in empty_indices:
-                        conflicted_variables.remove(var)
+            tracker.reassign(variable, new_value)
 
+        if conflict_history is not None:
+            conflict_history.append((curr_iters, 0))
         if print_iters:
             print("Total loops", curr_iters)
 
         return assignment, curr_iters
 
+    # Returns True if a deadline has been set (see self.deadline) and it has passed
+    # The searches check this every DEADLINE_CHECK_INTERVAL iterations, and give up once it is True
+    def out_of_time(self):
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    # Called with the complete assignment a local search ended on and its number of conflicts, when the search gives up
+    #   without a valid (or soft constraint satisfying) assignment. Subclasses can override this to keep the best
+    #   assignment seen so far. The assignment keeps changing after this, so it has to be copied to be kept.
+    def search_gave_up(self, assignment, num_conflicts):
+        pass
+
+    # Assignment state: subclasses override these to keep their own state (such as counts) in step with the assignment
+    #   that a search is working on. The searches call reset_assignment_state once they have a complete starting
+    #   assignment (a partial one, in the backtracking solver), and update_assignment_state after every change to it.
+    def reset_assignment_state(self, assignment):
+        pass
+
+    def update_assignment_state(self, variable, old_value, new_value):
+        pass
+
+    # Extra rules: subclasses override this to add "these two variables conflict" rules that are not stored as arcs in
+    #   the constraint graph, usually found from the state kept by the assignment state methods above. Every search
+    #   counts these conflicts along with the arcs (see ConflictTracker), and the rules must be symmetric.
+    # Returns the assigned variables that the variable would conflict with if it had the value, not counting itself. By
+    #   default there are no extra rules.
+    def extra_conflicts(self, variable, value):
+        return ()
+
+    # Soft constraints: subclasses override these methods to add a soft cost to soft_local_search, usually reading the
+    #   state kept by the assignment state methods above. By default there are no soft constraints.
+
+    # Returns how much the soft cost would change if the variable went from old_value to new_value (0 if they are the
+    #   same, as the search scores keeping the current value this way too)
+    def soft_cost_delta(self, variable, old_value, new_value):
+        return 0
+
+    # Returns True if the current assignment satisfies all the soft constraints
+    def soft_constraints_satisfied(self):
+        return True
+
+    # Returns the variables worth reassigning to improve the soft cost when there are no hard conflicts
+    def soft_candidate_variables(self, assignment):
+        return []
+
     # Returns a list of values that all conflict the least amount possible
     def violates_least_constraints(self, variable, assignment):
         num_conflicts = [0 for i in range(len(self.domains[variable]))]
         index = 0
         # Loop through all possible values
         for value in self.domains[variable]:
-            # Check other values in the (complete) assignment
-            for other_var in range(len(assignment)):
-                if other_var == variable:
-                    continue
-
-                if (variable, other_var) not in self.constraints.keys():
-                    continue
-
+            # Check the neighbors' values in the (complete) assignment
+            for i in range(self.neighbor_start[variable], self.neighbor_start[variable + 1]):
                 # If this value violates a constraint between these two variables
-                if (value, assignment[other_var]) not in self.constraints[(variable, other_var)]:
+                if not self.neighbor_constraints[i].is_satisfied(value, assignment[self.neighbor_vars[i]]):
                     num_conflicts[index] += 1
+            num_conflicts[index] += len(self.extra_conflicts(variable, value))
 
             index += 1
 
@@ -314,22 +689,14 @@ class ConstraintSatisfactionProblem:
     def get_conflicted_variables(self, assignment):
         conflicted_variables = set()
 
-        # Check all pairs
+        # Check every arc in the constraint graph
         for var_1 in range(len(assignment)):
-            for var_2 in range(len(assignment)):
-                # To speed this up a bit
-                if var_1 in conflicted_variables or var_2 in conflicted_variables:
-                    continue
-
-                # If these variables are not neighbors
-                if (var_1, var_2) not in self.constraints.keys():
-                    continue
-
+            for i in range(self.neighbor_start[var_1], self.neighbor_start[var_1 + 1]):
+                var_2 = self.neighbor_vars[i]
                 # If the variables conflict
-                if (assignment[var_1], assignment[var_2]) not in self.constraints[(var_1, var_2)]:
+                if not self.neighbor_constraints[i].is_satisfied(assignment[var_1], assignment[var_2]):
                     conflicted_variables.add(var_1)
                     conflicted_variables.add(var_2)
 
         # We want it in list format, but the order is irrelevant
         return list(conflicted_variables)
-
@@ -0,0 +1,72 @@
+# Live counts of the days assigned to each doctor, kept up to date one assignment change at a time so that reading them
+#   costs O(1) per doctor instead of recounting the whole assignment
+# Each variable has a kind (an index below num_kinds, such as weekday/weekend/holiday) and a month, given as lists
+class DoctorTallies:
+    def __init__(self, doctors, variable_kinds, variable_months, num_kinds=3):
+        self.doctors = list(doctors)
+        self.variable_kinds = variable_kinds
+        self.variable_months = variable_months
+        self.num_kinds = num_kinds
+
+        # counts[kind][doctor] --> the number of variables of that kind assigned to the doctor
+        self.counts = [dict() for _ in range(num_kinds)]
+        # month_counts[doctor][month] --> the number of variables (of any kind) in that month assigned to the doctor
+        self.month_counts = dict()
+        # doc_variables[kind][doctor] --> the set of variables of that kind assigned to the doctor
+        self.doc_variables = [dict() for _ in range(num_kinds)]
+        self.clear()
+
+    # Sets every count to zero
+    def clear(self):
+        for kind in range(self.num_kinds):
+            self.counts[kind] = {doctor: 0 for doctor in self.doctors}
+            self.doc_variables[kind] = {doctor: set() for doctor in self.doctors}
+        self.month_counts = {doctor: dict() for doctor in self.doctors}
+
+    # Recounts everything for the given assignment (None values are unassigned)
+    def reset(self, assignment):
+        self.clear()
+        for var in range(len(assignment)):
+            if assignment[var] is not None:
+                self.__add(var, assignment[var])
+
+    # Updates the counts after the variable went from old_value to new_value (either can be None)
+    def update(self, variable, old_value, new_value):
+        if old_value == new_value:
+            return
+        if old_value is not None:
+            self.__remove(variable, old_value)
+        if new_value is not None:
+            self.__add(variable, new_value)
+
+    def __add(self, variable, doctor):
+        kind = self.variable_kinds[variable]
+        self.counts[kind][doctor] += 1
+        self.doc_variables[kind][doctor].add(variable)
+        month = self.variable_months[variable]
+        self.month_counts[doctor][month] = self.month_counts[doctor].get(month, 0) + 1
+
+    def __remove(self, variable, doctor):
+        kind = self.variable_kinds[variable]
+        self.counts[kind][doctor] -= 1
+        self.doc_variables[kind][doctor].discard(variable)
+        month = self.variable_months[variable]
+        self.month_counts[doctor][month] -= 1
+        if self.month_counts[doctor][month] == 0:
+            del self.month_counts[doctor][month]
+
+    # Returns the number of variables of the kind assigned to the doctor
+    def get_count(self, kind, doctor):
+        return self.counts[kind][doctor]
+
+    # Returns a copy of the {doctor: count} dictionary for each kind, in kind order
+    def get_doc_days(self):
+        return tuple(dict(self.counts[kind]) for kind in range(self.num_kinds))
+
+    # Returns the variables of the kind currently assigned to the doctor. Do not modify the returned set.
+    def get_doc_variables(self, kind, doctor):
+        return self.doc_variables[kind][doctor]
+
+    # Returns a copy of the {month: count} dictionary for the doctor
+    def get_month_counts(self, doctor):
+        return dict(self.month_counts[doctor])
@@ -0,0 +1,39 @@
+import random
+
+
+# A set that also supports picking a random element in O(1), used to track the conflicted variables in local search
+# Elements are kept in a list, and we remember where each one is so that we can swap-remove it
+class IndexedSet:
+    def __init__(self, elements=()):
+        self.elements = []
+        self.positions = dict()
+        for element in elements:
+            self.add(element)
+
+    def add(self, element):
+        if element in self.positions:
+            return
+        self.positions[element] = len(self.elements)
+        self.elements.append(element)
+
+    # Removes the element (if it is present) by swapping the last element into its place
+    def discard(self, element):
+        position = self.positions.pop(element, None)
+        if position is None:
+            return
+        last_element = self.elements.pop()
+        if position < len(self.elements):
+            self.elements[position] = last_element
+            self.positions[last_element] = position
+
+    def random_choice(self):
+        return random.choice(self.elements)
+
+    def __contains__(self, element):
+        return element in self.positions
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __iter__(self):
+        return iter(self.elements)
@@ -0,0 +1,124 @@
+from contextlib import contextmanager, nullcontext
+import cProfile
+import pstats
+import time
+import tracemalloc
+
+
+# Timings and counts from building and solving a CallSchedulingProblem
+# Phases are timed with `with stats.phase("name"):`, and add up if the same phase runs more than once. Phases can be
+#   nested (the fairness phase includes the local searches inside it), so their times do not have to add up.
+# The local searches also sample their number of conflicts every sample_interval iterations (see new_series), keeping
+#   up to max_series searches
+# With profile or trace_memory, everything run inside `with stats.capture():` is profiled with cProfile (keeping the
+#   profile_limit functions with the most cumulative time) or has its peak memory measured with tracemalloc
+class SolverStats:
+    def __init__(self, sample_interval=100, max_series=1000, profile=False, trace_memory=False, profile_limit=40):
+        # Phase name --> total seconds spent in it
+        self.phase_times = dict()
+        # Counter name --> value, such as the number of local search iterations or restarts
+        self.counters = dict()
+        # Series name --> a list with one list of (iteration, value) samples per search
+        self.series = dict()
+        self.sample_interval = sample_interval
+        self.max_series = max_series
+
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_limit = profile_limit
+        # Filled in by capture
+        self.profile_functions = None
+        self.peak_memory_bytes = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] = self.phase_times.get(name, 0) + time.perf_counter() - start
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Starts a new run of the series and returns the list to append its (iteration, value) samples to
+    # Returns None if samples are not being kept (or max_series runs have already been kept), so a search can check
+    #   this once per iteration and skip the sampling entirely
+    def new_series(self, name):
+        if not self.sample_interval:
+            return None
+        runs = self.series.setdefault(name, [])
+        if len(runs) >= self.max_series:
+            self.count(f"{name}_series_dropped")
+            return None
+        run = []
+        runs.append(run)
+        return run
+
+    # Profiles and/or measures the peak memory of the code run inside it, if profile or trace_memory is set
+    # If tracemalloc is already running (like in benchmark.py), it is left running
+    @contextmanager
+    def capture(self):
+        profiler = cProfile.Profile() if self.profile else None
+        start_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        if profiler:
+            profiler.enable()
+
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                self.profile_functions = get_top_functions(profiler, self.profile_limit)
+            if self.trace_memory:
+                self.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+                if start_tracing:
+                    tracemalloc.stop()
+
+    # Returns the stats as plain dictionaries and lists, ready to be written out as JSON
+    def to_dict(self):
+        result = {"phase_times": dict(self.phase_times), "counters": dict(self.counters),
+                  "series": {name: [list(run) for run in runs] for name, runs in self.series.items()}}
+        if self.profile_functions is not None:
+            result["profile"] = self.profile_functions
+        if self.peak_memory_bytes is not None:
+            result["peak_memory_bytes"] = self.peak_memory_bytes
+        return result
+
+
+# Stands in for SolverStats when nothing is being recorded, so that recording costs almost nothing
+class NullStats:
+    sample_interval = 0
+
+    def phase(self, name):
+        return nullcontext()
+
+    def count(self, name, amount=1):
+        pass
+
+    def new_series(self, name):
+        return None
+
+    def capture(self):
+        return nullcontext()
+
+    def to_dict(self):
+        return {"phase_times": dict(), "counters": dict(), "series": dict()}
+
+
+# Shared by every problem that is not recording stats
+NO_STATS = NullStats()
+
+
+# Returns the limit functions with the most cumulative time in the profile, as dictionaries
+def get_top_functions(profiler, limit):
+    functions = []
+    for (file_name, line, function), (_, calls, total_time, cumulative_time, _) in pstats.Stats(profiler).stats.items():
+        functions.append({"function": f"{file_name}:{line}({function})", "calls": calls, "total_time": total_time,
+                          "cumulative_time": cumulative_time})
+    functions.sort(key=lambda entry: entry["cumulative_time"], reverse=True)
+    return functions[:limit]
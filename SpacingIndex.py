@@ -0,0 +1,70 @@
+from bisect import bisect_left, bisect_right, insort
+
+
+# For each doctor, the sorted first days (as date ordinals) of the spaced variables (weekends and holidays) assigned to
+#   them, kept up to date one assignment change at a time like DoctorTallies
+# Two spaced variables that start within spacing_days of each other cannot have the same doctor. With each doctor's
+#   days sorted, the spaced variables a move would conflict with are found with a bisect over that doctor's own days,
+#   instead of storing an arc between every pair of nearby weekends.
+# Each variable has its first date's ordinal and whether it is spaced, given as lists
+class SpacingIndex:
+    def __init__(self, doctors, variable_ordinals, is_spaced, spacing_days):
+        self.doctors = list(doctors)
+        self.variable_ordinals = variable_ordinals
+        self.is_spaced = is_spaced
+        self.spacing_days = spacing_days
+
+        # Ordinal --> the spaced variable starting on that day
+        self.ordinal_variables = {variable_ordinals[var]: var for var in range(len(variable_ordinals))
+                                  if is_spaced[var]}
+        # The first days of every spaced variable, in order
+        self.spaced_ordinals = sorted(self.ordinal_variables)
+        # doc_ordinals[doctor] --> the sorted first days of the spaced variables assigned to the doctor
+        self.doc_ordinals = dict()
+        self.clear()
+
+    # Empties every doctor's days
+    def clear(self):
+        self.doc_ordinals = {doctor: [] for doctor in self.doctors}
+
+    # Rebuilds every doctor's days for the given assignment (None values are unassigned)
+    def reset(self, assignment):
+        self.clear()
+        for var in range(len(assignment)):
+            if assignment[var] is not None and self.is_spaced[var]:
+                self.doc_ordinals[assignment[var]].append(self.variable_ordinals[var])
+        for ordinals in self.doc_ordinals.values():
+            ordinals.sort()
+
+    # Updates the index after the variable went from old_value to new_value (either can be None)
+    def update(self, variable, old_value, new_value):
+        if old_value == new_value or not self.is_spaced[variable]:
+            return
+        ordinal = self.variable_ordinals[variable]
+        if old_value is not None:
+            ordinals = self.doc_ordinals[old_value]
+            del ordinals[bisect_left(ordinals, ordinal)]
+        if new_value is not None:
+            insort(self.doc_ordinals[new_value], ordinal)
+
+    # Returns the spaced variables assigned the doctor that are too close to the variable (not counting the variable
+    #   itself), which is every variable it would conflict with under the spacing rule if it had the doctor
+    def get_conflicts(self, variable, doctor):
+        if not self.is_spaced[variable]:
+            return ()
+        ordinal = self.variable_ordinals[variable]
+        ordinals = self.doc_ordinals[doctor]
+        start = bisect_left(ordinals, ordinal - self.spacing_days)
+        end = bisect_right(ordinals, ordinal + self.spacing_days, start)
+        if end - start == 1 and ordinals[start] == ordinal:
+            return ()
+        return [self.ordinal_variables[other] for other in ordinals[start:end] if other != ordinal]
+
+    # Returns every spaced variable that is too close to the variable to have the same doctor, whoever is assigned
+    def get_window(self, variable):
+        if not self.is_spaced[variable]:
+            return []
+        ordinal = self.variable_ordinals[variable]
+        start = bisect_left(self.spaced_ordinals, ordinal - self.spacing_days)
+        end = bisect_right(self.spaced_ordinals, ordinal + self.spacing_days, start)
+        return [self.ordinal_variables[other] for other in self.spaced_ordinals[start:end] if other != ordinal]
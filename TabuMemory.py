@@ -0,0 +1,62 @@
+from collections import deque
+import random
+
+# The default number of iterations a move stays tabu for in the tabu search
+DEFAULT_TABU_TENURE = 10
+
+
+# The memory of a tabu search. After a variable leaves a value, assigning it that value again is tabu for tenure
+#   iterations (plus a little randomness, so that moves do not all expire in lockstep).
+# If an assignment is given, it also keeps a Zobrist hash of the assignment: every (variable, value) pair gets a random
+#   64-bit key and the hash is the XOR of the keys of the assignment, so a move updates it in O(1). The hashes of the
+#   recently visited assignments are kept to detect cycles.
+class TabuMemory:
+    def __init__(self, tenure, assignment=None):
+        self.tenure = tenure
+        # (variable, value) --> the first iteration where it is no longer tabu
+        self.tabu_until = dict()
+
+        self.zobrist_keys = None
+        if assignment is not None:
+            self.zobrist_keys = dict()
+            self.hash = 0
+            for var in range(len(assignment)):
+                self.hash ^= self.__zobrist_key(var, assignment[var])
+
+            # Only remember the hashes from the last few tenures, as older states are fine to come back to
+            self.recent_hashes = deque(maxlen=10 * tenure)
+            self.recent_hash_counts = dict()
+            self.revisit = False
+
+    def __zobrist_key(self, variable, value):
+        key = self.zobrist_keys.get((variable, value))
+        if key is None:
+            key = random.getrandbits(64)
+            self.zobrist_keys[(variable, value)] = key
+        return key
+
+    def is_tabu(self, variable, value, curr_iter):
+        return self.tabu_until.get((variable, value), 0) > curr_iter
+
+    # Records that the variable went from old_value to new_value at this iteration
+    def record_move(self, variable, old_value, new_value, curr_iter):
+        if old_value == new_value:
+            return
+        self.tabu_until[(variable, old_value)] = curr_iter + self.tenure + random.randint(0, self.tenure // 2)
+
+        if self.zobrist_keys is None:
+            return
+        self.hash ^= self.__zobrist_key(variable, old_value) ^ self.__zobrist_key(variable, new_value)
+
+        self.revisit = self.recent_hash_counts.get(self.hash, 0) > 0
+        if len(self.recent_hashes) == self.recent_hashes.maxlen:
+            expired = self.recent_hashes[0]
+            self.recent_hash_counts[expired] -= 1
+            if self.recent_hash_counts[expired] == 0:
+                del self.recent_hash_counts[expired]
+        self.recent_hashes.append(self.hash)
+        self.recent_hash_counts[self.hash] = self.recent_hash_counts.get(self.hash, 0) + 1
+
+    # Returns True if the last move led back to an assignment we were in recently
+    def is_revisit(self):
+        return self.revisit
@@ -0,0 +1,50 @@
+# The domains used by the backtracking solver. Each domain is a sparse set: its live values are the first size[var]
+#   entries of values[var], and positions[var] maps each value to where it is in values[var].
+# Removing a value swaps it just past the live values and shrinks the size, and records the variable on the trail.
+#   Since removals only ever swap values within a domain, undoing them is just growing the sizes back in reverse order,
+#   so both removing and restoring a value are O(1), and nothing has to be copied when the search goes deeper
+class TrailDomains:
+    def __init__(self, domains):
+        self.values = [list(domain) for domain in domains]
+        self.positions = [{value: i for i, value in enumerate(domain)} for domain in self.values]
+        self.sizes = [len(domain) for domain in self.values]
+        # The variable of every removal, in order
+        self.trail = []
+
+    # Returns a list of the live values for the variable, so this can be used like a list of domains
+    def __getitem__(self, variable):
+        return self.values[variable][:self.sizes[variable]]
+
+    def __len__(self):
+        return len(self.values)
+
+    def size(self, variable):
+        return self.sizes[variable]
+
+    def contains(self, variable, value):
+        position = self.positions[variable].get(value)
+        return position is not None and position < self.sizes[variable]
+
+    # Removes the value from the variable's domain (if it is still there)
+    def remove(self, variable, value):
+        position = self.positions[variable].get(value)
+        last = self.sizes[variable] - 1
+        if position is None or position > last:
+            return
+
+        values = self.values[variable]
+        last_value = values[last]
+        values[position], values[last] = last_value, value
+        self.positions[variable][last_value] = position
+        self.positions[variable][value] = last
+        self.sizes[variable] = last
+        self.trail.append(variable)
+
+    # Returns a marker for the current state, to give to undo_to later
+    def mark(self):
+        return len(self.trail)
+
+    # Restores every value removed since the marker was taken
+    def undo_to(self, marker):
+        while len(self.trail) > marker:
+            self.sizes[self.trail.pop()] += 1
@@ -0,0 +1,212 @@
+import argparse
+import csv
+import datetime
+import json
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import random
+import sys
+import time
+
+from CallSchedulingProblem import CallSchedulingProblem
+from create_schedule import SOLVERS
+from problem_cache import load_problem
+from schedule_writers import DEFAULT_FORMATS, OUTPUT_FORMATS
+
+# Creates the call schedules for many call files in one run, several at a time in separate processes
+# Usage: python batch_schedule.py manifest_filepath [--workers N] [--timeout seconds] [--solver NAME]
+#                                 [--summary summary_filepath] [--cache-dir DIR] [--seed N] [--formats LIST]
+# The manifest is a CSV file with one job per row, and the header:
+#   start_date,end_date,input_filepath,output_filepath,solver
+# The dates are in mm/dd/yyyy format, and the output_filepath works the same as in create_schedule.py (a path ending
+#   in "/" writes output_schedule.txt and .csv into that directory). The solver column is optional, and defaults to
+#   --solver.
+# Each job writes its .txt and .csv (or the --formats, see create_schedule.py), and a summary of every job's status,
+#   times and day totals for each doctor is written out as JSON (batch_summary.json by default) and printed as a
+#   table.
+
+MANIFEST_COLUMNS = ["start_date", "end_date", "input_filepath", "output_filepath"]
+
+
+# Returns the list of jobs (dictionaries with the manifest's columns) in the manifest
+# Raises a ValueError, with the row number, for a row that is missing a column or has an unknown solver
+def read_manifest(manifest_path, default_solver="repair"):
+    jobs = []
+    with open(manifest_path, newline="") as f:
+        reader = csv.DictReader(f)
+        missing = [column for column in MANIFEST_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"Manifest is missing the column(s): {', '.join(missing)}")
+
+        for row in reader:
+            job = {column: (row[column] or "").strip() for column in MANIFEST_COLUMNS}
+            if not all(job.values()):
+                raise ValueError(f"Row {reader.line_num} of the manifest is missing a value")
+            job["solver"] = (row.get("solver") or "").strip() or default_solver
+            if job["solver"] not in SOLVERS:
+                raise ValueError(f"Unknown solver {job['solver']} on row {reader.line_num} of the manifest")
+            jobs.append(job)
+
+    return jobs
+
+
+# Takes a mm/dd/yyyy string and returns the date
+def parse_date(date_str):
+    month, day, year = (int(part) for part in date_str.split("/"))
+    return datetime.date(year, month, day)
+
+
+# Builds, solves and writes out one job, returning a dictionary of how it went
+def run_job(job, seed, cache_dir=None, formats=DEFAULT_FORMATS):
+    random.seed(seed)
+    result = {"status": "failed"}
+
+    start = time.perf_counter()
+    start_date, end_date = parse_date(job["start_date"]), parse_date(job["end_date"])
+    if cache_dir:
+        problem = load_problem(start_date, end_date, job["input_filepath"], cache_dir)
+    else:
+        problem = CallSchedulingProblem(start_date, end_date, job["input_filepath"])
+    result["build_time"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    schedule = problem.solve_for_call_schedule(**SOLVERS[job["solver"]])
+    result["solve_time"] = time.perf_counter() - start
+
+    if schedule:
+        problem.write_out_solution(schedule, job["output_filepath"], formats)
+        weekdays, weekends, holidays = problem.get_doc_days_assigned(schedule)
+        result.update({"status": "solved", "weekdays": weekdays, "weekends": weekends, "holidays": holidays})
+
+    return result
+
+
+# Runs in a separate process, so that a job can be stopped if it goes over the timeout
+def _job_worker(job, seed, cache_dir, formats, connection):
+    try:
+        result = run_job(job, seed, cache_dir, formats)
+    except Exception as error:
+        result = {"status": "error", "error": f"{type(error).__name__}: {error}"}
+    connection.send(result)
+
+
+# Runs the jobs, num_workers at a time, and returns their results in the same order as the jobs
+# A job that runs for more than timeout seconds is stopped, and has the status "timed out"
+def run_batch(jobs, num_workers, timeout, cache_dir=None, formats=DEFAULT_FORMATS):
+    results = [None for _ in range(len(jobs))]
+    next_job = 0
+    # Connection --> (job index, process, start time)
+    running = dict()
+
+    def finish(index, result, start):
+        result["job"] = jobs[index]
+        result["total_time"] = time.perf_counter() - start
+        results[index] = result
+        print(format_result(result), file=sys.stderr)
+
+    while next_job < len(jobs) or running:
+        # Start jobs until every worker is busy
+        while next_job < len(jobs) and len(running) < num_workers:
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            seed = random.randrange(2 ** 32)
+            process = multiprocessing.Process(target=_job_worker,
+                                              args=(jobs[next_job], seed, cache_dir, formats, sender))
+            process.start()
+            # Only the worker writes to the sender, so close our copy. Then a crashed worker shows up as an EOFError.
+            sender.close()
+            running[receiver] = (next_job, process, time.perf_counter())
+            next_job += 1
+
+        # Wait until a job finishes, or the job that started first reaches its timeout
+        first_deadline = min(start for (_, _, start) in running.values()) + timeout
+        for receiver in wait(list(running), timeout=max(0, first_deadline - time.perf_counter())):
+            index, process, start = running.pop(receiver)
+            try:
+                result = receiver.recv()
+            except EOFError:
+                result = {"status": "error", "error": "Worker exited without a result"}
+            process.join()
+            finish(index, result, start)
+
+        for receiver, (index, process, start) in list(running.items()):
+            if time.perf_counter() - start >= timeout:
+                process.terminate()
+                process.join()
+                del running[receiver]
+                finish(index, {"status": "timed out"}, start)
+
+    return results
+
+
+# Returns the difference between the most and fewest days any doctor has, or None if the job was not solved
+def get_spread(day_counts):
+    if not day_counts:
+        return None
+    return max(day_counts.values()) - min(day_counts.values())
+
+
+def format_result(result):
+    job = result["job"]
+    line = f"{job['input_filepath']} ({job['start_date']} - {job['end_date']}): {result['status']}"
+    if result["status"] == "solved":
+        line += f" in {result['total_time']:.2f}s, writing to {job['output_filepath']}"
+    elif result["status"] == "error":
+        line += f" ({result['error']})"
+    return line
+
+
+# Prints a table of every job's status, time and the spread of each doctor's weekdays, weekends and holidays
+def print_summary(results):
+    print(f"{'Call file':<40} {'Status':<10} {'Time (s)':>9} {'Weekdays':>9} {'Weekends':>9} {'Holidays':>9}")
+    for result in results:
+        spreads = [get_spread(result.get(kind)) for kind in ["weekdays", "weekends", "holidays"]]
+        spreads = ["-" if spread is None else str(spread) for spread in spreads]
+        print(f"{result['job']['input_filepath'][-40:]:<40} {result['status']:<10} {result['total_time']:>9.2f} "
+              f"{spreads[0]:>9} {spreads[1]:>9} {spreads[2]:>9}")
+
+    num_solved = sum(result["status"] == "solved" for result in results)
+    print(f"{num_solved} of {len(results)} schedules created")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the call schedules for every job in a manifest")
+    parser.add_argument("manifest_filepath", help="CSV file with start_date,end_date,input_filepath,output_filepath")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of jobs to run at once")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds before a job is stopped")
+    parser.add_argument("--solver", default="repair", choices=list(SOLVERS),
+                        help="solver for jobs that do not name one")
+    parser.add_argument("--summary", default="batch_summary.json", help="where to write the JSON summary")
+    parser.add_argument("--cache-dir", help="keep built problems in this directory (see create_schedule.py)")
+    parser.add_argument("--seed", type=int, help="random seed, to make the batch reproducible")
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS),
+                        help=f"comma separated output formats, any of: {', '.join(OUTPUT_FORMATS)}")
+    args = parser.parse_args()
+
+    output_formats = args.formats.split(",")
+    unknown_formats = [name for name in output_formats if name not in OUTPUT_FORMATS]
+    if unknown_formats:
+        print(f"Unknown output format(s) {', '.join(unknown_formats)}. "
+              f"Please give any of: {', '.join(OUTPUT_FORMATS)}.", file=sys.stderr)
+        exit(6)
+
+    if args.workers < 1:
+        print(f"Invalid number of workers {args.workers}. Please give a positive whole number.", file=sys.stderr)
+        exit(6)
+
+    try:
+        batch_jobs = read_manifest(args.manifest_filepath, args.solver)
+    except FileNotFoundError:
+        print(f"Invalid manifest filepath {args.manifest_filepath}, cannot find or open file", file=sys.stderr)
+        exit(4)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        exit(1)
+
+    random.seed(args.seed)
+    batch_results = run_batch(batch_jobs, args.workers, args.timeout, args.cache_dir, output_formats)
+
+    with open(args.summary, "w") as f:
+        json.dump({"created": datetime.datetime.now().isoformat(timespec="seconds"), "results": batch_results}, f,
+                  indent=2)
+    print_summary(batch_results)
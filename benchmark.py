@@ -0,0 +1,277 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from CallSchedulingProblem import CallSchedulingProblem
+from create_schedule import SOLVERS
+from generate_call_file import add_years, write_call_file
+from SolverStats import SolverStats
+
+# Benchmarks building and solving call schedules with each solver over a matrix of horizons, doctor counts and
+#   constraint tightness. Each case is timed phase by phase (see SolverStats), and the results are written out as JSON
+#   so that two commits can be compared with --compare.
+# Usage: python benchmark.py [--quick] [--solvers NAME,...] [--output results.json] [--timeout seconds] [--no-memory]
+#        python benchmark.py --compare old_results.json new_results.json
+
+START_DATE = datetime.date(2024, 1, 15)
+
+# Tightness --> (fraction of days each doctor is unavailable, fraction of doctors with weekend and weekday caps)
+TIGHTNESS_LEVELS = {
+    "loose": (0.02, 0.0),
+    "medium": (0.08, 0.1),
+    "tight": (0.2, 0.2),
+}
+
+# Solver (see create_schedule.SOLVERS) --> the cases it is benchmarked on
+# The solvers that make schedules strictly fair (repair, compiled, tabu and backtracking) only finish reliably within a
+#   year and with a dozen or so doctors, so they get a small matrix instead of timing out on the rest. With five or six
+#   doctors, most cases have no schedule at all. The soft solvers finish every case up to five years and 60 doctors.
+#   compiled and tabu run the same cases as repair, so the three can be compared.
+FULL_MATRIX = {
+    "repair": {"years": [1], "doctors": [8, 12], "tightness": list(TIGHTNESS_LEVELS)},
+    "compiled": {"years": [1], "doctors": [8, 12], "tightness": list(TIGHTNESS_LEVELS)},
+    "tabu": {"years": [1], "doctors": [8, 12], "tightness": list(TIGHTNESS_LEVELS)},
+    "backtracking": {"years": [1], "doctors": [8, 12], "tightness": list(TIGHTNESS_LEVELS)},
+    "soft": {"years": [1, 3, 5], "doctors": [10, 20, 40, 60], "tightness": list(TIGHTNESS_LEVELS)},
+    "annealing": {"years": [1, 3], "doctors": [10, 20, 40, 60], "tightness": list(TIGHTNESS_LEVELS)},
+}
+QUICK_MATRIX = {
+    "repair": {"years": [1], "doctors": [8, 12], "tightness": ["loose", "tight"]},
+    "compiled": {"years": [1], "doctors": [8, 12], "tightness": ["loose", "tight"]},
+    "tabu": {"years": [1], "doctors": [8, 12], "tightness": ["loose", "tight"]},
+    "backtracking": {"years": [1], "doctors": [8], "tightness": ["loose", "tight"]},
+    "soft": {"years": [1, 2], "doctors": [10, 20], "tightness": ["loose", "tight"]},
+    "annealing": {"years": [1], "doctors": [20], "tightness": ["loose"]},
+}
+
+
+# Writes the call file for a case (see generate_call_file), spanning the given number of years from START_DATE
+def write_case_call_file(path, num_doctors, years, tightness, seed):
+    vacation_density, senior_fraction = TIGHTNESS_LEVELS[tightness]
+    write_call_file(path, num_doctors=num_doctors, start_date=START_DATE, years=years,
+                    vacation_density=vacation_density, num_senior=int(senior_fraction * num_doctors), seed=seed)
+
+
+def get_end_date(years):
+    return add_years(START_DATE, years)
+
+
+# Returns the name used to match up a case between two result files
+# Results from before the solver was part of the case are all from the repair solver
+def get_case_name(case):
+    return f"solver={case.get('solver', 'repair')} years={case['years']} doctors={case['doctors']} " \
+           f"tightness={case['tightness']} seed={case['seed']}"
+
+
+# Builds, solves and writes out one case, returning its stats
+# With trace_memory, the peak memory is measured too (see SolverStats.capture)
+def run_case(case, work_dir, trace_memory=False):
+    call_file = os.path.join(work_dir, "call_file")
+    write_case_call_file(call_file, case["doctors"], case["years"], case["tightness"], case["seed"])
+    random.seed(case["seed"])
+
+    stats = SolverStats(trace_memory=trace_memory)
+    start = time.perf_counter()
+    with stats.capture():
+        problem = CallSchedulingProblem(START_DATE, get_end_date(case["years"]), call_file, stats=stats)
+        schedule = problem.solve_for_call_schedule(**SOLVERS[case["solver"]])
+        if schedule:
+            problem.write_out_solution(schedule, work_dir + "/")
+
+    result = stats.to_dict()
+    result["total_time"] = time.perf_counter() - start
+    result["success"] = schedule is not None
+    result["num_variables"] = len(problem.variables)
+    result["num_arcs"] = len(problem.neighbor_vars)
+    return result
+
+
+# Runs in a separate process so that a case can be stopped if it takes too long
+def _case_worker(case, trace_memory, connection):
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            result = run_case(case, work_dir, trace_memory)
+    except Exception as error:
+        result = {"error": f"{type(error).__name__}: {error}"}
+    connection.send(result)
+
+
+# Runs the case in a process of its own, and returns its stats, or None if it did not finish within timeout seconds
+# A case that raised an error, or whose process exited without a result, returns just the "error"
+def run_case_in_process(case, timeout, trace_memory=False):
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_case_worker, args=(case, trace_memory, sender))
+    process.start()
+    # Only the worker writes to the sender, so close our copy. Then a crashed worker shows up as an EOFError.
+    sender.close()
+    try:
+        result = receiver.recv() if receiver.poll(timeout) else None
+    except EOFError:
+        result = {"error": "Worker exited without a result"}
+    process.terminate()
+    process.join()
+    return result
+
+
+# Runs every case of the matrix (see FULL_MATRIX) for each seed
+# Each result says whether the case "timed_out", or has the "error" it stopped with
+# With measure_memory, each case that finished is run a second time under tracemalloc (which slows it down) for the
+#   peak memory. Cases that timed out or had an error are not run again. If only the second run times out or has an
+#   error, the peak memory is None and "memory_error" says why.
+def run_benchmarks(matrix, seeds, timeout, measure_memory):
+    results = []
+    for solver, solver_matrix in matrix.items():
+        for years in solver_matrix["years"]:
+            for num_doctors in solver_matrix["doctors"]:
+                for tightness in solver_matrix["tightness"]:
+                    for seed in seeds:
+                        case = {"solver": solver, "years": years, "doctors": num_doctors, "tightness": tightness,
+                                "seed": seed}
+                        result = run_case_in_process(case, timeout)
+                        if result is None:
+                            result = {"timed_out": True, "success": False}
+                        elif "error" in result:
+                            result.update({"timed_out": False, "success": False})
+                        else:
+                            result["timed_out"] = False
+                            if measure_memory:
+                                memory_result = run_case_in_process(case, timeout, trace_memory=True)
+                                if memory_result is None:
+                                    result.update({"peak_memory_bytes": None, "memory_error": "timed out"})
+                                elif "error" in memory_result:
+                                    result.update({"peak_memory_bytes": None, "memory_error": memory_result["error"]})
+                                else:
+                                    result["peak_memory_bytes"] = memory_result["peak_memory_bytes"]
+
+                        result["case"] = case
+                        results.append(result)
+                        print(format_result(result), file=sys.stderr)
+    return results
+
+
+# Returns "timed out", "error", "solved" or "failed"
+def get_status(result):
+    if result["timed_out"]:
+        return "timed out"
+    if result.get("error"):
+        return "error"
+    return "solved" if result["success"] else "failed"
+
+
+def format_result(result):
+    name = get_case_name(result["case"])
+    status = get_status(result)
+    if status == "timed out":
+        return f"{name}: timed out"
+    if status == "error":
+        return f"{name}: error: {result['error']}"
+    phases = ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in result["phase_times"].items())
+    line = f"{name}: {status} in {result['total_time']:.3f}s ({phases})"
+    if result.get("memory_error"):
+        line += f", peak memory run: {result['memory_error']}"
+    return line
+
+
+# Prints each solver's time per local search iteration over the cases it finished, so solvers that run the same search
+#   on a different encoding (like repair and compiled) can be compared even though their number of iterations varies
+def print_iteration_times(results):
+    totals = dict()
+    for result in results:
+        iterations = result.get("counters", {}).get("local_search_iterations")
+        if get_status(result) in ("timed out", "error") or not iterations:
+            continue
+        search_time = sum(result["phase_times"].get(phase, 0) for phase in ("initial_search", "fairness"))
+        solver_totals = totals.setdefault(result["case"]["solver"], [0, 0])
+        solver_totals[0] += search_time
+        solver_totals[1] += iterations
+    for solver, (search_time, iterations) in totals.items():
+        print(f"{solver}: {search_time / iterations * 1e6:.1f}us per local search iteration ({iterations} iterations)",
+              file=sys.stderr)
+
+
+# Returns the current commit, or None if this is not a git checkout
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Prints the change in total time, each phase and each counter for every case in both result files
+def compare_results(old_path, new_path):
+    with open(old_path) as f:
+        old_results = {get_case_name(result["case"]): result for result in json.load(f)["results"]}
+    with open(new_path) as f:
+        new_results = {get_case_name(result["case"]): result for result in json.load(f)["results"]}
+
+    for name, new in new_results.items():
+        old = old_results.get(name)
+        if old is None:
+            continue
+        print(name)
+        # There are only times to compare if both runs finished
+        old_status, new_status = get_status(old), get_status(new)
+        if old_status in ("timed out", "error") or new_status in ("timed out", "error"):
+            print(f"  {old_status} -> {new_status}")
+            for label, result in (("old", old), ("new", new)):
+                if result.get("error"):
+                    print(f"  {label} error: {result['error']}")
+            continue
+
+        rows = [("total", old["total_time"], new["total_time"])]
+        for phase in new["phase_times"]:
+            rows.append((phase, old["phase_times"].get(phase, 0), new["phase_times"][phase]))
+        for phase, old_seconds, new_seconds in rows:
+            ratio = f"{new_seconds / old_seconds:.2f}x" if old_seconds else "-"
+            print(f"  {phase:<16} {old_seconds:9.4f}s -> {new_seconds:9.4f}s  {ratio}")
+        for counter in sorted(set(old["counters"]) | set(new["counters"])):
+            print(f"  {counter:<24} {old['counters'].get(counter, 0)} -> {new['counters'].get(counter, 0)}")
+        if old.get("peak_memory_bytes") and new.get("peak_memory_bytes"):
+            print(f"  {'peak memory':<16} {old['peak_memory_bytes']} -> {new['peak_memory_bytes']} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark building and solving call schedules")
+    parser.add_argument("--quick", action="store_true", help="run a small matrix instead of the full one")
+    parser.add_argument("--seeds", type=int, default=1, help="number of seeds per case")
+    parser.add_argument("--solvers", default=",".join(FULL_MATRIX), help="comma separated solvers to benchmark")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a case is stopped")
+    parser.add_argument("--no-memory", action="store_true", help="skip the (slower) peak memory run")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+        exit(0)
+
+    solvers = args.solvers.split(",")
+    unknown_solvers = [solver for solver in solvers if solver not in FULL_MATRIX]
+    if unknown_solvers:
+        print(f"Unknown solver(s) {', '.join(unknown_solvers)}. Please give any of: {', '.join(FULL_MATRIX)}.",
+              file=sys.stderr)
+        exit(6)
+
+    matrix = QUICK_MATRIX if args.quick else FULL_MATRIX
+    matrix = {solver: matrix[solver] for solver in solvers}
+    results = run_benchmarks(matrix, range(args.seeds), args.timeout, not args.no_memory)
+    print_iteration_times(results)
+
+    output = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}", file=sys.stderr)
@@ -0,0 +1,250 @@
+import csv
+import datetime
+from functools import lru_cache
+
+# Reads call files (see "File Formatting" in the README) in a single pass over their lines
+# Every line is checked as it is read, and all of the problems in the file are reported together (with their line
+#   numbers) in one CallFileError, instead of stopping at the first one
+# Unavailable days are kept as sets of date ordinals (see datetime.date.toordinal), and each distinct date string is
+#   only parsed once, since the same dates (holidays, vacations) come up again and again in large files
+
+WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday")
+
+# Only one of these can be in a call file, and one of them has to be
+WEEKDAY_COMMANDS = ("/defined_weekday_assignment", "/doctor_available_weekdays")
+
+
+# Raised with every error found in a call file (or CSV file), as a list of (line number, message)
+# The line number is None for errors about the file as a whole
+class CallFileError(ValueError):
+    def __init__(self, errors, source="call file"):
+        self.errors = errors
+        lines = [f"line {line_number}: {message}" if line_number else message for line_number, message in errors]
+        super().__init__(f"{len(errors)} error(s) in {source}:\n  " + "\n  ".join(lines))
+
+
+# Everything read from a call file
+class CallFileContents:
+    def __init__(self):
+        self.doctors = set()
+        # The looping weekday schedule, a list of [Monday, Tuesday, Wednesday, Thursday] doctors for each week
+        self.weekday_schedule = []
+        # Day of the week --> the doctors available on that day, in the order they are listed
+        self.doc_available_weekdays = {day: [] for day in WEEKDAY_NAMES}
+        # Doctor --> set of ordinals of the days they are unavailable
+        self.doc_unavailable_ordinals = dict()
+        # Tuples of the consecutive dates of each holiday
+        self.holidays = set()
+        self.max_weekends = dict()
+        self.max_weekdays = dict()
+
+
+# Returns the ordinal of a date given as mm/dd/yyyy (or yyyy-mm-dd)
+# Raises a ValueError if it is not a valid date
+@lru_cache(maxsize=4096)
+def parse_ordinal(text):
+    if "-" in text:
+        return datetime.date.fromisoformat(text).toordinal()
+    month, day, year = text.split("/")
+    return datetime.date(int(year), int(month), int(day)).toordinal()
+
+
+# Returns the ordinals of a comma separated list of dates
+# Raises a ValueError naming every invalid date in the list
+def _parse_ordinals(text):
+    ordinals = []
+    invalid = []
+    for date in _split_list(text):
+        try:
+            ordinals.append(parse_ordinal(date))
+        except ValueError:
+            invalid.append(date)
+    if invalid:
+        raise ValueError(f"Invalid date(s) {', '.join(invalid)}. Dates must be in mm/dd/yyyy format.")
+    return ordinals
+
+
+# Splits a comma separated list, raising a ValueError if an item is empty
+def _split_list(text):
+    items = [item.strip() for item in text.split(",")]
+    if not all(items):
+        raise ValueError("Empty item in a comma separated list")
+    return items
+
+
+# Splits a "Doctor; rest" line into the doctor and the rest
+def _split_doctor_line(line):
+    doctor, separator, rest = line.partition(";")
+    doctor, rest = doctor.strip(), rest.strip()
+    if not separator or not doctor or not rest:
+        raise ValueError(f'Expected a doctor, a semicolon and a value, like "Alice; ...", but found "{line}"')
+    return doctor, rest
+
+
+# Command --> the name of the _CallFileReader method that reads each of its lines
+COMMAND_READERS = {
+    "/defined_weekday_assignment": "read_defined_weekdays",
+    "/doctor_available_weekdays": "read_available_weekdays",
+    "/doctor_unavailable_days": "read_unavailable_days",
+    "/holiday_dates": "read_holiday",
+    "/max_weekends": "read_max_weekends",
+    "/max_weekdays": "read_max_weekdays",
+    "/additional_doctors": "read_additional_doctor",
+}
+
+
+# Reads the lines of one call file into a CallFileContents
+# Each read_ method takes a (stripped, non-empty) line under its command and its line number, and raises a ValueError
+#   if the line is invalid
+class _CallFileReader:
+    def __init__(self):
+        self.contents = CallFileContents()
+        # Doctor --> the line their /max_weekends or /max_weekdays is on, to check that they are on the schedule
+        self.max_days_lines = dict()
+        # Holiday day ordinal --> the line it is on, to find overlapping holidays
+        self.holiday_lines = dict()
+
+    def read_defined_weekdays(self, line, line_number):
+        doctors = _split_list(line)
+        if len(doctors) != 4:
+            raise ValueError(f"Expected four doctors (Monday to Thursday), but found {len(doctors)}")
+        self.contents.doctors.update(doctors)
+        self.contents.weekday_schedule.append(doctors)
+
+    def read_available_weekdays(self, line, line_number):
+        doctor, days = _split_doctor_line(line)
+        days = _split_list(days)
+        invalid = [day for day in days if day not in WEEKDAY_NAMES]
+        if invalid:
+            raise ValueError(f"Invalid day(s) of the week {', '.join(invalid)}. Please use {', '.join(WEEKDAY_NAMES)}.")
+
+        self.contents.doctors.add(doctor)
+        for day in days:
+            if doctor not in self.contents.doc_available_weekdays[day]:
+                self.contents.doc_available_weekdays[day].append(doctor)
+
+    def read_unavailable_days(self, line, line_number):
+        doctor, dates = _split_doctor_line(line)
+        ordinals = _parse_ordinals(dates)
+        self.contents.doctors.add(doctor)
+        self.contents.doc_unavailable_ordinals.setdefault(doctor, set()).update(ordinals)
+
+    def read_holiday(self, line, line_number):
+        ordinals = _parse_ordinals(line)
+        if any(ordinals[i + 1] - ordinals[i] != 1 for i in range(len(ordinals) - 1)):
+            raise ValueError("The days of a holiday must be consecutive and in order")
+        for ordinal in ordinals:
+            if ordinal in self.holiday_lines:
+                raise ValueError(f"This holiday overlaps the holiday on line {self.holiday_lines[ordinal]}")
+        for ordinal in ordinals:
+            self.holiday_lines[ordinal] = line_number
+        self.contents.holidays.add(tuple(datetime.date.fromordinal(ordinal) for ordinal in ordinals))
+
+    def read_max_weekends(self, line, line_number):
+        self.__read_max_days(self.contents.max_weekends, line, line_number)
+
+    def read_max_weekdays(self, line, line_number):
+        self.__read_max_days(self.contents.max_weekdays, line, line_number)
+
+    def __read_max_days(self, max_days, line, line_number):
+        doctor, maximum = _split_doctor_line(line)
+        if not maximum.isdigit():
+            raise ValueError(f"The maximum for {doctor} must be a whole number, but found {maximum}")
+        max_days[doctor] = int(maximum)
+        self.max_days_lines[doctor] = line_number
+
+    def read_additional_doctor(self, line, line_number):
+        self.contents.doctors.add(line)
+
+
+# Reads the call file from an open file (or any iterable of lines) and returns its CallFileContents
+# Blank lines are skipped, and the commands can come in any order
+# Raises a CallFileError with every error in the file
+def parse_call_file(file_obj, source="call file"):
+    reader = _CallFileReader()
+    errors = []
+    # Reads the lines of the current command. None before the first command, and after an unknown one.
+    read_line = None
+    unknown_command = False
+    weekday_command = None
+
+    for line_number, line in enumerate(file_obj, 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        if line[0] == "/":
+            unknown_command = line not in COMMAND_READERS
+            if unknown_command:
+                read_line = None
+                errors.append((line_number, f"Unknown command {line}. Please use one of: {', '.join(COMMAND_READERS)}"))
+                continue
+            read_line = getattr(reader, COMMAND_READERS[line])
+            if line in WEEKDAY_COMMANDS:
+                if weekday_command not in (None, line):
+                    errors.append((line_number, f"Only one of {' and '.join(WEEKDAY_COMMANDS)} can be used"))
+                weekday_command = line
+            continue
+
+        if read_line is None:
+            # The lines under an unknown command were already reported with the command
+            if not unknown_command:
+                errors.append((line_number, f'"{line}" is not under a command'))
+            continue
+
+        try:
+            read_line(line, line_number)
+        except ValueError as error:
+            errors.append((line_number, str(error)))
+
+    for doctor, line_number in reader.max_days_lines.items():
+        if doctor not in reader.contents.doctors:
+            errors.append((line_number, f"{doctor} is not on the schedule"))
+    if weekday_command is None:
+        errors.append((None, f"The call file needs one of {' or '.join(WEEKDAY_COMMANDS)}"))
+
+    if errors:
+        raise CallFileError(sorted(errors, key=lambda error: error[0] or 0), source)
+    return reader.contents
+
+
+# Reads a CSV export of unavailable days (such as from a vacation or leave system), with a header row and then one row
+#   per doctor and day, or range of days:
+#     doctor,date                 or    doctor,start_date,end_date
+# The dates can be mm/dd/yyyy or yyyy-mm-dd, the ranges include both ends, and any other columns are ignored
+# If doctors is given, every doctor in the file has to be one of them
+# Returns a {doctor: set of ordinals}, or raises a CallFileError with every invalid row
+def read_unavailable_days_csv(file_obj, doctors=None, source="CSV file"):
+    reader = csv.reader(file_obj)
+    header = [column.strip().lower() for column in next(reader, [])]
+    if "doctor" not in header or not ("date" in header or ("start_date" in header and "end_date" in header)):
+        raise CallFileError([(1, "The header must have a doctor column, and a date column or start_date and end_date "
+                                 "columns")], source)
+    doctor_column = header.index("doctor")
+    if "date" in header:
+        start_column = end_column = header.index("date")
+    else:
+        start_column, end_column = header.index("start_date"), header.index("end_date")
+
+    unavailable_ordinals = dict()
+    errors = []
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            doctor = row[doctor_column].strip()
+            start, end = parse_ordinal(row[start_column].strip()), parse_ordinal(row[end_column].strip())
+        except (IndexError, ValueError):
+            errors.append((reader.line_num, "Expected a doctor and valid date(s) (mm/dd/yyyy or yyyy-mm-dd)"))
+            continue
+
+        if doctors is not None and doctor not in doctors:
+            errors.append((reader.line_num, f"{doctor} is not on the schedule"))
+        elif end < start:
+            errors.append((reader.line_num, "The end date is before the start date"))
+        else:
+            unavailable_ordinals.setdefault(doctor, set()).update(range(start, end + 1))
+
+    if errors:
+        raise CallFileError(errors, source)
+    return unavailable_ordinals
@@ -0,0 +1,41 @@
+from bisect import bisect_left
+
+
+# Builds the constraint graph as CSR-style flat lists from the constraints dictionary
+# The neighbors of variable i are neighbor_vars[neighbor_start[i]:neighbor_start[i + 1]], and the constraint at the same
+#   position in neighbor_constraints is oriented from i to that neighbor (checked with is_satisfied(value_i, value_j))
+# If only one direction of an arc is given, the other direction uses the reversed constraint
+def build_adjacency(num_variables, constraints):
+    adjacency = [dict() for _ in range(num_variables)]
+    for (var_1, var_2), constraint in constraints.items():
+        adjacency[var_1][var_2] = constraint
+        if (var_2, var_1) not in constraints:
+            adjacency[var_2][var_1] = constraint.reversed()
+
+    neighbor_start = [0]
+    neighbor_vars = []
+    neighbor_constraints = []
+    for var in range(num_variables):
+        for neighbor in sorted(adjacency[var].keys()):
+            neighbor_vars.append(neighbor)
+            neighbor_constraints.append(adjacency[var][neighbor])
+        neighbor_start.append(len(neighbor_vars))
+
+    return neighbor_start, neighbor_vars, neighbor_constraints
+
+
+# Given the CSR neighbor lists from build_adjacency, returns two lists indexed by arc (a position in neighbor_vars):
+#   the variable the arc starts from, and the position of the same arc going the other way
+def build_reverse_arcs(neighbor_start, neighbor_vars):
+    arc_sources = []
+    for var in range(len(neighbor_start) - 1):
+        arc_sources.extend([var] * (neighbor_start[var + 1] - neighbor_start[var]))
+
+    reverse_arcs = []
+    for arc in range(len(neighbor_vars)):
+        target = neighbor_vars[arc]
+        # The target's neighbors are sorted, so we can binary search for the source among them
+        reverse_arcs.append(bisect_left(neighbor_vars, arc_sources[arc], neighbor_start[target],
+                                        neighbor_start[target + 1]))
+
+    return arc_sources, reverse_arcs
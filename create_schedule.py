@@ -1,6 +1,14 @@
 import sys
 import datetime
+import json
+import os
+import time
+from call_file_parser import CallFileError
 from CallSchedulingProblem import CallSchedulingProblem
+from problem_cache import load_problem
+from SolverStats import SolverStats, NO_STATS
+from TabuMemory import DEFAULT_TABU_TENURE
+from schedule_writers import DEFAULT_FORMATS, OUTPUT_FORMATS
 
 # Author: Ben Williams - benjamin.r.williams.25@dartmouth.edu
 # Date: November 29th, 2023
@@ -9,8 +17,130 @@ from CallSchedulingProblem import CallSchedulingProblem
 # Usage: python create_schedule.py mm/dd/yyyy mm/dd/yyyy input_filepath output_filepath
 #                                  ^start date  ^end date
 # The output_filepath is optional, and will just output into the current directory if no path is provided
+# Options (anywhere in the command):
+#   --workers N     Search with N processes at once, and keep the first fair schedule found
+#   --solver NAME   How to search: "repair" (default), "soft", "annealing", "backtracking", "compiled" (the same as
+#                   "repair", with the local searches on the NumPy encoding of the problem, see CompiledCallSchedule) or
+#                   "tabu" (the same as "repair", with tabu searches in place of plain min-conflicts)
+#   --tabu-tenure N With --solver tabu, the number of iterations a move stays tabu for (10 by default)
+#   --window-months N
+#                   Solve N months at a time and put the pieces together (see solve_windowed). With --workers, the
+#                   pieces are solved in that many processes at once.
+#   --time-limit SECONDS
+#                   Stop searching after about SECONDS, and write out the best schedule found by then even if it is not
+#                   fair or breaks rules (its score is printed, see solve_with_time_limit). Cannot be used with
+#                   --workers or --window-months.
+#   --vacations FILE
+#                   Also make doctors unavailable on the days in FILE, a CSV export of vacations with doctor and date
+#                   (or start_date and end_date) columns (see read_unavailable_days_csv)
+#   --cache-dir DIR Keep built problems in DIR, so running on the same file and dates again skips building the problem
+#   --formats LIST  Comma separated output formats: txt, csv (the default is both), daily_csv (one row per day), json
+#                   and ics (an iCalendar file for each doctor). All of them are written in one pass.
+#   --stats FILE    Write the time spent in each phase, the iteration/restart counts and the conflicts over time of each
+#                   local search to FILE as JSON
+#   --profile       With --stats, also profile the run with cProfile and include the slowest functions
+#   --trace-memory  With --stats, also include the peak memory (measured with tracemalloc, which slows the run down)
+
+# The solve_for_call_schedule arguments for each --solver choice
+SOLVERS = {
+    "repair": {},
+    "soft": {"fairness_mode": "soft"},
+    "annealing": {"solver": "annealing"},
+    "backtracking": {"solver": "backtracking"},
+    "compiled": {"use_compiled": True},
+    "tabu": {"tabu_tenure": DEFAULT_TABU_TENURE},
+}
+
+
+# Removes "option value" from the argument list and returns the value, or the default if the option is not there
+def pop_option(args, option, default=None):
+    if option not in args:
+        return default
+
+    index = args.index(option)
+    if index + 1 >= len(args):
+        print(f"No value given for {option}", file=sys.stderr)
+        exit(6)
+
+    value = args[index + 1]
+    del args[index:index + 2]
+    return value
+
+
+# Removes the flag from the argument list, returning True if it was there
+def pop_flag(args, flag):
+    if flag not in args:
+        return False
+    args.remove(flag)
+    return True
+
 
 if __name__ == "__main__":
+    workers_str = pop_option(sys.argv, "--workers", "1")
+    try:
+        workers = int(workers_str)
+        if workers < 1:
+            raise ValueError
+    except ValueError:
+        print(f"Invalid number of workers {workers_str}. Please give a positive whole number.", file=sys.stderr)
+        exit(6)
+
+    solver_name = pop_option(sys.argv, "--solver", "repair")
+    if solver_name not in SOLVERS:
+        print(f"Unknown solver {solver_name}. Please give one of: {', '.join(SOLVERS)}.", file=sys.stderr)
+        exit(6)
+    solve_options = SOLVERS[solver_name]
+
+    tabu_tenure_str = pop_option(sys.argv, "--tabu-tenure")
+    if tabu_tenure_str:
+        try:
+            tabu_tenure = int(tabu_tenure_str)
+            if tabu_tenure < 1:
+                raise ValueError
+        except ValueError:
+            print(f"Invalid tabu tenure {tabu_tenure_str}. Please give a positive whole number.", file=sys.stderr)
+            exit(6)
+        if solver_name != "tabu":
+            print("--tabu-tenure can only be used with --solver tabu", file=sys.stderr)
+            exit(6)
+        solve_options = dict(solve_options, tabu_tenure=tabu_tenure)
+
+    output_formats = pop_option(sys.argv, "--formats", ",".join(DEFAULT_FORMATS)).split(",")
+    unknown_formats = [name for name in output_formats if name not in OUTPUT_FORMATS]
+    if unknown_formats:
+        print(f"Unknown output format(s) {', '.join(unknown_formats)}. "
+              f"Please give any of: {', '.join(OUTPUT_FORMATS)}.", file=sys.stderr)
+        exit(6)
+
+    window_months_str = pop_option(sys.argv, "--window-months")
+    try:
+        window_months = int(window_months_str) if window_months_str else None
+        if window_months is not None and window_months < 1:
+            raise ValueError
+    except ValueError:
+        print(f"Invalid number of months {window_months_str}. Please give a positive whole number.", file=sys.stderr)
+        exit(6)
+
+    time_limit_str = pop_option(sys.argv, "--time-limit")
+    try:
+        time_limit = float(time_limit_str) if time_limit_str else None
+        if time_limit is not None and not time_limit > 0:
+            raise ValueError
+    except ValueError:
+        print(f"Invalid time limit {time_limit_str}. Please give a positive number of seconds.", file=sys.stderr)
+        exit(6)
+    if time_limit and (workers > 1 or window_months):
+        print("--time-limit cannot be used with --workers or --window-months", file=sys.stderr)
+        exit(6)
+
+    vacations_filepath = pop_option(sys.argv, "--vacations")
+    cache_dir = pop_option(sys.argv, "--cache-dir")
+
+    stats_filepath = pop_option(sys.argv, "--stats")
+    profile = pop_flag(sys.argv, "--profile")
+    trace_memory = pop_flag(sys.argv, "--trace-memory")
+    stats = SolverStats(profile=profile, trace_memory=trace_memory) if stats_filepath else NO_STATS
+
     if len(sys.argv) not in [4, 5]:
         print("Incorrect amount of parameters given. Please give a start date, end date, input filepath, "
               "and output filepath separated by spaces.",
@@ -51,22 +181,60 @@ if __name__ == "__main__":
     else:
         output_filepath = "./"
 
-    try:
-        if output_filepath[-1] == "/":
-            f = open(output_filepath + "output_schedule.txt", "w")
-        else:
-            f = open(output_filepath)
-        f.close()
-    except FileNotFoundError:
+    # The output files go in the output filepath's directory, so it has to exist and be writable
+    output_directory = os.path.dirname(output_filepath) or "."
+    if not os.path.isdir(output_directory) or not os.access(output_directory, os.W_OK):
         print(f"Unable to create file at {output_filepath}. The directory may not exist, or you may not have permission"
               , file=sys.stderr)
         exit(5)
 
-    call_prob = CallSchedulingProblem(start_date, end_date, input_filepath)
-    schedule = call_prob.solve_for_call_schedule()
+    start_time = time.perf_counter()
+    score = None
+    with stats.capture():
+        # Every error in the call file (or vacations file) is printed with its line number
+        try:
+            if cache_dir:
+                call_prob = load_problem(start_date, end_date, input_filepath, cache_dir, stats=stats)
+            else:
+                call_prob = CallSchedulingProblem(start_date, end_date, input_filepath, stats=stats)
+            # After loading, so the cached problem stays the one for the call file alone
+            if vacations_filepath:
+                call_prob.import_unavailable_days(vacations_filepath)
+        except CallFileError as error:
+            print(error, file=sys.stderr)
+            exit(7)
+        except FileNotFoundError:
+            print(f"Invalid vacations filepath {vacations_filepath}, cannot find or open file", file=sys.stderr)
+            exit(4)
+        if window_months:
+            schedule = call_prob.solve_windowed(window_months, num_workers=workers, **solve_options)
+        elif workers > 1:
+            schedule = call_prob.solve_in_parallel(workers, **solve_options)
+        elif time_limit:
+            schedule, score = call_prob.solve_with_time_limit(time_limit, **solve_options)
+        else:
+            schedule = call_prob.solve_for_call_schedule(**solve_options)
+
+        if schedule:
+            call_prob.write_out_solution(schedule, output_filepath, output_formats)
+
+    if stats_filepath:
+        stats_output = {"call_file": input_filepath, "start_date": start_date.isoformat(),
+                        "end_date": end_date.isoformat(), "solver": solver_name, "workers": workers,
+                        "success": schedule is not None, "total_time": time.perf_counter() - start_time,
+                        "num_variables": len(call_prob.variables), "num_doctors": len(call_prob.doctors),
+                        "score": score}
+        stats_output.update(stats.to_dict())
+        with open(stats_filepath, "w") as f:
+            json.dump(stats_output, f, indent=2)
+
+    if score and (score["conflicts"] or not score["fair"]):
+        print(f"Time limit reached. The schedule written out is the best one found, and has {score['conflicts']} "
+              f"broken rule(s), weekday and weekend spreads of {score['weekday_spread']} and "
+              f"{score['weekend_spread']}, and {score['days_over_max']} day(s) over doctors' maximums.",
+              file=sys.stderr)
 
     if schedule:
-        call_prob.write_out_solution(schedule, output_filepath)
         weekdays, weekends, holidays = call_prob.get_doc_days_assigned(schedule)
         print("Schedule created. Below are the number of weekdays, weekends, and holidays assigned to each doctor:")
         print("Weekday totals:", weekdays)
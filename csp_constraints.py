@@ -0,0 +1,60 @@
+# Binary constraints used by the ConstraintSatisfactionProblem. Each constraint is stored under a (var_1, var_2) key
+#   and is checked with is_satisfied(value_1, value_2), where value_1 is assigned to var_1 and value_2 to var_2.
+# They also support `(value_1, value_2) in constraint`, so they can be used anywhere the old sets of allowed pairs were
+# For bitset domains, supports_mask(value_1, value_bits, full_mask) returns the bitmask of the value_2s allowed with
+#   value_1, where value_bits maps each value to its bit and full_mask has every bit set
+
+
+# The two variables must take different values. This needs no memory per pair of values, so a single instance
+#   can be shared by every arc in the problem
+class NotEqualConstraint:
+    def is_satisfied(self, value_1, value_2):
+        return value_1 != value_2
+
+    def supports_mask(self, value_1, value_bits, full_mask):
+        return full_mask & ~value_bits.get(value_1, 0)
+
+    # The same constraint seen from (var_2, var_1)
+    def reversed(self):
+        return self
+
+    def __contains__(self, value_pair):
+        return value_pair[0] != value_pair[1]
+
+    # Pickles as a reference to the shared NOT_EQUAL instance, so unpickled problems still share one constraint
+    def __reduce__(self):
+        return "NOT_EQUAL"
+
+
+# The general case - the constraint is defined by an explicit set of allowed (value_1, value_2) pairs
+class TableConstraint:
+    def __init__(self, allowed_pairs):
+        self.allowed_pairs = set(allowed_pairs)
+
+    def is_satisfied(self, value_1, value_2):
+        return (value_1, value_2) in self.allowed_pairs
+
+    def supports_mask(self, value_1, value_bits, full_mask):
+        mask = 0
+        for (allowed_1, allowed_2) in self.allowed_pairs:
+            if allowed_1 == value_1:
+                mask |= value_bits.get(allowed_2, 0)
+        return mask
+
+    # The same constraint seen from (var_2, var_1)
+    def reversed(self):
+        return TableConstraint((value_2, value_1) for (value_1, value_2) in self.allowed_pairs)
+
+    def __contains__(self, value_pair):
+        return value_pair in self.allowed_pairs
+
+
+# Shared by all the arcs that only need their two variables to be different
+NOT_EQUAL = NotEqualConstraint()
+
+
+# Wraps a raw set of allowed pairs in a TableConstraint, and leaves constraint objects as they are
+def as_constraint(constraint):
+    if isinstance(constraint, (NotEqualConstraint, TableConstraint)):
+        return constraint
+    return TableConstraint(constraint)
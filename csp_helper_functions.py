@@ -1,4 +1,6 @@
 from math import inf
+from BitsetDomains import BitsetDomains
+from TrailDomains import TrailDomains
 # Author: Ben Williams
 # Date: October 12th, 2023
 
@@ -12,30 +14,39 @@ def first_unassigned_variable(assignment):
 
 
 # Returns the index of the currently unassigned variable with the fewest remaining possible values
+# With TrailDomains or BitsetDomains the sizes are read directly (a popcount for bitsets) instead of listing the values
 def minimum_remaining_values(assignment, domains):
+    if isinstance(domains, (TrailDomains, BitsetDomains)):
+        domain_size = domains.size
+    else:
+        def domain_size(var):
+            return len(domains[var])
+
     # Infinite domain size to start
     min_available_size = inf
     min_available_index = None
     for i in range(len(assignment)):
         if assignment[i] is None:
             # If the size of this domain is the smallest seen so far
-            if len(domains[i]) < min_available_size:
+            size = domain_size(i)
+            if size < min_available_size:
                 min_available_index = i
-                min_available_size = len(domains[i])
+                min_available_size = size
 
     return min_available_index
 
 
-# Given a list of lists of values to remove and the domains, remove the values from the domain
-def remove_from_domains(remove_lists, domains):
-    for i in range(len(remove_lists)):
-        for removal in remove_lists[i]:
-            domains[i].remove(removal)
+# How many iterations the searches go between checking their deadline (see ConstraintSatisfactionProblem.out_of_time)
+DEADLINE_CHECK_INTERVAL = 64
 
 
-# Given a list of lists of values to add and the domains, add the values from the domain
-# Used to return the domains to their previous state after removing values
-def add_to_domains(add_lists, domains):
-    for i in range(len(add_lists)):
-        for addition in add_lists[i]:
-            domains[i].append(addition)
+# Returns the annealing temperature at the given iteration, going from initial_temperature down to final_temperature
+#   over max_iters iterations. The schedule is either "geometric" (multiplied by the same factor every iteration) or
+#   "linear"
+def annealing_temperature(schedule, initial_temperature, final_temperature, curr_iter, max_iters):
+    progress = min(curr_iter / max(max_iters, 1), 1)
+    if schedule == "geometric":
+        return initial_temperature * (final_temperature / initial_temperature) ** progress
+    if schedule == "linear":
+        return initial_temperature + (final_temperature - initial_temperature) * progress
+    raise ValueError(f"Unknown cooling schedule {schedule}")
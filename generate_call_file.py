@@ -0,0 +1,203 @@
+import argparse
+import datetime
+import math
+import random
+import sys
+
+# Generates call files (see "File Formatting" in the README) for testing and benchmarking at a realistic scale
+# Everything is drawn from a random.Random(seed), so the same arguments and seed always give the same file
+# Usage: python generate_call_file.py output_filepath [--doctors N] [--years N] [--start mm/dd/yyyy]
+#                                     [--vacation-density F] [--holidays N] [--senior N] [--additional N]
+#                                     [--defined-schedule] [--near-infeasible] [--seed N]
+# The output_filepath can be "-" to print the file instead
+
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday"]
+
+# (month, day, number of days) of common holidays, in the order they are used
+COMMON_HOLIDAYS = [
+    (12, 25, 1), (7, 4, 1), (11, 28, 2), (1, 1, 1), (5, 25, 4), (9, 1, 3), (12, 31, 1), (2, 19, 1), (10, 14, 1),
+    (11, 11, 1), (6, 19, 1), (1, 15, 1),
+]
+
+
+# Returns the text of a call file
+#   num_doctors: Doctors that work weekdays, weekends and holidays
+#   start_date, years: The horizon the unavailable days and holidays are spread over
+#   vacation_density: The fraction of days each doctor is unavailable, taken in blocks of one to seven days
+#   num_holidays: Holidays per year, taken from COMMON_HOLIDAYS
+#   num_senior: Doctors with /max_weekends and /max_weekdays caps of about half of a fair share
+#   num_additional: Extra doctors listed under /additional_doctors, who only work weekends and holidays. Needs
+#       defined_schedule.
+#   defined_schedule: Use a looping /defined_weekday_assignment instead of /doctor_available_weekdays. It goes through
+#       the doctors in order, and has as many weeks as it takes for every doctor to have the same number of weekdays.
+#   near_infeasible: Adds runs of three weekends in a row that only three doctors can work. Weekends close to each
+#       other need different doctors, so these have (almost) no slack.
+def generate_call_file(num_doctors=10, start_date=datetime.date(2024, 1, 15), years=1, vacation_density=0.05,
+                       num_holidays=6, num_senior=0, num_additional=0, defined_schedule=False, near_infeasible=False,
+                       seed=None):
+    if num_doctors < 4:
+        raise ValueError("At least four doctors are needed to cover every weekday")
+    if not 0 <= vacation_density < 1:
+        raise ValueError("The vacation density must be at least 0 and less than 1")
+    if num_senior > num_doctors:
+        raise ValueError("There cannot be more senior doctors than doctors")
+    # Additional doctors never work weekdays, so the weekdays could never be fair unless they are defined
+    if num_additional and not defined_schedule:
+        raise ValueError("Additional doctors can only be used with a defined weekday schedule")
+
+    rng = random.Random(seed)
+    end_date = add_years(start_date, years)
+    num_days = (end_date - start_date).days + 1
+    doctors = [f"Doctor{i + 1:02d}" for i in range(num_doctors)]
+    additional_doctors = [f"Extra{i + 1:02d}" for i in range(num_additional)]
+
+    # Doctor --> set of day offsets (from start_date) they are unavailable
+    unavailable = {doctor: set() for doctor in doctors + additional_doctors}
+    for doctor in unavailable:
+        target = int(vacation_density * num_days)
+        while len(unavailable[doctor]) < target:
+            block_start = rng.randrange(num_days)
+            block_length = rng.randint(1, 7)
+            unavailable[doctor].update(range(block_start, min(block_start + block_length, num_days)))
+
+    if near_infeasible:
+        _add_scarce_weekends(rng, start_date, num_days, doctors + additional_doctors, unavailable)
+
+    lines = []
+    if defined_schedule:
+        lines.append("/defined_weekday_assignment")
+        # The doctors go round and round until the last weekday of a week is the last doctor
+        for week in range(num_doctors // math.gcd(num_doctors, 4)):
+            lines.append(", ".join(doctors[(4 * week + day) % num_doctors] for day in range(4)))
+    else:
+        lines.append("/doctor_available_weekdays")
+        lines.extend(f"{doctor}; {', '.join(days)}" for doctor, days in _get_available_weekdays(rng, doctors))
+
+    lines.append("/doctor_unavailable_days")
+    for doctor, offsets in unavailable.items():
+        if offsets:
+            dates = [format_date(start_date + datetime.timedelta(days=offset)) for offset in sorted(offsets)]
+            lines.append(f"{doctor}; {', '.join(dates)}")
+
+    holidays = _get_holidays(start_date, end_date, num_holidays)
+    if holidays:
+        lines.append("/holiday_dates")
+        lines.extend(", ".join(format_date(date) for date in holiday) for holiday in holidays)
+
+    if num_senior:
+        # About half of a fair share of the weekends and weekdays
+        num_weeks = num_days // 7
+        senior_doctors = rng.sample(doctors, num_senior)
+        lines.append("/max_weekends")
+        lines.extend(f"{doctor}; {max(1, num_weeks // (2 * num_doctors))}" for doctor in senior_doctors)
+        if not defined_schedule:
+            lines.append("/max_weekdays")
+            lines.extend(f"{doctor}; {max(1, 4 * num_weeks // (2 * num_doctors))}" for doctor in senior_doctors)
+
+    if additional_doctors:
+        lines.append("/additional_doctors")
+        lines.extend(additional_doctors)
+
+    return "\n".join(lines) + "\n"
+
+
+# Writes the generated call file to the path. Takes the same keyword arguments as generate_call_file.
+def write_call_file(path, **parameters):
+    with open(path, "w") as f:
+        f.write(generate_call_file(**parameters))
+
+
+# Returns the same day the given number of years later, or February 28 for a February 29 in a year without one
+def add_years(date, years):
+    try:
+        return date.replace(year=date.year + years)
+    except ValueError:
+        return date.replace(year=date.year + years, day=28)
+
+
+def format_date(date):
+    return f"{date.month}/{date.day}/{date.year}"
+
+
+# Gives each doctor two days of the week, making sure every day has at least two doctors
+def _get_available_weekdays(rng, doctors):
+    available = []
+    for i, doctor in enumerate(doctors):
+        # The first day goes round-robin, so each day of the week gets at least one of every four doctors
+        first_day = i % 4
+        second_day = (first_day + rng.randint(1, 3)) % 4
+        available.append((doctor, [WEEKDAY_NAMES[day] for day in sorted([first_day, second_day])]))
+    return available
+
+
+# Returns the holidays (as tuples of dates) inside the horizon, num_holidays from each year
+def _get_holidays(start_date, end_date, num_holidays):
+    holidays = []
+    for year in range(start_date.year, end_date.year + 1):
+        for (month, day, length) in COMMON_HOLIDAYS[:num_holidays]:
+            first_date = datetime.date(year, month, day)
+            holiday = tuple(first_date + datetime.timedelta(days=i) for i in range(length))
+            if start_date <= holiday[0] and holiday[-1] <= end_date:
+                holidays.append(holiday)
+    holidays.sort()
+
+    # Holidays cannot overlap (New Year's Eve and New Year's Day can both be in the list)
+    non_overlapping = []
+    for holiday in holidays:
+        if not non_overlapping or non_overlapping[-1][-1] < holiday[0]:
+            non_overlapping.append(holiday)
+    return non_overlapping
+
+
+# About once a quarter, makes every doctor but three unavailable for three weekends in a row
+def _add_scarce_weekends(rng, start_date, num_days, doctors, unavailable):
+    # The day offsets of the first Friday, then every Friday with a whole weekend left after it
+    first_friday = (4 - start_date.weekday()) % 7
+    fridays = list(range(first_friday, num_days - 2, 7))
+
+    for run_start in range(rng.randrange(4), len(fridays) - 2, 13):
+        available = set(rng.sample(doctors, 3))
+        for friday in fridays[run_start:run_start + 3]:
+            for doctor in doctors:
+                if doctor in available:
+                    unavailable[doctor].difference_update(range(friday, friday + 3))
+                else:
+                    unavailable[doctor].update(range(friday, friday + 3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a call file for testing and benchmarking")
+    parser.add_argument("output_filepath", help='where to write the call file, or "-" to print it')
+    parser.add_argument("--doctors", type=int, default=10, help="number of doctors")
+    parser.add_argument("--years", type=int, default=1, help="length of the horizon in years")
+    parser.add_argument("--start", default="1/15/2024", help="start of the horizon (mm/dd/yyyy)")
+    parser.add_argument("--vacation-density", type=float, default=0.05,
+                        help="fraction of days each doctor is unavailable")
+    parser.add_argument("--holidays", type=int, default=6, help="holidays per year")
+    parser.add_argument("--senior", type=int, default=0, help="number of doctors with weekend and weekday caps")
+    parser.add_argument("--additional", type=int, default=0, help="number of weekend and holiday only doctors")
+    parser.add_argument("--defined-schedule", action="store_true", help="use a defined weekday assignment")
+    parser.add_argument("--near-infeasible", action="store_true", help="add weekends that only three doctors can work")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    try:
+        month, day, year = (int(part) for part in args.start.split("/"))
+        start = datetime.date(year, month, day)
+    except ValueError:
+        print(f"Invalid start date format {args.start}. Please give it in mm/dd/yyyy format.", file=sys.stderr)
+        exit(2)
+
+    try:
+        call_file = generate_call_file(args.doctors, start, args.years, args.vacation_density, args.holidays,
+                                       args.senior, args.additional, args.defined_schedule, args.near_infeasible,
+                                       args.seed)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        exit(1)
+
+    if args.output_filepath == "-":
+        sys.stdout.write(call_file)
+    else:
+        with open(args.output_filepath, "w") as f:
+            f.write(call_file)
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import pickle
+
+from CallSchedulingProblem import CallSchedulingProblem
+from SolverStats import NO_STATS
+
+# A cache of built CallSchedulingProblems on disk, so that running on the same call file and dates again skips parsing
+#   the file and building the variables, domains and constraints
+# Problems are pickled into <cache_dir>/<key>.pickle, where the key is a hash of the call file's contents, the dates
+#   and MODEL_VERSION. Editing the call file or changing the dates gives a new key, so stale entries are never read.
+
+# Bump this whenever a change to CallSchedulingProblem changes what it builds, or what a pickled one contains
+MODEL_VERSION = 6
+
+
+# Returns the cache key (a hex sha256) for the call file and dates
+def get_cache_key(start_date, end_date, call_file):
+    with open(call_file, "rb") as f:
+        return get_contents_cache_key(start_date, end_date, f.read())
+
+
+# Returns the cache key for a call file's contents (as bytes) and dates
+def get_contents_cache_key(start_date, end_date, contents):
+    hasher = hashlib.sha256()
+    hasher.update(contents)
+    hasher.update(f"|{start_date.isoformat()}|{end_date.isoformat()}|{MODEL_VERSION}".encode())
+    return hasher.hexdigest()
+
+
+# Returns the CallSchedulingProblem for the dates and call file, loaded from cache_dir if it was built before, and
+#   built (and saved to cache_dir) otherwise
+# Note that the holidays given to each doctor are chosen when the problem is built, so a cached problem keeps them
+# If a SolverStats is given as stats, the problem records into it, along with the time spent loading from the cache
+def load_problem(start_date, end_date, call_file, cache_dir, stats=None):
+    stats = stats if stats is not None else NO_STATS
+    cache_path = os.path.join(cache_dir, get_cache_key(start_date, end_date, call_file) + ".pickle")
+
+    if os.path.exists(cache_path):
+        try:
+            with stats.phase("cache_load"):
+                with open(cache_path, "rb") as f:
+                    problem = pickle.load(f)
+            if isinstance(problem, CallSchedulingProblem):
+                problem.stats = stats
+                return problem
+        # A damaged or out of date file can fail in many ways while unpickling, and is just rebuilt below
+        except Exception:
+            pass
+
+    problem = CallSchedulingProblem(start_date, end_date, call_file, stats=stats)
+    save_problem(problem, cache_path)
+    return problem
+
+
+# Pickles the problem to the path. It is written to a temporary file first, so a crash cannot leave half a file behind
+def save_problem(problem, cache_path):
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+
+    # The compiled encoding is rebuilt on demand, so there is no need to store it, and the stats belong to this run
+    compiled, stats = problem.compiled, problem.stats
+    problem.compiled, problem.stats = None, NO_STATS
+    try:
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(problem, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    finally:
+        problem.compiled, problem.stats = compiled, stats
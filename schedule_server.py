@@ -0,0 +1,416 @@
+import argparse
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from batch_schedule import parse_date
+from CallSchedulingProblem import CallSchedulingProblem
+from create_schedule import SOLVERS
+from problem_cache import get_contents_cache_key
+from schedule_writers import KIND_NAMES
+
+# A long-running local scheduling service, so that a scheduling UI does not have to start create_schedule.py (and
+#   parse the call file and build the problem again) for every request
+# Built problems are kept in memory, up to --max-problems of them, and the least recently used one is dropped first.
+#   They are keyed by the call file's contents and the dates (see problem_cache.py), so the same input is only ever
+#   built once. Each problem is built in, and then kept in, one of the worker processes, which also solve and validate
+#   it, so the server keeps answering while they run.
+# Usage: python schedule_server.py [--host HOST] [--port N] [--unix PATH] [--workers N] [--max-problems N]
+# Requests and responses are JSON over HTTP (POST with a JSON body):
+#   POST /solve     {"call_file": text, "start_date": "mm/dd/yyyy", "end_date": "mm/dd/yyyy", "solver": NAME,
+#                    "seed": N, "time_limit": seconds}
+#                   "call_file_path" can be given instead of "call_file". solver (see create_schedule.py), seed and
+#                   time_limit are optional. Returns the problem's "key", every "days" (date, kind and doctor), each
+#                   doctor's "totals", the "unfairness" (see CallSchedulingProblem.get_unfairness) and the
+#                   "solve_time". With a time_limit, the best schedule found in that time is returned along with its
+#                   "score" (see CallSchedulingProblem.solve_with_time_limit), even if it is not fair.
+#   POST /resolve   {"key": KEY, "call_file": text, "solver": NAME, "seed": N, "time_limit": seconds}
+#                   Solves a problem that was already built again. With a new call_file (for example with a doctor's
+#                   new vacation), the built problem is updated in place of being rebuilt where it can be (see
+#                   CallSchedulingProblem.update_from_call_file), and the response has the new key.
+#   POST /validate  {"key": KEY, "days": [{"date": "yyyy-mm-dd", "doctor": NAME}, ...]}
+#                   Checks a schedule (such as one edited by hand) against the problem, and returns its "conflicts",
+#                   the days with "unavailable" doctors, and the "unfairness". "valid" is true if there are neither.
+#   GET  /status    The keys of the problems in memory and the number of requests being worked on
+# Errors are returned as {"error": message}, with the status 400 for a bad request (or call file) and 404 for an
+#   unknown key
+
+
+class RequestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+               500: "Internal Server Error"}
+
+# Largest request body that is read
+MAX_BODY_BYTES = 16 << 20
+
+
+class ScheduleServer:
+    def __init__(self, num_workers=os.cpu_count(), max_problems=32):
+        # Each worker is a process of its own that keeps the problems it built, so a request only sends the worker the
+        #   problem's key (and any changes) instead of the whole problem. Requests for one problem run one at a time,
+        #   while requests for problems in different workers run at once.
+        # Workers are started from inside the event loop, which has threads running, so they are spawned instead of
+        #   forked
+        context = multiprocessing.get_context("spawn")
+        self.workers = [ProcessPoolExecutor(1, mp_context=context) for _ in range(num_workers)]
+        # Number of problems each worker is keeping
+        self.worker_loads = [0 for _ in range(num_workers)]
+        self.max_problems = max_problems
+        # Key --> (worker index, start date, end date) of a built problem, with the most recently used last
+        self.problems = OrderedDict()
+        # Key --> future for a problem that is being built, which gives the index of the worker that built it, so that
+        #   requests for the same input share one build
+        self.building = dict()
+        self.num_active = 0
+
+    # Returns the worker index, start date and end date of the problem with the key, or raises a RequestError if it is
+    #   not in memory
+    def get_problem(self, key):
+        if key not in self.problems:
+            raise RequestError(f"No problem with the key {key}. Please send the call file to /solve again.", 404)
+        self.problems.move_to_end(key)
+        return self.problems[key]
+
+    def add_problem(self, key, worker, start_date, end_date):
+        self.problems[key] = (worker, start_date, end_date)
+        self.problems.move_to_end(key)
+        self.worker_loads[worker] += 1
+        while len(self.problems) > self.max_problems:
+            old_key, (old_worker, _, _) = self.problems.popitem(last=False)
+            self.worker_loads[old_worker] -= 1
+            # Requests already sent to the worker for the problem run before it is dropped
+            self.workers[old_worker].submit(_drop_task, old_key)
+
+    # Runs the function in the worker, and returns what it returns
+    async def run_in_worker(self, worker, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.workers[worker], function, *args)
+
+    # Returns the key and worker index of the problem for the call file and dates, building it in the worker keeping
+    #   the fewest problems if it is not in memory
+    async def load_problem(self, start_date, end_date, call_file):
+        key = get_contents_cache_key(start_date, end_date, call_file.encode())
+        if key in self.problems:
+            return key, self.get_problem(key)[0]
+
+        if key in self.building:
+            return key, await self.building[key]
+
+        future = asyncio.ensure_future(self.build_problem(key, start_date, end_date, call_file))
+        self.building[key] = future
+        try:
+            return key, await future
+        finally:
+            del self.building[key]
+
+    # Builds the problem in the worker keeping the fewest problems, and returns the worker's index
+    async def build_problem(self, key, start_date, end_date, call_file):
+        worker = self.worker_loads.index(min(self.worker_loads))
+        await self.run_in_worker(worker, _build_task, key, start_date, end_date, call_file)
+        self.add_problem(key, worker, start_date, end_date)
+        return worker
+
+    async def solve(self, request):
+        start_date, end_date = get_dates(request)
+        key, worker = await self.load_problem(start_date, end_date, get_call_file(request))
+        return await self.run_solve(key, worker, request)
+
+    async def resolve(self, request):
+        key = get_field(request, "key")
+        worker, start_date, end_date = self.get_problem(key)
+        if "call_file" in request or "call_file_path" in request:
+            call_file = get_call_file(request)
+            new_key = get_contents_cache_key(start_date, end_date, call_file.encode())
+            if new_key in self.problems:
+                worker = self.get_problem(new_key)[0]
+            else:
+                # The worker updates a copy, so requests still using the old problem are not affected
+                await self.run_in_worker(worker, _update_task, key, new_key, call_file)
+                self.add_problem(new_key, worker, start_date, end_date)
+            key = new_key
+        return await self.run_solve(key, worker, request)
+
+    async def run_solve(self, key, worker, request):
+        solver = request.get("solver", "repair")
+        if solver not in SOLVERS:
+            raise RequestError(f"Unknown solver {solver}. Please give one of: {', '.join(SOLVERS)}.")
+        seed = request.get("seed")
+        time_limit = request.get("time_limit")
+        if time_limit is not None and (not isinstance(time_limit, (int, float)) or not time_limit > 0):
+            raise RequestError("The time_limit must be a positive number of seconds")
+
+        start = time.perf_counter()
+        result = await self.run_in_worker(worker, _solve_task, key, SOLVERS[solver], seed, time_limit)
+        result.update({"key": key, "solve_time": time.perf_counter() - start})
+        return result
+
+    # Validating is one pass over the days and the constraints, but the problem is only kept in its worker
+    async def validate(self, request):
+        key = get_field(request, "key")
+        worker = self.get_problem(key)[0]
+        return await self.run_in_worker(worker, _validate_task, key, get_field(request, "days"))
+
+    def status(self):
+        return {"problems": list(self.problems), "building": len(self.building), "active_requests": self.num_active,
+                "worker_problems": self.worker_loads}
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/status":
+            return self.status()
+
+        handlers = {"/solve": self.solve, "/resolve": self.resolve, "/validate": self.validate}
+        if path not in handlers:
+            raise RequestError(f"Unknown path {path}", 404)
+        if method != "POST":
+            raise RequestError(f"{path} only takes POST requests", 405)
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError as error:
+            raise RequestError(f"The request body is not valid JSON: {error}")
+        if not isinstance(request, dict):
+            raise RequestError("The request body must be a JSON object")
+        return await handlers[path](request)
+
+    # Answers one HTTP request on the connection, then closes it
+    async def handle_connection(self, reader, writer):
+        self.num_active += 1
+        try:
+            try:
+                method, path, body = await read_request(reader)
+                status, response = 200, await self.route(method, path, body)
+            except RequestError as error:
+                status, response = error.status, {"error": str(error)}
+            # Such as a call file that cannot be used
+            except ValueError as error:
+                status, response = 400, {"error": str(error)}
+            except Exception as error:
+                status, response = 500, {"error": f"{type(error).__name__}: {error}"}
+
+            payload = json.dumps(response).encode()
+            writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.num_active -= 1
+            writer.close()
+
+    async def serve(self, host, port, unix_path=None):
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_connection, unix_path)
+            print(f"Listening on {unix_path}", file=sys.stderr)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            print(f"Listening on http://{host}:{port}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for worker in self.workers:
+                worker.shutdown(cancel_futures=True)
+
+
+# Reads an HTTP request and returns its method, path and body
+async def read_request(reader):
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) != 3:
+        raise RequestError("Invalid HTTP request line")
+    method, path, _ = request_line
+
+    content_length = 0
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            try:
+                content_length = int(value)
+            except ValueError:
+                raise RequestError("Invalid Content-Length")
+
+    if content_length > MAX_BODY_BYTES:
+        raise RequestError(f"The request body is over {MAX_BODY_BYTES} bytes", 413)
+    try:
+        body = await reader.readexactly(content_length)
+    except asyncio.IncompleteReadError:
+        raise RequestError("The request body is shorter than its Content-Length")
+    return method, path.split("?")[0], body
+
+
+def get_field(request, name):
+    if name not in request:
+        raise RequestError(f"The request is missing {name}")
+    return request[name]
+
+
+def get_dates(request):
+    try:
+        start_date, end_date = parse_date(get_field(request, "start_date")), parse_date(get_field(request, "end_date"))
+    except (ValueError, AttributeError):
+        raise RequestError("Invalid date format. Please give the dates in mm/dd/yyyy format.")
+    if end_date < start_date:
+        raise RequestError("The end date is before the start date")
+    return start_date, end_date
+
+
+# Returns the text of the request's call file, either given directly or read from call_file_path
+def get_call_file(request):
+    if "call_file" in request:
+        return request["call_file"]
+    try:
+        with open(get_field(request, "call_file_path")) as f:
+            return f.read()
+    except OSError:
+        raise RequestError(f"Cannot find or open the call file {request['call_file_path']}")
+
+
+def get_first_date(problem, var):
+    return problem.calendar.get_dates(var)[0].isoformat()
+
+
+# Returns the days (date, kind and doctor) and each doctor's totals for the schedule
+def get_schedule_summary(problem, schedule):
+    days = []
+    for var in range(len(schedule)):
+        kind = KIND_NAMES[problem.variable_kinds[var]]
+        for date in problem.calendar.get_dates(var):
+            days.append({"date": date.isoformat(), "kind": kind, "doctor": schedule[var]})
+    weekdays, weekends, holidays = problem.get_doc_days_assigned(schedule)
+    totals = {doctor: {"weekday": weekdays[doctor], "weekend": weekends[doctor], "holiday": holidays[doctor]}
+              for doctor in sorted(problem.doctors)}
+    return {"days": days, "totals": totals, "unfairness": problem.get_unfairness(schedule)}
+
+
+# Turns a list of {"date", "doctor"} days into an assignment of the problem
+# Raises a RequestError if a day is outside the schedule or has an unknown doctor, a day is missing, or the days of one
+#   weekend or holiday have different doctors
+def get_assignment(problem, days):
+    assignment = [None for _ in range(len(problem.variables))]
+    for day in days:
+        try:
+            date = datetime.date.fromisoformat(day["date"])
+            doctor = day["doctor"]
+        except (KeyError, TypeError, ValueError):
+            raise RequestError("Each day needs a date (yyyy-mm-dd) and a doctor")
+        var = problem.calendar.get_variable_at(date.toordinal())
+        if var is None:
+            raise RequestError(f"{date} is not in the schedule")
+        if doctor not in problem.doctors:
+            raise RequestError(f"{doctor} is not a doctor in the call file")
+        if assignment[var] is not None and assignment[var] != doctor:
+            raise RequestError(f"The days of the weekend or holiday {get_first_date(problem, var)} need the same "
+                               f"doctor")
+        assignment[var] = doctor
+
+    missing = [get_first_date(problem, var) for var in range(len(assignment)) if assignment[var] is None]
+    if missing:
+        raise RequestError(f"No doctor is given for {len(missing)} day(s), starting with {missing[0]}")
+    return assignment
+
+
+# The functions below run in the worker processes
+
+# Key --> built CallSchedulingProblem, for the problems this worker keeps
+_problems = dict()
+
+
+# Writes the call file text to a temporary file, as CallSchedulingProblem reads its call file from a path, and passes
+#   its path to the function
+def _with_call_file(call_file, function):
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write(call_file)
+    try:
+        return function(f.name)
+    finally:
+        os.remove(f.name)
+
+
+def _build_task(key, start_date, end_date, call_file):
+    _problems[key] = _with_call_file(call_file, lambda path: CallSchedulingProblem(start_date, end_date, path))
+
+
+def _update_task(key, new_key, call_file):
+    problem = copy.deepcopy(_problems[key])
+    _with_call_file(call_file, problem.update_from_call_file)
+    _problems[new_key] = problem
+
+
+def _drop_task(key):
+    _problems.pop(key, None)
+
+
+# Returns whether the problem was solved, the schedule's summary (see get_schedule_summary), and its score if there is
+#   a time limit
+def _solve_task(key, solve_options, seed, time_limit):
+    problem = _problems[key]
+    # Workers are reused, so each solve is seeded (from the system if no seed is given)
+    random.seed(seed)
+    if time_limit is not None:
+        schedule, score = problem.solve_with_time_limit(time_limit, **solve_options)
+    else:
+        schedule, score = problem.solve_for_call_schedule(**solve_options), None
+
+    result = {"solved": schedule is not None}
+    if time_limit is not None:
+        result["score"] = score
+    if schedule:
+        result.update(get_schedule_summary(problem, schedule))
+    return result
+
+
+# Returns the schedule's conflicts, the days with unavailable doctors, and its unfairness
+# Pinned holidays and defined weekdays can be swapped by hand, so a doctor only has to be available on the day, not in
+#   the day's domain. A defined weekday's own doctor is never unavailable, as the defined schedule comes first.
+def _validate_task(key, days):
+    problem = _problems[key]
+    try:
+        schedule = get_assignment(problem, days)
+    # RequestErrors are raised again as ValueErrors, which the server also answers with a 400
+    except RequestError as error:
+        raise ValueError(str(error))
+
+    conflicts = []
+    for var_1, var_2 in problem.get_conflicts(schedule):
+        conflicts.append({"dates": [get_first_date(problem, var_1), get_first_date(problem, var_2)],
+                          "doctors": [schedule[var_1], schedule[var_2]]})
+    unavailable = []
+    for var in range(len(schedule)):
+        if not problem.calendar.is_available(schedule[var], var) and schedule[var] not in problem.domains[var]:
+            unavailable.append({"date": get_first_date(problem, var), "doctor": schedule[var]})
+
+    return {"valid": not conflicts and not unavailable, "conflicts": conflicts, "unavailable": unavailable,
+            "unfairness": problem.get_unfairness(schedule)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve call schedules over local HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of a port")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--max-problems", type=int, default=32, help="number of built problems kept in memory")
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.max_problems < 1:
+        print("--workers and --max-problems must be positive whole numbers", file=sys.stderr)
+        exit(6)
+
+    try:
+        asyncio.run(ScheduleServer(args.workers, args.max_problems).serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,196 @@
+import csv
+import datetime
+import json
+import re
+
+from CallCalendar import WEEKDAY, WEEKEND, HOLIDAY
+
+# The output formats for a call schedule. Each writer is given the variables one at a time (with their dates and the
+#   doctor assigned), and writes its rows out as it goes instead of building the whole file in memory first. This way
+#   every format can be written in the same single pass over the assignment (see write_schedule).
+# Every writer takes (problem, assignment, file_path), writes to file_path plus its own extension, and has
+#   write_variable(var, dates, doctor) and finish() methods
+
+# Bytes buffered by each output file before it is written out
+OUTPUT_BUFFER_SIZE = 1 << 16
+
+KIND_NAMES = {WEEKDAY: "weekday", WEEKEND: "weekend", HOLIDAY: "holiday"}
+
+
+# The schedule week by week, one line per week with a line of dashes under it
+class TextWriter:
+    def __init__(self, problem, assignment, file_path):
+        self.calendar = problem.calendar
+        self.file = open(file_path + ".txt", "w", buffering=OUTPUT_BUFFER_SIZE)
+        self.name_length = max((len(doctor) for doctor in problem.doctors), default=0)
+        self.week = None
+        # The cells of the current week's line
+        self.cells = []
+
+    def write_variable(self, var, dates, doctor):
+        for date in dates:
+            week = self.calendar.get_week(date)
+            if self.week is None:
+                self.week = week
+            elif week != self.week:
+                self.week = week
+                line = "".join(self.cells) + "\n"
+                self.file.write(line)
+                self.file.write("-" * len(line) + "\n")
+                self.cells = []
+            self.cells.append(f"| {date} : {doctor.ljust(self.name_length)} |")
+
+    def finish(self):
+        self.file.write("".join(self.cells))
+        self.file.close()
+
+
+# The number of weekdays, weekends and holidays each doctor has, the holidays, and then every date with its doctor
+class CsvWriter:
+    def __init__(self, problem, assignment, file_path):
+        self.file = open(file_path + ".csv", "w", newline="", buffering=OUTPUT_BUFFER_SIZE)
+        self.writer = csv.writer(self.file)
+
+        # The counts and holidays come before the calendar, so they are written up front
+        doc_weekdays, doc_weekends, doc_holidays = problem.get_doc_days_assigned(assignment)
+        for name, doc_days in [("Weekdays", doc_weekdays), ("Weekends", doc_weekends), ("Holidays", doc_holidays)]:
+            self.writer.writerow(["Doctor", f"Number of {name} Assigned"])
+            self.writer.writerows(doc_days.items())
+            self.writer.writerow([])
+
+        self.writer.writerow(["Holiday Date", "Doctor Assigned"])
+        for holiday in problem.holiday_indices:
+            for date in problem.variables[holiday]:
+                self.writer.writerow([str(date), assignment[holiday]])
+            # So that we have a blank line in the csv between holidays
+            self.writer.writerow([])
+        self.writer.writerow([])
+
+        self.writer.writerow(["Date", "Doctor Assigned"])
+
+    def write_variable(self, var, dates, doctor):
+        for date in dates:
+            self.writer.writerow([str(date), doctor])
+
+    def finish(self):
+        self.file.close()
+
+
+# One row per day: the date, the day of the week, whether it is a weekday, weekend or holiday, and the doctor
+class DailyCsvWriter:
+    def __init__(self, problem, assignment, file_path):
+        self.kinds = problem.variable_kinds
+        self.file = open(file_path + "_daily.csv", "w", newline="", buffering=OUTPUT_BUFFER_SIZE)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["date", "day", "kind", "doctor"])
+
+    def write_variable(self, var, dates, doctor):
+        kind = KIND_NAMES[self.kinds[var]]
+        for date in dates:
+            self.writer.writerow([date.isoformat(), date.strftime("%A"), kind, doctor])
+
+    def finish(self):
+        self.file.close()
+
+
+# A JSON object with the start and end dates, a list of every day and its doctor, and each doctor's totals
+# The days are written one at a time, and the totals are counted along the way
+class JsonWriter:
+    def __init__(self, problem, assignment, file_path):
+        self.kinds = problem.variable_kinds
+        self.totals = {doctor: {name: 0 for name in KIND_NAMES.values()} for doctor in sorted(problem.doctors)}
+        self.file = open(file_path + ".json", "w", buffering=OUTPUT_BUFFER_SIZE)
+        self.file.write(f'{{"start_date": "{problem.start_date.isoformat()}", '
+                        f'"end_date": "{problem.end_date.isoformat()}",\n"days": [')
+        self.separator = "\n"
+
+    def write_variable(self, var, dates, doctor):
+        kind = KIND_NAMES[self.kinds[var]]
+        self.totals[doctor][kind] += 1
+        for date in dates:
+            self.file.write(self.separator + json.dumps({"date": date.isoformat(), "kind": kind, "doctor": doctor}))
+            self.separator = ",\n"
+
+    def finish(self):
+        self.file.write(f'\n],\n"totals": {json.dumps(self.totals)}}}\n')
+        self.file.close()
+
+
+# One iCalendar (.ics) file per doctor, named file_path_<doctor>.ics, with an all day event for each of their days
+#   (a weekend or holiday is one event over all of its days). These can be imported into most calendar apps.
+# Doctors whose names only differ in the characters left out of file names (such as "A B" and "A_B"), or in case, get a
+#   number after the name (file_path_A_B_2.ics), so that no two share a file
+class IcsWriter:
+    def __init__(self, problem, assignment, file_path):
+        self.kinds = problem.variable_kinds
+        self.timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.files = dict()
+        self.uid_names = dict()
+        # Lowercase, since some file systems ignore case
+        used_names = set()
+        for doctor in sorted(problem.doctors):
+            # Only letters, numbers, dashes and underscores in file names and event ids
+            base_name = safe_name = re.sub(r"[^A-Za-z0-9_-]", "_", doctor)
+            number = 1
+            while safe_name.lower() in used_names:
+                number += 1
+                safe_name = f"{base_name}_{number}"
+            used_names.add(safe_name.lower())
+            self.uid_names[doctor] = safe_name
+            # iCalendar lines end in CRLF
+            self.files[doctor] = open(f"{file_path}_{safe_name}.ics", "w", newline="\r\n",
+                                      buffering=OUTPUT_BUFFER_SIZE)
+            self.files[doctor].write("BEGIN:VCALENDAR\nVERSION:2.0\nPRODID:-//Call Scheduling//EN\nCALSCALE:GREGORIAN\n"
+                                     f"X-WR-CALNAME:{escape_text(doctor)} on call\n")
+
+    def write_variable(self, var, dates, doctor):
+        first_date, last_date = dates[0], dates[-1]
+        self.files[doctor].write(
+            "BEGIN:VEVENT\n"
+            f"UID:{first_date:%Y%m%d}-{self.uid_names[doctor]}@call-scheduling\n"
+            f"DTSTAMP:{self.timestamp}\n"
+            f"DTSTART;VALUE=DATE:{first_date:%Y%m%d}\n"
+            f"DTEND;VALUE=DATE:{last_date + datetime.timedelta(days=1):%Y%m%d}\n"
+            f"SUMMARY:On call ({KIND_NAMES[self.kinds[var]]})\n"
+            "END:VEVENT\n")
+
+    def finish(self):
+        for f in self.files.values():
+            f.write("END:VCALENDAR\n")
+            f.close()
+
+
+# Escapes the characters that have a meaning in iCalendar text
+def escape_text(text):
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+
+
+# Format name --> writer
+OUTPUT_FORMATS = {
+    "txt": TextWriter,
+    "csv": CsvWriter,
+    "daily_csv": DailyCsvWriter,
+    "json": JsonWriter,
+    "ics": IcsWriter,
+}
+
+DEFAULT_FORMATS = ("txt", "csv")
+
+
+# Writes the assignment of the problem to file_path in each of the formats, in one pass over the assignment
+def write_schedule(problem, assignment, file_path, formats=DEFAULT_FORMATS):
+    unknown = [name for name in formats if name not in OUTPUT_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown output format(s): {', '.join(unknown)}")
+
+    writers = []
+    try:
+        for name in formats:
+            writers.append(OUTPUT_FORMATS[name](problem, assignment, file_path))
+        for var in range(len(assignment)):
+            dates = problem.calendar.get_dates(var)
+            for writer in writers:
+                writer.write_variable(var, dates, assignment[var])
+    finally:
+        for writer in writers:
+            writer.finish()
@@ -0,0 +1,35 @@
+from benchmark import format_result, run_benchmarks, run_case_in_process
+
+# Checks that the benchmark tells cases that finished, timed out and had an error apart
+# Runs with pytest, or on its own with: python test_benchmark.py
+
+case = {"solver": "repair", "years": 1, "doctors": 8, "tightness": "loose", "seed": 0}
+
+
+def test_finished_case():
+    result = run_case_in_process(case, 120)
+    assert result["success"] and "error" not in result
+    assert result["phase_times"]["fairness"] > 0
+
+
+# An error in the worker comes back straight away as an error, rather than after the timeout as timed out
+def test_error_case():
+    result = run_case_in_process(dict(case, solver="unknown"), 120)
+    assert result == {"error": "KeyError: 'unknown'"}
+
+    results = run_benchmarks({"unknown": {"years": [1], "doctors": [8], "tightness": ["loose"]}}, [0], 120, True)
+    assert results[0]["error"] == "KeyError: 'unknown'" and not results[0]["timed_out"]
+    assert format_result(results[0]).endswith("error: KeyError: 'unknown'")
+
+
+def test_timed_out_case():
+    results = run_benchmarks({"repair": {"years": [1], "doctors": [8], "tightness": ["loose"]}}, [0], 0.01, False)
+    assert results[0]["timed_out"] and "error" not in results[0]
+    assert format_result(results[0]).endswith("timed out")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
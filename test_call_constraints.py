@@ -0,0 +1,58 @@
+from CallCalendar import WEEKDAY
+from CallSchedulingProblem import CallSchedulingProblem
+import datetime
+import random
+
+# Checks the constraints the call scheduling problem is built with
+# Runs with pytest, or on its own with: python test_call_constraints.py
+
+start_date = datetime.date(2024, 1, 15)
+end_date = datetime.date(2025, 1, 15)
+
+
+def build_problem(call_file):
+    random.seed(0)
+    return CallSchedulingProblem(start_date, end_date, call_file)
+
+
+# Every arc has its reverse, and no arc points outside the variables
+def test_arcs_are_symmetric():
+    for call_file in ["examples/definedWeekdays", "examples/weekdayAvailability"]:
+        problem = build_problem(call_file)
+        for (var_1, var_2) in problem.constraints:
+            assert 0 <= var_1 < len(problem.variables) and 0 <= var_2 < len(problem.variables)
+            assert (var_2, var_1) in problem.constraints
+
+
+# With a defined weekday schedule, only weekday/weekday pairs are left out: Thursday --> weekend and weekend -->
+#   Monday still have arcs
+def test_defined_weekdays_keep_weekend_arcs():
+    problem = build_problem("examples/definedWeekdays")
+    kinds = problem.variable_kinds
+    assert problem.constraints
+    for (var_1, var_2) in problem.constraints:
+        assert kinds[var_1] != WEEKDAY or kinds[var_2] != WEEKDAY
+
+    for var in range(len(kinds) - 1):
+        if (kinds[var] == WEEKDAY) != (kinds[var + 1] == WEEKDAY):
+            assert (var, var + 1) in problem.constraints
+
+
+# A holiday is not pinned to the doctor pinned to the weekday next to it, which no schedule could satisfy
+def test_defined_weekdays_are_solvable():
+    problem = build_problem("examples/definedWeekdays")
+    for holiday in problem.holiday_indices:
+        for neighbor in [holiday - 1, holiday + 1]:
+            if 0 <= neighbor < len(problem.variables) and problem.variable_kinds[neighbor] == WEEKDAY:
+                assert problem.domains[holiday] != problem.domains[neighbor]
+
+    schedule = problem.solve_for_call_schedule()
+    assert schedule is not None
+    assert not problem.get_conflicts(schedule)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
@@ -0,0 +1,115 @@
+from call_file_parser import CallFileError, parse_call_file, read_unavailable_days_csv
+import datetime
+
+# Checks reading call files and CSV files of unavailable days, and the errors (with their line numbers) for bad ones
+# Runs with pytest, or on its own with: python test_call_file_parser.py
+
+
+def ordinal(month, day, year):
+    return datetime.date(year, month, day).toordinal()
+
+
+# Returns the (line number, message) errors of the call file text, which must have at least one
+def get_errors(text):
+    try:
+        parse_call_file(text.splitlines())
+    except CallFileError as error:
+        return error.errors
+    raise AssertionError("No CallFileError was raised")
+
+
+def test_example_call_file():
+    with open("examples/weekdayAvailability") as f:
+        contents = parse_call_file(f)
+    assert contents.doctors == {"Alice", "Bob", "Charlie", "Derrick", "Emily", "Fred", "Gustav"}
+    assert contents.doc_available_weekdays["Monday"] == ["Alice", "Bob", "Charlie", "Gustav"]
+    assert contents.doc_unavailable_ordinals["Alice"] == {ordinal(12, 25, 2024), ordinal(1, 1, 2024)}
+    assert tuple(datetime.date(2024, 5, day) for day in range(24, 28)) in contents.holidays
+    assert contents.max_weekdays == {"Gustav": 13} and contents.max_weekends == {"Gustav": 6}
+    assert contents.weekday_schedule == []
+
+
+def test_defined_weekdays_and_blank_lines():
+    contents = parse_call_file(["/defined_weekday_assignment\n", "A, B, C, D\n", "\n", "D, C, B, A\n",
+                                "/additional_doctors\n", "E\n"])
+    assert contents.weekday_schedule == [["A", "B", "C", "D"], ["D", "C", "B", "A"]]
+    assert contents.doctors == {"A", "B", "C", "D", "E"}
+
+
+# Every error in the file is reported at once, in line order, with the line it is on
+def test_errors_have_line_numbers():
+    errors = get_errors("\n".join([
+        "Alice; 1/1/2024",                          # 1: not under a command
+        "/doctor_available_weekdays",
+        "Alice; Monday, Friday",                    # 3: not a weekday
+        "Bob; Tuesday",
+        "/doctor_unavailable_days",
+        "Alice; 2/30/2024, 3/1/2024",               # 6: invalid date
+        "Bob 3/1/2024",                             # 7: no semicolon
+        "/holiday_dates",
+        "7/4/2024, 7/6/2024",                       # 9: not consecutive
+        "12/24/2024, 12/25/2024",
+        "12/25/2024",                               # 11: overlaps line 10
+        "/max_weekends",
+        "Bob; two",                                 # 13: not a whole number
+        "Zed; 3",                                   # 14: not on the schedule
+        "/defined_weekday_assignment",              # 15: both weekday commands
+        "A, B, C",                                  # 16: three doctors
+        "/unknown_command",                         # 17: unknown command
+        "anything",                                 # the lines under it are not reported again
+    ]))
+    assert [line_number for line_number, _ in errors] == [1, 3, 6, 7, 9, 11, 13, 14, 15, 16, 17]
+    messages = dict(errors)
+    assert "Friday" in messages[3]
+    assert "2/30/2024" in messages[6] and "3/1/2024" not in messages[6]
+    assert "line 10" in messages[11]
+    assert "Zed" in messages[14]
+
+
+def test_missing_weekday_command():
+    errors = get_errors("/holiday_dates\n7/4/2024\n")
+    assert len(errors) == 1 and errors[0][0] is None
+
+
+def test_error_message_lists_every_line():
+    try:
+        parse_call_file(["/doctor_available_weekdays", "Alice; Someday", "/nope"], source="test.txt")
+    except CallFileError as error:
+        assert str(error).startswith("2 error(s) in test.txt:")
+        assert "line 2: " in str(error) and "line 3: " in str(error)
+        # Callers that only catch ValueError still get call file errors
+        assert isinstance(error, ValueError)
+    else:
+        raise AssertionError("No CallFileError was raised")
+
+
+def test_unavailable_days_csv():
+    days = read_unavailable_days_csv(["doctor,start_date,end_date,reason", "Alice,1/1/2024,2024-01-03,vacation", "",
+                                      "Bob,3/1/2024,3/1/2024"], doctors={"Alice", "Bob"})
+    assert days == {"Alice": {ordinal(1, 1, 2024), ordinal(1, 2, 2024), ordinal(1, 3, 2024)},
+                    "Bob": {ordinal(3, 1, 2024)}}
+    assert read_unavailable_days_csv(["Date,Doctor", "2/2/2024,Alice"]) == {"Alice": {ordinal(2, 2, 2024)}}
+
+
+def test_unavailable_days_csv_errors():
+    try:
+        read_unavailable_days_csv(["doctor,start_date,end_date", "Alice,1/3/2024,1/1/2024", "Zed,1/1/2024,1/1/2024",
+                                   "Alice,13/1/2024,1/1/2024", "Alice"], doctors={"Alice"})
+    except CallFileError as error:
+        assert [line_number for line_number, _ in error.errors] == [2, 3, 4, 5]
+    else:
+        raise AssertionError("No CallFileError was raised")
+
+    try:
+        read_unavailable_days_csv(["name,day"])
+    except CallFileError as error:
+        assert error.errors[0][0] == 1
+    else:
+        raise AssertionError("No CallFileError was raised")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
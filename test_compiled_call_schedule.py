@@ -0,0 +1,87 @@
+from CallSchedulingProblem import CallSchedulingProblem
+from ConflictTracker import ConflictTracker
+import datetime
+import random
+
+# Checks that the compiled (NumPy) encoding of a call schedule counts the same conflicts as the problem itself, with
+#   the weekend and holiday spacing rule included
+# Runs with pytest, or on its own with: python test_compiled_call_schedule.py
+
+start_date = datetime.date(2024, 1, 15)
+end_date = datetime.date(2027, 1, 15)
+
+
+def build_problem(call_file):
+    random.seed(0)
+    return CallSchedulingProblem(start_date, end_date, call_file)
+
+
+def get_random_assignment(problem):
+    return [random.choice(domain) for domain in problem.domains]
+
+
+def test_same_spacing_pairs():
+    problem = build_problem("examples/weekdayAvailability")
+    compiled = problem.compile()
+    pairs = set(zip(compiled.spacing_sources.tolist(), compiled.spacing_targets.tolist()))
+    expected = set(problem.get_spacing_pairs())
+    assert pairs == expected | {(var_2, var_1) for var_1, var_2 in expected}
+
+
+# count_conflicts gives the tracker's count for every variable, and each violated pair is counted at both ends
+def test_counts_match_tracker():
+    for call_file in ["examples/definedWeekdays", "examples/weekdayAvailability"]:
+        problem = build_problem(call_file)
+        compiled = problem.compile()
+        assignment = get_random_assignment(problem)
+        problem.reset_assignment_state(assignment)
+        tracker = ConflictTracker(problem, assignment)
+
+        for i in range(2000):
+            var = random.randrange(len(assignment))
+            tracker.reassign(var, random.choice(problem.domains[var]))
+            if i % 100 == 0:
+                counts = compiled.count_conflicts(compiled.encode(assignment)).tolist()
+                assert counts == tracker.conflict_counts
+                assert sum(counts) // 2 == tracker.total_conflicts == len(problem.get_conflicts(assignment))
+
+
+# A search that gives up reports the assignment it ended on, with its conflicts counted one move at a time matching a
+#   full recount
+def test_gave_up_conflicts_match():
+    problem = build_problem("examples/weekdayAvailability")
+    compiled = problem.compile()
+    reports = []
+    for _ in range(20):
+        result, _ = compiled.local_search(20, gave_up=lambda assignment, conflicts: reports.append((assignment,
+                                                                                                  conflicts)))
+        if result:
+            assert problem.is_valid_assignment(result)
+    assert reports
+    for assignment, num_conflicts in reports:
+        assert num_conflicts == len(problem.get_conflicts(assignment)) > 0
+
+
+# Only the empty values of a given assignment are filled in and changed
+def test_partial_assignment():
+    problem = build_problem("examples/weekdayAvailability")
+    schedule = problem.solve_for_call_schedule()
+    assignment = [None if var % 7 == 0 else doctor for var, doctor in enumerate(schedule)]
+    result, _ = problem.compile().local_search(1000, assignment=list(assignment))
+    assert problem.is_valid_assignment(result)
+    assert all(doctor is None or result[var] == doctor for var, doctor in enumerate(assignment))
+
+
+def test_out_of_time():
+    problem = build_problem("examples/weekdayAvailability")
+    reports = []
+    result, iters = problem.compile().local_search(1000, out_of_time=lambda: True,
+                                                   gave_up=lambda assignment, conflicts: reports.append(conflicts))
+    assert result is None and iters == 0 and len(reports) == 1
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
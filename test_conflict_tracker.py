@@ -0,0 +1,75 @@
+from ConflictTracker import ConflictTracker
+from ConstraintSatisfactionProblem import ConstraintSatisfactionProblem
+from csp_constraints import NOT_EQUAL, TableConstraint
+import random
+
+# Checks that the ConflictTracker's counts, kept up to date one move at a time, match counting every arc again
+# Runs with pytest, or on its own with: python test_conflict_tracker.py
+
+colors = ["red", "green", "blue"]
+
+
+# A random graph coloring problem, with a few arcs that only allow some pairs of colors
+def build_csp(rng, num_variables=40, num_edges=80):
+    constraints = dict()
+    for _ in range(num_edges):
+        var_1, var_2 = rng.sample(range(num_variables), 2)
+        if rng.random() < 0.2:
+            allowed = {(color_1, color_2) for color_1 in colors for color_2 in colors if rng.random() < 0.6}
+            constraints[(var_1, var_2)] = TableConstraint(allowed)
+            constraints[(var_2, var_1)] = TableConstraint((color_2, color_1) for color_1, color_2 in allowed)
+        else:
+            constraints[(var_1, var_2)] = constraints[(var_2, var_1)] = NOT_EQUAL
+    return ConstraintSatisfactionProblem(list(range(num_variables)), [list(colors) for _ in range(num_variables)],
+                                         constraints)
+
+
+# The conflict count of each variable, and the number of violated pairs, counted from scratch
+def count_conflicts(csp, assignment):
+    counts = [0 for _ in range(len(assignment))]
+    total = 0
+    for (var_1, var_2), constraint in csp.constraints.items():
+        if not constraint.is_satisfied(assignment[var_1], assignment[var_2]):
+            counts[var_1] += 1
+            # Every arc is in both directions, so each pair is counted once
+            if var_1 < var_2:
+                total += 1
+    return counts, total
+
+
+def test_counts_match_recount():
+    rng = random.Random(0)
+    for _ in range(5):
+        csp = build_csp(rng)
+        assignment = [rng.choice(colors) for _ in range(len(csp.variables))]
+        tracker = ConflictTracker(csp, assignment)
+        for _ in range(500):
+            var = rng.randrange(len(assignment))
+            value = rng.choice(colors)
+            assert tracker.count_value_conflicts(var, value) == sum(
+                not constraint.is_satisfied(value, assignment[other])
+                for (first, other), constraint in csp.constraints.items() if first == var)
+            tracker.reassign(var, value)
+
+            counts, total = count_conflicts(csp, assignment)
+            assert tracker.conflict_counts == counts
+            assert tracker.total_conflicts == total
+            assert set(tracker.conflicted_variables) == {var for var in range(len(counts)) if counts[var]}
+
+
+# Variables the search may not change are never in the conflicted set
+def test_unchangeable_variables():
+    rng = random.Random(1)
+    csp = build_csp(rng)
+    assignment = ["red" for _ in range(len(csp.variables))]
+    tracker = ConflictTracker(csp, assignment, can_change=lambda var: var % 2 == 0)
+    assert tracker.conflicted_variables
+    assert all(var % 2 == 0 for var in tracker.conflicted_variables)
+    assert tracker.total_conflicts == count_conflicts(csp, assignment)[1]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
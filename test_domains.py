@@ -0,0 +1,101 @@
+from BitsetDomains import BitsetDomains
+from csp_constraints import NOT_EQUAL, TableConstraint
+from TrailDomains import TrailDomains
+import random
+
+# Checks the backtracking solver's domains: values removed since a mark all come back with undo_to, however deep
+# Runs with pytest, or on its own with: python test_domains.py
+
+doctors = ["Alice", "Bob", "Charlie", "Derrick", "Emily", "Fred", "Gustav"]
+
+
+def get_random_domains(rng, num_variables=30):
+    return [rng.sample(doctors, rng.randint(1, len(doctors))) for _ in range(num_variables)]
+
+
+# Removes values at random, going deeper (with a mark) and back up (with undo_to) like a search does, and checks the
+#   domains against plain sets that are copied at every mark
+def check_undo(domains_class, seed):
+    rng = random.Random(seed)
+    initial = get_random_domains(rng)
+    domains = domains_class(initial)
+    expected = [set(domain) for domain in initial]
+    # (marker, copy of the expected sets) for each level of the search
+    levels = []
+
+    for _ in range(2000):
+        action = rng.random()
+        if action < 0.2:
+            levels.append((domains.mark(), [set(domain) for domain in expected]))
+        elif action < 0.35 and levels:
+            marker, expected = levels.pop()
+            domains.undo_to(marker)
+        else:
+            var, value = rng.randrange(len(initial)), rng.choice(doctors)
+            domains.remove(var, value)
+            expected[var].discard(value)
+
+        for var in range(len(initial)):
+            assert set(domains[var]) == expected[var]
+            assert domains.size(var) == len(expected[var])
+        assert all(domains.contains(var, value) == (value in expected[var])
+                   for var in range(len(initial)) for value in doctors)
+
+    domains.undo_to(0)
+    assert [set(domains[var]) for var in range(len(initial))] == [set(domain) for domain in initial]
+
+
+def test_trail_domains_undo():
+    for seed in range(3):
+        check_undo(TrailDomains, seed)
+
+
+# Removing a value that is already gone (or was never there) changes nothing, and leaves nothing to undo
+def test_trail_domains_remove_missing():
+    domains = TrailDomains([["Alice", "Bob"]])
+    marker = domains.mark()
+    domains.remove(0, "Alice")
+    domains.remove(0, "Alice")
+    domains.remove(0, "Zed")
+    assert domains.mark() == marker + 1
+    domains.undo_to(marker)
+    assert sorted(domains[0]) == ["Alice", "Bob"]
+
+
+def test_bitset_domains_undo():
+    for seed in range(3):
+        check_undo(BitsetDomains, seed)
+
+
+# remove_mask takes out several values in one change, which undo_to puts back in one step
+def test_bitset_domains_remove_mask():
+    domains = BitsetDomains([doctors, ["Bob", "Emily"]], doctors)
+    marker = domains.mark()
+    domains.remove_mask(0, domains.to_mask(["Alice", "Charlie"]))
+    domains.remove_mask(1, domains.to_mask(["Alice"]))
+    assert domains[0] == ["Bob", "Derrick", "Emily", "Fred", "Gustav"]
+    assert domains[1] == ["Bob", "Emily"]
+    assert domains.mark() == marker + 1
+
+    domains.remove_mask(0, domains.full_mask)
+    assert domains.size(0) == 0
+    domains.undo_to(marker + 1)
+    assert domains.size(0) == 5
+    domains.undo_to(marker)
+    assert domains[0] == doctors
+
+
+# A constraint's supports are the values it allows next to the value, as a bitmask
+def test_bitset_supports():
+    domains = BitsetDomains([doctors], doctors)
+    assert domains.from_mask(domains.supports(NOT_EQUAL, "Bob")) == [doctor for doctor in doctors if doctor != "Bob"]
+    table = TableConstraint([("Alice", "Bob"), ("Alice", "Fred"), ("Bob", "Alice")])
+    assert domains.from_mask(domains.supports(table, "Alice")) == ["Bob", "Fred"]
+    assert domains.supports(table, "Gustav") == 0
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
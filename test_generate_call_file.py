@@ -0,0 +1,45 @@
+from CallSchedulingProblem import CallSchedulingProblem
+from generate_call_file import add_years, write_call_file
+import datetime
+import os
+import random
+import tempfile
+
+# Checks that generated call files can be read and solved
+# Runs with pytest, or on its own with: python test_generate_call_file.py
+
+
+# Writes the call file to a temporary directory, and returns the problem built from it
+def build_problem(start_date, years, **parameters):
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        call_file = os.path.join(directory, "call_file.txt")
+        write_call_file(call_file, start_date=start_date, years=years, seed=0, **parameters)
+        return CallSchedulingProblem(start_date, add_years(start_date, years), call_file)
+
+
+def test_add_years():
+    assert add_years(datetime.date(2024, 1, 15), 2) == datetime.date(2026, 1, 15)
+    assert add_years(datetime.date(2024, 2, 29), 1) == datetime.date(2025, 2, 28)
+    assert add_years(datetime.date(2024, 2, 29), 4) == datetime.date(2028, 2, 29)
+
+
+def test_leap_day_start():
+    problem = build_problem(datetime.date(2024, 2, 29), 1, num_doctors=8)
+    assert problem.solve_for_call_schedule() is not None
+
+
+# Every doctor is in the defined weekday schedule the same number of times, not just the first sixteen
+def test_defined_schedule_uses_every_doctor():
+    for num_doctors in [6, 10, 20]:
+        problem = build_problem(datetime.date(2024, 1, 15), 1, num_doctors=num_doctors, defined_schedule=True)
+        counts = [sum(week.count(doctor) for week in problem.weekday_schedule) for doctor in sorted(problem.doctors)]
+        assert len(counts) == num_doctors and len(set(counts)) == 1
+    assert problem.solve_for_call_schedule() is not None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
@@ -0,0 +1,88 @@
+from CallSchedulingProblem import CallSchedulingProblem
+import datetime
+import os
+import random
+import tempfile
+
+# Checks that the incremental updates (such as add_unavailable_days and update_from_call_file) leave the problem the
+#   same as building it again from a call file with the change in it
+# Runs with pytest, or on its own with: python test_incremental_updates.py
+
+start_date = datetime.date(2024, 1, 15)
+end_date = datetime.date(2025, 1, 15)
+
+with open("examples/weekdayAvailability") as f:
+    example_call_file = f.read()
+
+
+def build_problem(call_file_text, directory):
+    random.seed(0)
+    call_file = os.path.join(directory, f"call_file_{random.randrange(2 ** 32)}.txt")
+    with open(call_file, "w") as f:
+        f.write(call_file_text)
+    return CallSchedulingProblem(start_date, end_date, call_file)
+
+
+# Pinned holidays can go to any available doctor, so for them only the availability is compared
+def assert_same_problem(updated, rebuilt):
+    assert updated.doctors == rebuilt.doctors
+    assert updated.doc_unavailable_ordinals == rebuilt.doc_unavailable_ordinals
+    assert updated.calendar.unavailable_doctors == rebuilt.calendar.unavailable_doctors
+    assert updated.constraints == rebuilt.constraints
+    holidays = set(updated.holiday_indices)
+    for var in range(len(updated.variables)):
+        if var in holidays:
+            assert len(updated.domains[var]) == 1
+            assert updated.calendar.is_available(updated.domains[var][0], var)
+        else:
+            assert sorted(updated.domains[var]) == sorted(rebuilt.domains[var])
+    assert updated.solve_for_call_schedule() is not None
+
+
+def test_add_and_remove_unavailable_days():
+    with tempfile.TemporaryDirectory() as directory:
+        problem = build_problem(example_call_file, directory)
+        vacation = [datetime.date(2024, 7, day) for day in range(1, 15)]
+        problem.add_unavailable_days("Emily", vacation)
+        rebuilt = build_problem(example_call_file.replace("Emily; 3/15/2024", "Emily; 3/15/2024, " + ", ".join(
+            f"{date.month}/{date.day}/{date.year}" for date in vacation)), directory)
+        assert_same_problem(problem, rebuilt)
+
+        problem.remove_unavailable_days("Emily", vacation)
+        assert_same_problem(problem, build_problem(example_call_file, directory))
+
+
+def test_add_doctor():
+    with tempfile.TemporaryDirectory() as directory:
+        problem = build_problem(example_call_file, directory)
+        problem.add_doctor("Hana", ["Monday", "Thursday"], [datetime.date(2024, 8, 1)])
+        rebuilt = build_problem(example_call_file.replace(
+            "/doctor_unavailable_days\n", "Hana; Monday, Thursday\n/doctor_unavailable_days\nHana; 8/1/2024\n"),
+            directory)
+        assert_same_problem(problem, rebuilt)
+
+
+def test_update_from_call_file():
+    with tempfile.TemporaryDirectory() as directory:
+        problem = build_problem(example_call_file, directory)
+        changed = example_call_file.replace("Bob; 1/15/2024", "Bob; 1/15/2024, 4/5/2024, 4/6/2024, 4/7/2024") \
+            .replace("/doctor_unavailable_days\n", "Hana; Monday, Thursday\n/doctor_unavailable_days\n")
+        changed_file = os.path.join(directory, "changed.txt")
+        with open(changed_file, "w") as f:
+            f.write(changed)
+        assert problem.update_from_call_file(changed_file)
+        assert_same_problem(problem, build_problem(changed, directory))
+
+        # A new holiday changes the variables, so the problem is rebuilt
+        with_holiday = changed.replace("7/4/2024\n", "7/4/2024\n10/14/2024\n")
+        with open(changed_file, "w") as f:
+            f.write(with_holiday)
+        assert not problem.update_from_call_file(changed_file)
+        assert_same_problem(problem, build_problem(with_holiday, directory))
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
@@ -0,0 +1,82 @@
+from CallSchedulingProblem import CallSchedulingProblem
+from IndexedSet import IndexedSet
+import datetime
+import random
+
+# Checks the min-conflicts local search, which keeps the conflicts of each variable up to date one move at a time, and
+#   the IndexedSet it picks the conflicted variables from
+# Runs with pytest, or on its own with: python test_local_search.py
+
+start_date = datetime.date(2024, 1, 15)
+end_date = datetime.date(2025, 1, 15)
+
+
+def build_problem():
+    random.seed(0)
+    return CallSchedulingProblem(start_date, end_date, "examples/weekdayAvailability")
+
+
+# Runs the local search until it finds a valid assignment, filling in the empty values of the assignment if one is given
+def find_assignment(problem, assignment=None):
+    for _ in range(100):
+        result = problem.local_search(1000, assignment=None if assignment is None else list(assignment))[0]
+        if result:
+            return result
+    return None
+
+
+# Adds and discards elements at random, checking the set against a plain set
+def test_indexed_set():
+    random.seed(1)
+    indexed_set, expected = IndexedSet(), set()
+    for _ in range(5000):
+        element = random.randrange(50)
+        if random.random() < 0.5:
+            indexed_set.add(element)
+            expected.add(element)
+        else:
+            indexed_set.discard(element)
+            expected.discard(element)
+
+        assert set(indexed_set) == expected and len(indexed_set) == len(expected)
+        assert all((element in indexed_set) == (element in expected) for element in range(50))
+        if expected:
+            assert indexed_set.random_choice() in expected
+
+
+def test_finds_valid_assignment():
+    problem = build_problem()
+    result = find_assignment(problem)
+    assert problem.is_valid_assignment(result)
+    assert not problem.get_conflicted_variables(result)
+
+
+# Only the empty values of a given assignment are filled in and changed
+def test_only_empty_values_change():
+    problem = build_problem()
+    schedule = find_assignment(problem)
+    assignment = [None if var % 5 == 0 else doctor for var, doctor in enumerate(schedule)]
+    result = find_assignment(problem, assignment)
+    assert problem.is_valid_assignment(result)
+    assert all(doctor is None or result[var] == doctor for var, doctor in enumerate(assignment))
+
+
+# A conflict between two values that may not be changed can never be fixed, so the search gives up straight away
+def test_unfixable_conflict():
+    problem = build_problem()
+    schedule = find_assignment(problem)
+    for var_1, var_2 in problem.constraints:
+        assignment = [None for _ in range(len(schedule))]
+        assignment[var_1] = assignment[var_2] = schedule[var_1]
+        filled = list(schedule)
+        filled[var_2] = schedule[var_1]
+        if var_1 in problem.get_conflicted_variables(filled):
+            break
+    assert problem.local_search(1000, assignment=assignment) == (None, 0)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
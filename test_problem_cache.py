@@ -0,0 +1,91 @@
+import problem_cache
+from problem_cache import get_cache_key, load_problem
+from SolverStats import SolverStats
+import datetime
+import os
+import random
+import shutil
+import tempfile
+
+# Checks that problems saved to the cache load back the same, and that a changed call file, changed dates, a new
+#   MODEL_VERSION or a damaged file never give back a stale problem
+# Runs with pytest, or on its own with: python test_problem_cache.py
+
+start_date = datetime.date(2024, 1, 15)
+end_date = datetime.date(2025, 1, 15)
+
+
+def assert_same_problem(loaded, built):
+    assert loaded.doctors == built.doctors
+    assert loaded.variables == built.variables
+    # The holidays are pinned when the problem is built, so a loaded problem has the same ones
+    assert loaded.domains == built.domains
+    assert loaded.constraints == built.constraints
+    assert loaded.holiday_doctors == built.holiday_doctors
+
+
+def test_round_trip():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        random.seed(0)
+        built = load_problem(start_date, end_date, "examples/definedWeekdays", cache_dir)
+        assert os.listdir(cache_dir) == [get_cache_key(start_date, end_date, "examples/definedWeekdays") + ".pickle"]
+
+        random.seed(1)
+        stats = SolverStats()
+        loaded = load_problem(start_date, end_date, "examples/definedWeekdays", cache_dir, stats=stats)
+        assert loaded is not built
+        assert "cache_load" in stats.to_dict()["phase_times"]
+        assert loaded.stats is stats and loaded.compiled is None
+        assert_same_problem(loaded, built)
+        assert loaded.solve_for_call_schedule() is not None
+
+
+def test_key_changes():
+    key = get_cache_key(start_date, end_date, "examples/definedWeekdays")
+    assert get_cache_key(start_date, end_date, "examples/definedWeekdays") == key
+    assert get_cache_key(start_date, datetime.date(2025, 1, 16), "examples/definedWeekdays") != key
+    assert get_cache_key(start_date, end_date, "examples/weekdayAvailability") != key
+
+    with tempfile.TemporaryDirectory() as directory:
+        call_file = os.path.join(directory, "call_file.txt")
+        shutil.copy("examples/definedWeekdays", call_file)
+        assert get_cache_key(start_date, end_date, call_file) == key
+        with open(call_file, "a") as f:
+            f.write("\n/additional_doctors\nZed\n")
+        assert get_cache_key(start_date, end_date, call_file) != key
+
+
+# Bumping MODEL_VERSION gives every call file a new key, so problems pickled by older code are built again
+def test_model_version_invalidates():
+    old_version = problem_cache.MODEL_VERSION
+    with tempfile.TemporaryDirectory() as cache_dir:
+        try:
+            load_problem(start_date, end_date, "examples/definedWeekdays", cache_dir)
+            problem_cache.MODEL_VERSION = old_version + 1
+            stats = SolverStats()
+            load_problem(start_date, end_date, "examples/definedWeekdays", cache_dir, stats=stats)
+            assert "cache_load" not in stats.to_dict()["phase_times"]
+            assert len(os.listdir(cache_dir)) == 2
+        finally:
+            problem_cache.MODEL_VERSION = old_version
+
+
+def test_damaged_file_is_rebuilt():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        key = get_cache_key(start_date, end_date, "examples/definedWeekdays")
+        cache_path = os.path.join(cache_dir, key + ".pickle")
+        with open(cache_path, "wb") as f:
+            f.write(b"not a pickle")
+
+        random.seed(0)
+        problem = load_problem(start_date, end_date, "examples/definedWeekdays", cache_dir)
+        assert problem.solve_for_call_schedule() is not None
+        # The rebuilt problem replaced the damaged file
+        assert_same_problem(load_problem(start_date, end_date, "examples/definedWeekdays", cache_dir), problem)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
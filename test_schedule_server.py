@@ -0,0 +1,52 @@
+from schedule_server import ScheduleServer
+import asyncio
+
+# Checks the schedule server's request handling, with its worker processes but without going over HTTP
+# Runs with pytest, or on its own with: python test_schedule_server.py
+
+with open("examples/definedWeekdays") as f:
+    call_file = f.read()
+request = {"call_file": call_file, "start_date": "01/15/2024", "end_date": "01/15/2025", "seed": 0}
+
+
+def run_with_server(function):
+    async def run():
+        server = ScheduleServer(num_workers=2)
+        try:
+            return await function(server)
+        finally:
+            for worker in server.workers:
+                worker.shutdown(cancel_futures=True)
+    return asyncio.run(run())
+
+
+# Two requests for the same input that arrive together share one build, and both are solved in the worker that built it
+def test_concurrent_identical_requests():
+    async def solve_twice(server):
+        results = await asyncio.gather(server.solve(dict(request)), server.solve(dict(request)))
+        return results, server.status()
+
+    results, status = run_with_server(solve_twice)
+    assert all(result["solved"] for result in results)
+    assert results[0]["key"] == results[1]["key"]
+    assert results[0]["days"] == results[1]["days"]
+    assert status["problems"] == [results[0]["key"]] and status["building"] == 0
+    assert sorted(status["worker_problems"]) == [0, 1]
+
+
+# A schedule the server solved is valid for its problem
+def test_validate_solved_schedule():
+    async def solve_and_validate(server):
+        result = await server.solve(dict(request))
+        days = [{"date": day["date"], "doctor": day["doctor"]} for day in result["days"]]
+        return await server.validate({"key": result["key"], "days": days})
+
+    validation = run_with_server(solve_and_validate)
+    assert validation["valid"], validation
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
@@ -0,0 +1,117 @@
+from CallSchedulingProblem import CallSchedulingProblem
+import csv
+import datetime
+import io
+import os
+import random
+import tempfile
+
+# Checks the output formats (see schedule_writers.py). The .txt and .csv files are compared with what write_out_solution
+#   wrote before the writers, byte for byte.
+# Runs with pytest, or on its own with: python test_schedule_writers.py
+
+start_date = datetime.date(2024, 1, 15)
+end_date = datetime.date(2025, 1, 15)
+
+
+def build_problem(call_file, start=start_date):
+    random.seed(0)
+    return CallSchedulingProblem(start, end_date, call_file)
+
+
+# Writes the schedule in the formats to a temporary directory, and returns the directory and the file path the names
+#   start with
+def write_out(problem, assignment, formats, directory):
+    file_path = os.path.join(directory, "schedule")
+    problem.write_out_solution(assignment, file_path, formats)
+    return file_path
+
+
+# The .txt file, as the old write_out_solution wrote it
+def get_old_text(problem, assignment):
+    text = ""
+    line = ""
+    max_name_length = max(len(doc) for doc in problem.doctors)
+    for var in range(len(assignment)):
+        dates = problem.variables[var] if type(problem.variables[var]) == tuple else [problem.variables[var]]
+        for date in dates:
+            # New week
+            if date.weekday() == 0 and date != problem.start_date:
+                line += "\n"
+                text += line + "-" * len(line) + "\n"
+                line = ""
+            line += "| " + str(date) + " : " + assignment[var] + " " * (max_name_length - len(assignment[var])) + " |"
+    return text + line
+
+
+# The .csv file, as the old write_out_solution wrote it
+def get_old_csv(problem, assignment):
+    rows = []
+    doc_weekdays, doc_weekends, doc_holidays = problem.get_doc_days_assigned(assignment)
+    for name, doc_days in [("Weekdays", doc_weekdays), ("Weekends", doc_weekends), ("Holidays", doc_holidays)]:
+        rows.append(["Doctor", f"Number of {name} Assigned"])
+        rows.extend([doc, doc_days[doc]] for doc in doc_days.keys())
+        rows.append([])
+
+    rows.append(["Holiday Date", "Doctor Assigned"])
+    for holiday in problem.holiday_indices:
+        for date in problem.variables[holiday]:
+            rows.append([str(date), assignment[holiday]])
+        rows.append([])
+    rows.append([])
+
+    rows.append(["Date", "Doctor Assigned"])
+    for var in range(len(assignment)):
+        dates = problem.variables[var] if type(problem.variables[var]) == tuple else [problem.variables[var]]
+        rows.extend([str(date), assignment[var]] for date in dates)
+
+    f = io.StringIO(newline="")
+    csv.writer(f).writerows(rows)
+    return f.getvalue()
+
+
+def test_text_and_csv_match_old_format():
+    for call_file, start in [("examples/definedWeekdays", start_date),
+                             ("examples/weekdayAvailability", datetime.date(2024, 1, 18))]:
+        problem = build_problem(call_file, start)
+        schedule = problem.solve_for_call_schedule()
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = write_out(problem, schedule, ["txt", "csv"], directory)
+            with open(file_path + ".txt", newline="") as f:
+                assert f.read() == get_old_text(problem, schedule)
+            with open(file_path + ".csv", newline="") as f:
+                assert f.read() == get_old_csv(problem, schedule)
+
+
+# Names that become the same file name each get their own file, with their own days in it
+def test_ics_names_are_unique():
+    with open("examples/weekdayAvailability") as f:
+        call_file = f.read().replace("Alice", "A B").replace("Bob", "A_B").replace("Charlie", "a b")
+
+    with tempfile.TemporaryDirectory() as directory:
+        call_file_path = os.path.join(directory, "call_file.txt")
+        with open(call_file_path, "w") as f:
+            f.write(call_file)
+        problem = build_problem(call_file_path)
+        schedule = problem.solve_for_call_schedule()
+        write_out(problem, schedule, ["ics"], directory)
+
+        ics_files = sorted(name for name in os.listdir(directory) if name.endswith(".ics"))
+        assert len(ics_files) == len(problem.doctors)
+        assert len({name.lower() for name in ics_files}) == len(ics_files)
+        for doctor in ["A B", "A_B", "a b"]:
+            events = schedule.count(doctor)
+            matches = []
+            for name in ics_files:
+                with open(os.path.join(directory, name)) as f:
+                    text = f.read()
+                if f"X-WR-CALNAME:{doctor} on call" in text:
+                    matches.append(text)
+            assert len(matches) == 1 and matches[0].count("BEGIN:VEVENT") == events
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
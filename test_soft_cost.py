@@ -0,0 +1,74 @@
+from CallCalendar import WEEKDAY, WEEKEND, HOLIDAY
+from CallSchedulingProblem import CallSchedulingProblem
+import datetime
+import random
+
+# Checks the soft fairness cost that soft_local_search and simulated_annealing work with: the change soft_cost_delta
+#   gives for a move is the change in the whole soft cost, counted from scratch
+# Runs with pytest, or on its own with: python test_soft_cost.py
+
+start_date = datetime.date(2024, 1, 15)
+end_date = datetime.date(2025, 1, 15)
+
+
+def build_problem(call_file):
+    random.seed(0)
+    return CallSchedulingProblem(start_date, end_date, call_file)
+
+
+# The whole soft cost of the assignment in the problem's tallies (see CallSchedulingProblem.soft_cost_delta)
+def get_soft_cost(problem):
+    counts = problem.tallies.counts
+    cost = 0
+    for doctor in problem.doctors:
+        cost += (counts[WEEKEND][doctor] + counts[HOLIDAY][doctor]) ** 2
+        if doctor in problem.max_weekends:
+            cost += problem.max_days_weight * max(0, counts[WEEKEND][doctor] - problem.max_weekends[doctor])
+        if not problem.weekday_schedule:
+            cost += counts[WEEKDAY][doctor] ** 2
+            if doctor in problem.max_weekdays:
+                cost += problem.max_days_weight * max(0, counts[WEEKDAY][doctor] - problem.max_weekdays[doctor])
+    return cost
+
+
+def test_delta_matches_full_cost():
+    for call_file in ["examples/weekdayAvailability", "examples/definedWeekdays"]:
+        problem = build_problem(call_file)
+        assignment = [random.choice(domain) for domain in problem.domains]
+        problem.reset_assignment_state(assignment)
+        cost = get_soft_cost(problem)
+
+        for _ in range(3000):
+            var = random.randrange(len(assignment))
+            old_value, new_value = assignment[var], random.choice(problem.domains[var])
+            delta = problem.soft_cost_delta(var, old_value, new_value)
+            problem.update_assignment_state(var, old_value, new_value)
+            assignment[var] = new_value
+
+            new_cost = get_soft_cost(problem)
+            assert delta == new_cost - cost
+            cost = new_cost
+
+
+# Keeping the doctor a variable already has costs nothing, even for a doctor at their maximum
+def test_same_doctor_costs_nothing():
+    problem = build_problem("examples/weekdayAvailability")
+    assignment = [random.choice(domain) for domain in problem.domains]
+    problem.reset_assignment_state(assignment)
+    for var in range(len(assignment)):
+        assert problem.soft_cost_delta(var, assignment[var], assignment[var]) == 0
+
+    weekends = [var for var in range(len(assignment)) if problem.variable_kinds[var] == WEEKEND and
+                "Gustav" in problem.domains[var]]
+    for var in weekends:
+        problem.update_assignment_state(var, assignment[var], "Gustav")
+        assignment[var] = "Gustav"
+    problem.max_weekends["Gustav"] = problem.tallies.counts[WEEKEND]["Gustav"]
+    assert problem.soft_cost_delta(weekends[0], "Gustav", "Gustav") == 0
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
@@ -0,0 +1,84 @@
+from CallCalendar import WEEKDAY
+from CallSchedulingProblem import CallSchedulingProblem
+from ConflictTracker import ConflictTracker
+import datetime
+import random
+
+# Checks the weekend and holiday spacing rule (see SpacingIndex) against the arcs it replaced: a NOT_EQUAL arc between
+#   every two weekends/holidays within 10 variables of each other
+# Runs with pytest, or on its own with: python test_spacing_index.py
+
+start_date = datetime.date(2024, 1, 15)
+end_date = datetime.date(2027, 1, 15)
+
+
+def build_problem(call_file):
+    random.seed(0)
+    return CallSchedulingProblem(start_date, end_date, call_file)
+
+
+# The (var_1, var_2) pairs, var_1 < var_2, of the old +/- 10 variable window
+def get_old_spacing_pairs(problem):
+    kinds = problem.variable_kinds
+    return {(var_1, var_2) for var_1 in range(len(kinds)) for var_2 in range(var_1 + 1, min(var_1 + 11, len(kinds)))
+            if kinds[var_1] != WEEKDAY and kinds[var_2] != WEEKDAY}
+
+
+def test_same_pairs_as_old_arcs():
+    for call_file in ["examples/definedWeekdays", "examples/weekdayAvailability"]:
+        problem = build_problem(call_file)
+        assert set(problem.get_spacing_pairs()) == get_old_spacing_pairs(problem)
+
+
+# After random moves, the conflicts found through the index are the ones the old arcs would have found
+def test_conflicts_match_old_arcs():
+    problem = build_problem("examples/weekdayAvailability")
+    old_pairs = get_old_spacing_pairs(problem)
+    assignment = [random.choice(domain) for domain in problem.domains]
+    problem.reset_assignment_state(assignment)
+
+    for _ in range(5000):
+        var = random.randrange(len(assignment))
+        new_value = random.choice(problem.domains[var])
+        problem.update_assignment_state(var, assignment[var], new_value)
+        assignment[var] = new_value
+
+        for value in problem.domains[var]:
+            expected = {other for pair in old_pairs if var in pair for other in pair
+                        if other != var and assignment[other] == value}
+            assert set(problem.extra_conflicts(var, value)) == expected
+
+
+# The tracker's counts stay equal to a full recount (arcs and spacing) as variables are reassigned
+def test_tracker_counts_spacing():
+    problem = build_problem("examples/weekdayAvailability")
+    assignment = [random.choice(domain) for domain in problem.domains]
+    problem.reset_assignment_state(assignment)
+    tracker = ConflictTracker(problem, assignment)
+    assert tracker.total_conflicts == len(problem.get_conflicts(assignment))
+
+    for _ in range(5000):
+        var = random.randrange(len(assignment))
+        tracker.reassign(var, random.choice(problem.domains[var]))
+    assert tracker.total_conflicts == len(problem.get_conflicts(assignment))
+
+
+# A schedule that breaks only the spacing rule is not valid, and both of the weekends are conflicted
+def test_spacing_breaks_validity():
+    problem = build_problem("examples/weekdayAvailability")
+    schedule = problem.solve_for_call_schedule()
+    assert problem.is_valid_assignment(schedule)
+    assert problem.get_conflicted_variables(schedule) == []
+
+    weekends = [var for var in range(len(schedule)) if problem.variable_kinds[var] != WEEKDAY]
+    var_1, var_2 = weekends[5], weekends[6]
+    schedule[var_2] = schedule[var_1]
+    assert not problem.is_valid_assignment(schedule)
+    assert {var_1, var_2} <= set(problem.get_conflicted_variables(schedule))
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")
@@ -0,0 +1,104 @@
+from CallSchedulingProblem import CallSchedulingProblem
+from TabuMemory import TabuMemory
+import datetime
+import random
+
+# Checks the tabu search's memory: how long moves stay tabu, the Zobrist hash of the assignment, and finding revisits
+# Runs with pytest, or on its own with: python test_tabu_memory.py
+
+doctors = ["Alice", "Bob", "Charlie", "Derrick"]
+
+
+# The hash of the assignment computed from scratch with the memory's keys
+def get_full_hash(memory, assignment):
+    full_hash = 0
+    for var in range(len(assignment)):
+        full_hash ^= memory.zobrist_keys[(var, assignment[var])]
+    return full_hash
+
+
+def test_tabu_tenure():
+    random.seed(0)
+    memory = TabuMemory(10)
+    memory.record_move(3, "Alice", "Bob", 100)
+    assert memory.is_tabu(3, "Alice", 109)
+    assert not memory.is_tabu(3, "Alice", 100 + 10 + 10 // 2)
+    assert not memory.is_tabu(3, "Bob", 101) and not memory.is_tabu(4, "Alice", 101)
+
+    # Staying on the same value is not a move
+    memory.record_move(5, "Alice", "Alice", 100)
+    assert not memory.is_tabu(5, "Alice", 101)
+
+
+# The hash kept up to date one move at a time is the hash of the whole assignment, so equal assignments hash the same
+def test_hash_matches_assignment():
+    random.seed(1)
+    assignment = [random.choice(doctors) for _ in range(50)]
+    memory = TabuMemory(10, assignment)
+    for i in range(2000):
+        var = random.randrange(len(assignment))
+        new_value = random.choice(doctors)
+        memory.record_move(var, assignment[var], new_value, i)
+        assignment[var] = new_value
+        assert memory.hash == get_full_hash(memory, assignment)
+
+
+def test_revisit():
+    random.seed(2)
+    assignment = ["Alice", "Bob", "Charlie"]
+    memory = TabuMemory(2, assignment)
+    memory.record_move(0, "Alice", "Derrick", 0)
+    assert not memory.is_revisit()
+    memory.record_move(1, "Bob", "Alice", 1)
+    assert not memory.is_revisit()
+    # Back to the assignment after the first move
+    memory.record_move(1, "Alice", "Bob", 2)
+    assert memory.is_revisit()
+    memory.record_move(2, "Charlie", "Bob", 3)
+    assert not memory.is_revisit()
+
+
+# Only the last 10 * tenure assignments are remembered, and the counts are of exactly those
+def test_recent_hashes_are_bounded():
+    random.seed(3)
+    assignment = [random.choice(doctors) for _ in range(20)]
+    memory = TabuMemory(2, assignment)
+    for i in range(500):
+        var = random.randrange(len(assignment))
+        new_value = random.choice([doctor for doctor in doctors if doctor != assignment[var]])
+        memory.record_move(var, assignment[var], new_value, i)
+        assignment[var] = new_value
+
+        assert len(memory.recent_hashes) == min(i + 1, 20)
+        counts = dict()
+        for recent_hash in memory.recent_hashes:
+            counts[recent_hash] = counts.get(recent_hash, 0) + 1
+        assert memory.recent_hash_counts == counts
+
+
+# The tabu solver (see create_schedule.SOLVERS) makes a valid and fair schedule, and runs its local searches as tabu
+#   searches
+def test_tabu_solve():
+    random.seed(4)
+    problem = CallSchedulingProblem(datetime.date(2024, 1, 15), datetime.date(2025, 1, 15),
+                                    "examples/weekdayAvailability")
+    # The tenure each local search is called with
+    tenures = []
+    local_search = problem.local_search
+
+    def recording_local_search(*args, **kwargs):
+        tenures.append(kwargs.get("tabu_tenure"))
+        return local_search(*args, **kwargs)
+    problem.local_search = recording_local_search
+
+    schedule = problem.solve_for_call_schedule(tabu_tenure=5)
+    assert problem.is_valid_assignment(schedule)
+    assert not problem.remove_unfair_assignments(schedule)
+    assert tenures and all(tenure == 5 for tenure in tenures)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "passed")